@@ -15,17 +15,36 @@ from app.blueprints.upload import uploadapp
 from app.blueprints.dimapi import dimapi_app
 from app.blueprints.midiaapi import midiaapi_app
 from app.blueprints.relationapi import relationapi_app
+from app.blueprints.transcriptionapi import bp_transcricao
+from app.config_loader import ao_recarregar, get_settings, recarregar_no_sinal
+
+# Também usadas pelas listagens atendidas direto em app/asgi.py
+ORIGENS_CORS = ["https://localhost:9000", "http://localhost:9000"]
+
 
 def create_app():
     load_dotenv()
+    # Lê o config.json uma única vez, já na inicialização
+    get_settings()
 
     app = Flask(__name__)
     Swagger(app)
-    CORS(app, resources={r"/*": {"origins": ["https://localhost:9000","http://localhost:9000"]}})
+    CORS(app, resources={r"/*": {"origins": ORIGENS_CORS}})
 
-    app.config['UPLOAD_FOLDER'] = '/var/www/imagens'
+    app.config['UPLOAD_FOLDER'] = get_settings().upload_folder
+    # Arquivos maiores que isso vão pelo upload em partes (/uploadapi/parcial)
     app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024
-    app.config['ALLOWED_EXTENSIONS'] = {'jpg', 'jpeg', 'png', 'gif', 'mp4'}
+    app.config['ALLOWED_EXTENSIONS'] = {'jpg', 'jpeg', 'png', 'gif', 'mp4', 'tif', 'tiff', 'pdf'}
+    # Mídias enviadas pelo Apache/lighttpd (ver blueprints/utils/envio_midia.py)
+    app.config['USE_X_SENDFILE'] = get_settings().midia_envio == 'x-sendfile'
+
+    @ao_recarregar
+    def _recarregar(settings):
+        app.config['UPLOAD_FOLDER'] = settings.upload_folder
+        app.config['USE_X_SENDFILE'] = settings.midia_envio == 'x-sendfile'
+
+    # kill -HUP <pid> relê o config.json (ver config_loader.py)
+    recarregar_no_sinal()
 
     # Blueprints
     app.register_blueprint(sparqapi_app, url_prefix='/sparqapi')
@@ -37,6 +56,7 @@ def create_app():
     app.register_blueprint(dimapi_app, url_prefix='/dim')
     app.register_blueprint(midiaapi_app, url_prefix='/midias')
     app.register_blueprint(relationapi_app, url_prefix='/relation')
+    app.register_blueprint(bp_transcricao)
 
     # Ambiente
     environment = os.getenv('FLASK_ENV', 'production')
@@ -0,0 +1,199 @@
+"""
+Aplicação ASGI do backend:
+
+    uvicorn app.asgi:app --host 0.0.0.0 --port 5000
+
+As listagens de leitura (LISTAGENS) são atendidas direto no laço de eventos
+do servidor, pelo cliente assíncrono de sparql_async.py: enquanto esperam o
+Fuseki, e enquanto repassam o resultado, não ocupam thread nenhuma. A
+validação e a montagem da consulta são as mesmas das views Flask
+(consulta_list dos blueprints).
+
+As demais rotas seguem para a aplicação Flask (WsgiToAsgi), cada requisição
+na sua própria thread. `python -m app.main` continua servindo tudo pelo
+WSGI, com as listagens síncronas.
+"""
+import asyncio
+import json
+from urllib.parse import parse_qsl
+
+from asgiref.sync import ThreadSensitiveContext
+from asgiref.wsgi import WsgiToAsgi
+from werkzeug.datastructures import MultiDict
+
+from . import ORIGENS_CORS, create_app, sparql_async, sparql_cache
+from .blueprints import classapi, dimapi, objectapi, relationapi, repositorios
+from .blueprints.utils.sparql_resposta import BLOCO, erro_listagem
+from .config_loader import get_settings
+from .consultas import cursor_da_linha
+
+LISTAGENS = {
+    '/fis/list': objectapi.consulta_list,
+    '/dim/list': dimapi.consulta_list,
+    '/dim/listall': dimapi.consulta_list_all,
+    '/classapi/list': classapi.consulta_list,
+    '/classapi/listar_classes': classapi.consulta_list,
+    '/relation/list': relationapi.consulta_list,
+    '/repositorios/list': repositorios.consulta_list,
+    '/repositorios/listar_repositorios': repositorios.consulta_list,
+}
+
+flask_app = create_app()
+_wsgi = WsgiToAsgi(flask_app)
+
+
+def _json(dados):
+    return json.dumps(dados).encode()
+
+
+async def _enviar(send, status, corpo, tipo='application/json', cabecalhos=()):
+    await send({'type': 'http.response.start', 'status': status,
+                'headers': [(b'content-type', tipo.encode('latin-1')),
+                            (b'content-length', str(len(corpo)).encode())] + list(cabecalhos)})
+    await send({'type': 'http.response.body', 'body': corpo})
+
+
+def _cors(scope):
+    # Mesma política do flask_cors em create_app()
+    for nome, valor in scope['headers']:
+        if nome == b'origin' and valor.decode('latin-1') in ORIGENS_CORS:
+            return [(b'access-control-allow-origin', valor), (b'vary', b'Origin')]
+    return []
+
+
+async def _ler_corpo(receive):
+    partes = []
+    while True:
+        mensagem = await receive()
+        if mensagem['type'] != 'http.request':
+            break
+        partes.append(mensagem.get('body', b''))
+        if not mensagem.get('more_body'):
+            break
+    return b''.join(partes)
+
+
+async def resposta_sparql(send, cabecalhos, url, sparql_query, repo=None):
+    """
+    Equivalente assíncrono de utils/sparql_resposta.resposta_sparql: repassa
+    o corpo do Fuseki bloco a bloco e abastece o cache de resultados.
+    """
+    geracao = None
+    if repo is not None:
+        # Capturada antes da consulta: ver sparql_cache.guardar()
+        geracao = sparql_cache.geracao(repo)
+        cached = sparql_cache.obter(repo, sparql_query)
+        if cached is not None:
+            corpo, tipo = cached
+            await _enviar(send, 200, corpo, tipo, cabecalhos)
+            return
+
+    response = await sparql_async.query_stream(url, sparql_query)
+    try:
+        if response.status_code != 200:
+            await response.aread()
+            await _enviar(send, response.status_code,
+                          _json({"error": response.status_code, "message": response.text}),
+                          cabecalhos=cabecalhos)
+            return
+
+        tipo = response.headers.get('content-type', 'application/sparql-results+json')
+        limite = get_settings().sparql_cache_max_bytes
+        await send({'type': 'http.response.start', 'status': 200,
+                    'headers': [(b'content-type', tipo.encode('latin-1'))] + cabecalhos})
+        # Guarda uma cópia dos blocos enquanto couber no limite do cache
+        copia = [] if repo is not None else None
+        tamanho = 0
+        async for bloco in response.aiter_bytes(BLOCO):
+            if copia is not None:
+                tamanho += len(bloco)
+                if tamanho <= limite:
+                    copia.append(bloco)
+                else:
+                    copia = None
+            await send({'type': 'http.response.body', 'body': bloco, 'more_body': True})
+        await send({'type': 'http.response.body', 'body': b''})
+    finally:
+        await response.aclose()
+    if copia is not None:
+        sparql_cache.guardar(repo, sparql_query, (b''.join(copia), tipo), geracao)
+
+
+async def pagina_sparql(send, cabecalhos, url, sparql_query, repo, chaves, limite):
+    """
+    Equivalente assíncrono de utils/sparql_resposta.pagina_sparql.
+    """
+    geracao = sparql_cache.geracao(repo)
+    cached = sparql_cache.obter(repo, sparql_query)
+    if cached is None:
+        response = await sparql_async.query(url, sparql_query)
+        if response.status_code != 200:
+            await _enviar(send, response.status_code,
+                          _json({"error": response.status_code, "message": response.text}),
+                          cabecalhos=cabecalhos)
+            return
+        cached = (response.content, response.headers.get('content-type', 'application/sparql-results+json'))
+        if len(response.content) <= get_settings().sparql_cache_max_bytes:
+            sparql_cache.guardar(repo, sparql_query, cached, geracao)
+
+    result = json.loads(cached[0])
+    linhas = result.get('results', {}).get('bindings', [])
+    proximo = None
+    if len(linhas) > limite:
+        del linhas[limite:]
+        proximo = cursor_da_linha(linhas[-1], chaves)
+    result['next_cursor'] = proximo
+    await _enviar(send, 200, _json(result), cabecalhos=cabecalhos)
+
+
+async def _listagem(consulta_de, scope, receive, send):
+    corpo = await _ler_corpo(receive)
+    cabecalhos = _cors(scope)
+    iniciada = False
+
+    async def enviar(mensagem):
+        nonlocal iniciada
+        iniciada = True
+        await send(mensagem)
+
+    try:
+        data = json.loads(corpo) if corpo else None
+        args = MultiDict(parse_qsl(scope.get('query_string', b'').decode('latin-1')))
+        # A montagem pode consultar o índice de busca (SQLite): fica fora do laço
+        consulta = await asyncio.to_thread(consulta_de, data, args)
+        if consulta.limite:
+            await pagina_sparql(enviar, cabecalhos, *consulta)
+        else:
+            await resposta_sparql(enviar, cabecalhos, consulta.url, consulta.sparql, consulta.repo)
+    except Exception as e:
+        # Com o corpo já em repasse, só resta derrubar a conexão
+        if iniciada:
+            raise
+        dados, status = erro_listagem(e)
+        await _enviar(send, status, _json(dados), cabecalhos=cabecalhos)
+
+
+async def _lifespan(receive, send):
+    while True:
+        mensagem = await receive()
+        if mensagem['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif mensagem['type'] == 'lifespan.shutdown':
+            await sparql_async.fechar()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def app(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        await _lifespan(receive, send)
+        return
+    if scope['type'] == 'http' and scope['method'] in ('GET', 'POST'):
+        consulta_de = LISTAGENS.get(scope['path'])
+        if consulta_de is not None:
+            await _listagem(consulta_de, scope, receive, send)
+            return
+    # Sem o contexto, o asgiref enfileiraria todas as chamadas WSGI numa
+    # única thread
+    async with ThreadSensitiveContext():
+        await _wsgi(scope, receive, send)
@@ -1,38 +1,21 @@
 from flask import Blueprint, request, jsonify
-import requests
 import json
 import uuid
 from datetime import datetime, timedelta
-from urllib.parse import urlencode
+from .. import sparql_client
 from ..blueprints.repositorios import obter_repositorio_por_nome
-from ..config_loader import load_config
+from ..blueprints.auth import invalidar_token
+from ..config_loader import get_settings
+from ..consultas import literal
 acessoapp = Blueprint('acessoapp', __name__)
 
 
-
-
-config = load_config()
-
-FUSEKI_URL = config.get('user_update_url')
-FUSEKI_QUERY_URL = config.get('user_query_url')
-
-
 def execute_sparql_update(query):
-    headers = {
-        'Content-Type': 'application/x-www-form-urlencoded; charset=UTF-8',
-        'Accept': 'application/sparql-results+json,*/*;q=0.9',
-        'X-Requested-With': 'XMLHttpRequest'
-    }
-    data_envio = {'update': query}
-    encoded_data = urlencode(data_envio)
-    response = requests.post(FUSEKI_URL, headers=headers, data=encoded_data)
-    return response
+    return sparql_client.update(get_settings().user_update_url, query)
 
 
 def execute_sparql_query(query):
-    headers = {'Accept': 'application/sparql-results+json'}
-    response = requests.get(FUSEKI_QUERY_URL, params={
-                            'query': query}, headers=headers)
+    response = sparql_client.query(get_settings().user_query_url, query)
     return response.json()
 
 
@@ -105,6 +88,8 @@ def login():
     """
     
     response = execute_sparql_update(update)
+    # Os tokens anteriores do usuário deixam de valer imediatamente
+    invalidar_token(user_uri=user_uri)
     if response.status_code != 200:
         return jsonify({'message': 'Failed to update token and validade'}), 500
 
@@ -120,6 +105,27 @@ def login():
     }), 200
 
 
+@acessoapp.route('/logout', methods=['POST'])
+def logout():
+    token = request.headers.get('Authorization')
+    if not token:
+        return jsonify({'message': 'Token não fornecido'}), 401
+    token = token.replace('Bearer ', '')
+
+    update = f"""
+    PREFIX : <http://guara.ueg.br/ontologias/usuarios#>
+    DELETE {{ ?user :token {literal(token)} ; :validade ?validade }}
+    WHERE {{ ?user :token {literal(token)} ; :validade ?validade }}
+    """
+    response = execute_sparql_update(update)
+    # Vale também para o cache dos outros workers (ver auth.py)
+    invalidar_token(token=token)
+    if response.status_code != 200:
+        return jsonify({'message': 'Failed to remove token'}), 500
+
+    return jsonify({'message': 'Logout successful'}), 200
+
+
 @acessoapp.route('/add_user', methods=['POST'])
 def add_curador():
     data = request.json
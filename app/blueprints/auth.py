@@ -1,40 +1,106 @@
 from functools import wraps
 from flask import request, jsonify
 from datetime import datetime
-from ..blueprints.acesso import execute_sparql_query  # ou onde estiver
+from .. import geracoes, sparql_client
+from ..config_loader import ao_recarregar, get_settings
+from ..consultas import literal
+from ..sparql_cache import TTLCache
 from flask import g
+
+# Tokens já validados: token -> (geração, {user, permissoes, validade}).
+# Cada entrada expira junto com o token (ou antes, pelo TTL máximo).
+# O cache é de cada processo, mas invalidar_token() (login e logout) avança a
+# geração compartilhada GERACAO_TOKENS (geracoes.py): nos outros workers as
+# entradas validadas antes disso são descartadas na requisição seguinte. Só
+# sem o arquivo de gerações a revogação volta a depender de token_cache_ttl.
+GERACAO_TOKENS = 'tokens'
+tokens_validados = TTLCache(get_settings().token_cache_maxsize,
+                            get_settings().token_cache_ttl)
+
+
+@ao_recarregar
+def _recarregar(settings):
+    # user_query_url pode ter mudado: os tokens são validados de novo
+    tokens_validados.redimensionar(settings.token_cache_maxsize, settings.token_cache_ttl)
+
+
+def invalidar_token(token=None, user_uri=None):
+    """
+    Remove do cache o token informado e/ou todos os tokens do usuário; nos
+    demais processos, todo o cache de tokens deixa de valer.
+    """
+    geracoes.avancar(GERACAO_TOKENS)
+    return tokens_validados.remover_se(
+        lambda chave, valor: chave == token or valor[1]['user'] == user_uri)
+
+
+def buscar_token(token):
+    # Capturada antes da consulta, como em sparql_cache
+    geracao = geracoes.atual(GERACAO_TOKENS)
+    cached = tokens_validados.get(token)
+    if cached is not None:
+        gravada, dados = cached
+        if gravada is None or geracao is None or gravada == geracao:
+            return dados
+        # Login ou logout em algum worker depois da validação
+        tokens_validados.pop(token)
+
+    query = f"""
+    PREFIX : <http://guara.ueg.br/ontologias/usuarios#>
+    SELECT ?user ?validade  (GROUP_CONCAT(?permissao; separator=", ") AS ?permissoes)
+        WHERE {{
+            ?user :token {literal(token)} ;
+              :validade ?validade ;
+              :temPermissao ?permissao .
+
+    }}GROUP BY ?user ?validade
+    """
+    print('#buscando token:',query)
+    results = sparql_client.query(get_settings().user_query_url, query).json()
+    bindings = results.get('results', {}).get('bindings', [])
+
+    if not bindings:
+        return None
+
+    dados = {
+        'user': bindings[0]['user']['value'],
+        'permissoes': bindings[0]['permissoes']['value'],
+        'validade': datetime.fromisoformat(bindings[0]['validade']['value'])
+    }
+    restante = (dados['validade'] - datetime.now()).total_seconds()
+    if restante > 0:
+        tokens_validados.set(token, (geracao, dados), ttl=min(restante, tokens_validados.ttl))
+    return dados
+
+
+def autenticar():
+    """
+    Valida o token do cabeçalho Authorization e preenche g.user_uri e
+    g.permissoes. Retorna None, ou a resposta de erro (401/403).
+    """
+    token = request.headers.get('Authorization')
+    if not token:
+        return jsonify({'message': 'Token não fornecido'}), 401
+
+    token = token.replace('Bearer ', '')
+    dados = buscar_token(token)
+
+    if not dados:
+        return jsonify({'message': 'Token inválido'}), 403
+
+    if datetime.now() > dados['validade']:
+        return jsonify({'message': 'Token expirado'}), 403
+
+    g.user_uri = dados['user']
+    g.permissoes = dados['permissoes']
+    return None
+
+
 def token_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        token = request.headers.get('Authorization')
-        if not token:
-            return jsonify({'message': 'Token não fornecido'}), 401
-
-        token = token.replace('Bearer ', '')
-        query = f"""
-        PREFIX : <http://guara.ueg.br/ontologias/usuarios#>
-        SELECT ?user ?validade  (GROUP_CONCAT(?permissao; separator=", ") AS ?permissoes) 
-            WHERE {{
-                ?user :token "{token}" ;
-                  :validade ?validade ;
-                  :temPermissao ?permissao .
-            
-        }}GROUP BY ?user ?validade
-        """
-        print('#buscando token:',query)
-        results = execute_sparql_query(query)
-        bindings = results.get('results', {}).get('bindings', [])
-
-        if not bindings:
-            return jsonify({'message': 'Token inválido'}), 403
-
-        validade_str = bindings[0]['validade']['value']
-        validade_dt = datetime.fromisoformat(validade_str)
-
-        if datetime.now() > validade_dt:
-            return jsonify({'message': 'Token expirado'}), 403
-        
-        
-        g.user_uri = bindings[0]['user']['value']
+        erro = autenticar()
+        if erro is not None:
+            return erro
         return f(*args, **kwargs)
     return decorated_function
@@ -1,65 +1,40 @@
 from flask import Blueprint, request, jsonify
 import requests
-from ..consultas import get_sparq_class, get_prefix
-from ..config_loader import load_config
-from urllib.parse import urlencode
+from ..consultas import get_sparq_class, get_prefix, chaves_class
+from ..config_loader import get_settings
+from .. import sparql_client
+from .utils.sparql_resposta import Consulta, EntradaInvalida, erro_listagem, limite_pagina, responder
 
 classapi_app = Blueprint('classapi_app', __name__)
 
 
-@classapi_app.route('/listar_classes', methods=['POST','GET'])
-@classapi_app.route('/list', methods=['POST','GET'])
-def list():
-    try:
-        data = request.get_json()
-        if 'keyword' not in data:
-            return jsonify({"error": 'Invalid input', "message": "Expected JSON with 'keyword' field"}), 400
-        if 'repository' not in data:
-            return jsonify({"error": 'Invalid input', "message": "Expected JSON with 'repository' "}), 400
-        if data['repository']=='' :
-            return jsonify({"error": 'Invalid input', "message": "Expected JSON with 'repository' "}), 400
-        if 'orderby' not in data:
-            orderby = "class"
-        else:
-            orderby = data['orderby']
-
-        
-
-        keyword = data['keyword']
-        repo = data['repository']
-        #sparqapi_url = load_config().get('class_query_url')
-        sparqapi_url = repo
-
-        sparql_query = get_sparq_class().replace(
-            '%keyword%', keyword).replace('%orderby%', orderby)
-        #print(sparql_query)
-        headers = {'Content-Type': "application/x-www-form-urlencoded; charset=UTF-8",
-                   'Accept': "application/sparql-results+json,*/*;q=0.9",
-                   'X-Requested-With': 'XMLHttpRequest'}
-        data = {'query': sparql_query}
-        encoded_data = urlencode(data)
-
-        response = requests.post(
-            sparqapi_url, headers=headers, data=encoded_data)
-        if response.status_code == 200:
-            result = response.json()
-            
-            return jsonify(result)
-        else:
-            print('erro:',response.text)
-            return jsonify({"error": response.status_code, "message": response.text}), response.status_code
+def consulta_list(data, args=None):
+    """Valida o corpo de /classapi/list e monta a consulta (também usada por app/asgi.py)."""
+    if 'keyword' not in data:
+        raise EntradaInvalida("Expected JSON with 'keyword' field")
+    if 'repository' not in data or data['repository'] == '':
+        raise EntradaInvalida("Expected JSON with 'repository' ")
+    orderby = data.get('orderby', "class")
 
-    except requests.exceptions.RequestException as e:
-        return jsonify({"error": "RequestException", "message": str(e)}), 500
+    keyword = data['keyword']
+    repo = data['repository']
+    #sparqapi_url = get_settings().class_query_url
+    sparqapi_url = repo
 
-    except KeyError as e:
-        return jsonify({"error": "KeyError", "message": str(e)}), 400
+    limite = limite_pagina(data)
+    sparql_query = get_sparq_class(keyword, orderby, limite, data.get('cursor'))
+    #print(sparql_query)
+    return Consulta(sparqapi_url, sparql_query, repo, chaves_class(orderby), limite)
 
-    except TypeError as e:
-        return jsonify({"error": "TypeError", "message": str(e)}), 400
 
+@classapi_app.route('/listar_classes', methods=['POST','GET'])
+@classapi_app.route('/list', methods=['POST','GET'])
+def list():
+    try:
+        return responder(consulta_list(request.get_json()))
     except Exception as e:
-        return jsonify({"error": "Exception", "message": str(e)}), 500
+        corpo, status = erro_listagem(e)
+        return jsonify(corpo), status
 
 
 @classapi_app.route('/adicionar_classe', methods=['POST'])
@@ -75,9 +50,9 @@ def adicionar_classe():
         repo = data['repository']
         nome_classe = data['label'].replace(" ", "_")
 
-        #prefix_base = load_config().get('prefix_base_class')
+        #prefix_base = get_settings().prefix_base_class
         #class_uri = prefix_base+nome_classe
-        #sparqapi_url = load_config().get('class_update_url')
+        #sparqapi_url = get_settings().class_update_url
         
         prefix_base = repo+"#"
         class_uri =':'+nome_classe
@@ -102,18 +77,8 @@ def adicionar_classe():
         """
         print(sparql_query)
 
-        # Preparação dos headers e dados para a requisição POST
-        headers = {
-            'Content-Type': 'application/x-www-form-urlencoded; charset=UTF-8',
-            'Accept': "application/sparql-results+json,*/*;q=0.9",
-            'X-Requested-With': 'XMLHttpRequest'
-        }
-        data_envio = {'update': sparql_query}
-        encoded_data = urlencode(data_envio)
-
         # Enviar a query SPARQL para o endpoint de atualização
-        response = requests.post(
-            sparqapi_url, headers=headers, data=encoded_data)
+        response = sparql_client.update(sparqapi_url, sparql_query)
 
         if response.status_code == 200:
             return jsonify({"message": "Classe adicionada com sucesso", "id": data['label']}), 200
@@ -172,18 +137,8 @@ def alterar_classe():
         
         
 
-        # Preparação dos headers e dados para a requisição POST
-        headers = {
-            'Content-Type': 'application/x-www-form-urlencoded; charset=UTF-8',
-            'Accept': "application/sparql-results+json,*/*;q=0.9",
-            'X-Requested-With': 'XMLHttpRequest'
-        }
-        data_envio = {'update': sparql_query}
-        encoded_data = urlencode(data_envio)
-
         # Enviar a query SPARQL para o endpoint de atualização
-        response = requests.post(
-            sparqapi_url, headers=headers, data=encoded_data)
+        response = sparql_client.update(sparqapi_url, sparql_query)
 
         if response.status_code == 200:
             return jsonify({"message": "Classe alterada com sucesso", "id": data['label']}), 200
@@ -215,7 +170,7 @@ def excluir_classe():
         if verificar_existencia_classe(class_uri,repo):
             return jsonify({"error": "Classe não pode ser excluída", "message": "Existem registros relacionados a essa classe"}), 400
 
-        sparqapi_url = load_config().get('class_update_url')
+        sparqapi_url = get_settings().class_update_url
         
         # Montagem da query SPARQL de deleção
         sparql_delete_query = f"""
@@ -229,17 +184,8 @@ def excluir_classe():
             }}
         """
   
-        headers = {
-            'Content-Type': 'application/x-www-form-urlencoded; charset=UTF-8',
-            'Accept': 'application/sparql-results+json,*/*;q=0.9',
-            'X-Requested-With': 'XMLHttpRequest'
-        }
-        data_envio = {'update': sparql_delete_query}
-        encoded_data = urlencode(data_envio)
-
         # Enviar a query SPARQL para o endpoint de atualização
-        response_delete = requests.post(
-            repo, headers=headers, data=encoded_data)
+        response_delete = sparql_client.update(repo, sparql_delete_query)
 
         if response_delete.status_code == 200:
             return jsonify({"message": "Classe excluída com sucesso", "id": data['label']}), 200
@@ -268,16 +214,9 @@ def verificar_existencia_classe(class_uri,repository_url):
             ?s rdfs:subClassOf <{class_uri}> .
         }}
     """
-    
-    # Preparação dos headers e dados para a requisição GET
-    headers = {
-        'Accept': 'application/sparql-results+json,*/*;q=0.9',
-        'X-Requested-With': 'XMLHttpRequest'
-    }
-    params = {'query': sparql_check_query}
 
     # Enviar a query SPARQL para verificar a existência de triplas
-    response = requests.get(sparqapi_url, headers=headers, params=params)
+    response = sparql_client.query(sparqapi_url, sparql_check_query)
 
     if response.status_code == 200:
         result = response.json()
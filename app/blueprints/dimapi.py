@@ -2,125 +2,68 @@ from flask import Blueprint, request, jsonify,current_app
 import requests, os
 import uuid
 # Importe suas funções corretamente
-from ..consultas import get_sparq_all,get_sparq_dim, get_prefix
-from ..config_loader import load_config
-from urllib.parse import urlencode
+from ..consultas import get_sparq_all,get_sparq_dim, get_prefix, CHAVES_ALL, CHAVES_DIM, iri, literal, nome_local
+from ..config_loader import get_settings
+from .. import sparql_client, indice_busca
+from .utils.sparql_resposta import Consulta, EntradaInvalida, erro_listagem, limite_pagina, responder
+from .utils.ingestao import ingestao_ndjson
 from ..blueprints.auth import token_required
 dimapi_app = Blueprint('dimapi_app', __name__)
 
 
-@dimapi_app.route('/list', methods=['GET','POST'])
-def list():
-    try:
-        data = request.get_json()
-        if 'keyword' not in data:
-            return jsonify({"error": "Invalid input", "message": "Expected JSON with 'keyword' field"}), 400
-        if 'repository' not in data:
-            return jsonify({"error": 'Invalid input', "message": "Expected JSON with 'repository' "}), 400
-        if data['repository']=='' :
-            return jsonify({"error": 'Invalid input', "message": "Expected JSON with 'repository' "}), 400
-        keyword = data['keyword']
-        repo = data['repository']
-        type = data['type']
-        
-        prefix_base = repo  + "#"
-        sparqapi_url = repo
-        
-        sparql_query = f'PREFIX : <{repo}#> ' + get_sparq_dim().replace('%keyword%', keyword)
-        
-        print('query',sparql_query) 
-        headers = {'Content-Type': 'application/x-www-form-urlencoded; charset=UTF-8',
-                   'Accept': 'application/sparql-results+json,*/*;q=0.9',
-                   'X-Requested-With': 'XMLHttpRequest'}
-        data = {'query': sparql_query}
-        encoded_data = urlencode(data)
-        
-        response = requests.post(
-            sparqapi_url, headers=headers, data=encoded_data)
-        
+def consulta_list(data, args=None):
+    """Valida o corpo de /dim/list e monta a consulta (também usada por app/asgi.py)."""
+    if 'keyword' not in data:
+        raise EntradaInvalida("Expected JSON with 'keyword' field")
+    if 'repository' not in data or data['repository'] == '':
+        raise EntradaInvalida("Expected JSON with 'repository' ")
+    keyword = data['keyword']
+    repo = data['repository']
+    type = data['type']
 
-        if response.status_code == 200:
-            result = response.json()
-            return jsonify(result)
-        else:
-            return jsonify({"error": response.status_code, "message": response.text}), response.status_code
-
-    except requests.exceptions.RequestException as e:
-        return jsonify({"error": "RequestException", "message": str(e)}), 500
-
-    except KeyError as e:
-        return jsonify({"error": "KeyError", "message": str(e)}), 400
+    limite = limite_pagina(data)
+    ids = indice_busca.buscar(repo, keyword)
+    sparql_query = get_sparq_dim(repo, keyword, limite, data.get('cursor'), ids)
 
-    except TypeError as e:
-        return jsonify({"error": "TypeError", "message": str(e)}), 400
+    print('query',sparql_query)
+    return Consulta(repo, sparql_query, repo, CHAVES_DIM, limite)
 
-    except Exception as e:
-        return jsonify({"error": "Exception", "message": str(e)}), 500
 
-@dimapi_app.route('/listall', methods=['GET','POST'])
-def list_all():
-    try:
-        data = request.get_json()
-        
-        if 'repository' not in data:
-            return jsonify({"error": 'Invalid input', "message": "Expected JSON with 'repository' "}), 400
-        if data['repository']=='' :
-            return jsonify({"error": 'Invalid input', "message": "Expected JSON with 'repository' "}), 400
-        if 'type' not in data:
-            return jsonify({"error": "Invalid input", "message": "Expected JSON with 'type' field"}), 400
-        keyword = data['keyword']
-        repo = data['repository']
-        tipo = data['type']
-        
+def consulta_list_all(data, args=None):
+    """Valida o corpo de /dim/listall e monta a consulta (também usada por app/asgi.py)."""
+    if 'repository' not in data or data['repository'] == '':
+        raise EntradaInvalida("Expected JSON with 'repository' ")
+    if 'type' not in data:
+        raise EntradaInvalida("Expected JSON with 'type' field")
+    keyword = data['keyword']
+    repo = data['repository']
+    tipo = data['type']
 
-        prefix_base = repo  + "#"
-        sparqapi_url = repo
-        replace_tipo = {
-            'quem': 'a obj:Pessoa;',
-            'quando': 'a obj:Tempo;',
-            'onde': 'a obj:Lugar;',
-            'oque': 'a obj:Evento;',
-            'fisico': 'a obj:ObjetoFisico;'
-        }.get(tipo, '') 
-        
-        sparql_query = f'PREFIX : <{repo}#> ' + get_sparq_all()
-        
-        try:
-            
-            sparql_query = sparql_query.replace('%keyword%', keyword)
-            
-            sparql_query = sparql_query.replace('%tipo%', replace_tipo)
-        except Exception as e:
-            print('eero',e)
-
-        print('query',sparql_query) 
-        headers = {'Content-Type': 'application/x-www-form-urlencoded; charset=UTF-8',
-                   'Accept': 'application/sparql-results+json,*/*;q=0.9',
-                   'X-Requested-With': 'XMLHttpRequest'}
-        data = {'query': sparql_query}
-        encoded_data = urlencode(data)
-        
-        response = requests.post(
-            sparqapi_url, headers=headers, data=encoded_data)
-        
+    limite = limite_pagina(data)
+    ids = indice_busca.buscar(repo, keyword)
+    sparql_query = get_sparq_all(repo, keyword, tipo, limite, data.get('cursor'), ids)
 
-        if response.status_code == 200:
-            result = response.json()
-            return jsonify(result)
-        else:
-            return jsonify({"error": response.status_code, "message": response.text}), response.status_code
+    print('query',sparql_query)
+    return Consulta(repo, sparql_query, repo, CHAVES_ALL, limite)
 
-    except requests.exceptions.RequestException as e:
-        return jsonify({"error": "RequestException", "message": str(e)}), 500
 
-    except KeyError as e:
-        return jsonify({"error": "KeyError", "message": str(e)}), 400
+@dimapi_app.route('/list', methods=['GET','POST'])
+def list():
+    try:
+        return responder(consulta_list(request.get_json()))
+    except Exception as e:
+        corpo, status = erro_listagem(e)
+        return jsonify(corpo), status
 
-    except TypeError as e:
-        return jsonify({"error": "TypeError", "message": str(e)}), 400
 
+@dimapi_app.route('/listall', methods=['GET','POST'])
+def list_all():
+    try:
+        return responder(consulta_list_all(request.get_json()))
     except Exception as e:
-        return jsonify({"error": "Exception", "message": str(e)}), 500
+        corpo, status = erro_listagem(e)
+        return jsonify(corpo), status
+
 
 @dimapi_app.route('/listar_arquivos', methods=['GET'])
 def listar_arquivos():
@@ -150,15 +93,7 @@ def listar_arquivos():
                 FILTER (?a = :{objeto_id})
             }}
         """
-        headers = {
-            'Content-Type': 'application/x-www-form-urlencoded; charset=UTF-8',
-            'Accept': 'application/sparql-results+json,*/*;q=0.9',
-            'X-Requested-With': 'XMLHttpRequest'
-        }
-        data = {'query': sparql_query}
-        encoded_data = urlencode(data)
-
-        response = requests.post(repo, headers=headers, data=encoded_data)
+        response = sparql_client.query(repo, sparql_query)
 
         if response.status_code == 200:
             sparql_result = response.json()
@@ -196,76 +131,86 @@ def listar_arquivos():
     except Exception as e:
         return jsonify({"error": "Exception", "message": str(e)}), 500
     
+CAMPOS_OBRIGATORIOS = ['descricao', 'titulo', 'resumo','tipo','repository']
+
+
+def validar_dimensao(data):
+    """
+    Retorna a mensagem de erro do registro, ou None se ele é válido.
+    """
+    if not isinstance(data, dict):
+        return "Expected JSON object"
+    for field in CAMPOS_OBRIGATORIOS:
+        if field not in data:
+            return f"Expected JSON with '{field}' field"
+    return None
+
+
+def triplas_dimensao(data, object_id):
+    """
+    Triplas do objeto dimensional para um INSERT DATA (com PREFIX : do repositório).
+    Levanta ValueError/TypeError/KeyError para valores que não cabem no SPARQL.
+    """
+    type = iri(data['tipo']['uri'])
+    objeto_uri = nome_local(object_id)
+
+    coordenadas = data['coordenadas']
+    coord=''
+    if coordenadas:
+        lat, lon = coordenadas.split(',')
+        lat = lat.strip()
+        lon = lon.strip()
+        coord = f'geo:lat {literal(lat)};geo:lon {literal(lon)};'
+
+    tem_relacao_part = f':temRelacao {", ".join(iri(relacao) for relacao in data["temRelacao"])}' if "temRelacao" in data and data["temRelacao"] else ''
+    associated_media_part = f'schema:associatedMedia {", ".join(iri(url) for url in data["associatedMedia"])}' if "associatedMedia" in data and data["associatedMedia"] else ''
+
+    # Montando a lista de partes da query
+    parts = [
+        f'dc:description {literal(data["descricao"])}',
+        f'dc:abstract {literal(data["resumo"])}',
+        f'dc:title {literal(data["titulo"])}',
+        tem_relacao_part,
+        associated_media_part,
+    ]
+
+    # Remover partes vazias (strings vazias ou espaços em branco)
+    parts = [part for part in parts if part.strip()]
+    separador = ' ;\n                                '
+    return f"""{objeto_uri} rdf:type {type} ;
+                rdf:type obj:ObjetoDimensional ;
+                {coord}
+                obj:dimensao {type} ;
+                                {separador.join(parts)} ."""
+
+
 @dimapi_app.route('/create', methods=['POST'])
 @token_required
 def create():
     try:
         data = request.get_json()
-        required_fields = ['descricao', 'titulo', 'resumo','tipo','repository']
-        
-        for field in required_fields:
-            if field not in data:
-                return jsonify({"error": "Invalid input", "message": f"Expected JSON with '{field}' field"}), 400
+        erro = validar_dimensao(data)
+        if erro:
+            return jsonify({"error": "Invalid input", "message": erro}), 400
         repo = data['repository']
-        type = data['tipo']['uri']
-        
-        object_id = str(uuid.uuid4())
-        objeto_uri = f":{object_id}"
 
-        coordenadas = data['coordenadas']
-        coord=''
-        if coordenadas:
-            lat, lon = coordenadas.split(',')
-            lat = lat.strip()
-            lon = lon.strip()
-            coord = f'geo:lat "{lat}";geo:lon "{lon}";'
-            
-        sparqapi_url = repo+'/'+load_config().get('update')
-       
-        
-            
-        tem_relacao_part = f':temRelacao {", ".join(f"<{relacao}>" for relacao in data["temRelacao"])}' if "temRelacao" in data and data["temRelacao"] else ''
-        associated_media_part = f'schema:associatedMedia {", ".join(f"<{url}>" for url in data["associatedMedia"])}' if "associatedMedia" in data and data["associatedMedia"] else ''
-        
-        descricao = '"""' + data["descricao"].replace('"""', '\\"""') + '"""'
-        resumo = '"""' + data["resumo"].replace('"""', '\\"""') + '"""'
-        titulo = '"""' + data["titulo"].replace('"""', '\\"""') + '"""'
-        # Montando a lista de partes da query
-        parts = [
-            f'dc:description {descricao}',
-            f'dc:abstract {resumo}',
-            f'dc:title {titulo}',
-            tem_relacao_part,
-            associated_media_part,
-        ]
-
-        # Remover partes vazias (strings vazias ou espaços em branco)
-        parts = [part for part in parts if part.strip()]
+        object_id = str(uuid.uuid4())
+        sparqapi_url = repo+'/'+get_settings().update
 
         # Construção final da query SPARQL
         sparql_query = f"""{get_prefix()}
             PREFIX : <{repo}#>
             INSERT DATA {{
-                {objeto_uri} rdf:type <{type}> ;
-                rdf:type obj:ObjetoDimensional ;
-                {coord}
-                obj:dimensao <{type}> ;
-                                { ' ;\n'.join(parts) } .
+                {triplas_dimensao(data, object_id)}
             }}
         """
 
         print('->', sparql_query)  # Debugging
         # Enviar a query SPARQL para o endpoint de atualização
-        headers = {'Content-Type': 'application/x-www-form-urlencoded; charset=UTF-8',
-                   'Accept': 'application/sparql-results+json,*/*;q=0.9',
-                   'X-Requested-With': 'XMLHttpRequest'}
-        data = {'update': sparql_query}
-        encoded_data = urlencode(data)
-
-        response = requests.post(
-            sparqapi_url, headers=headers, data=encoded_data)
+        response = sparql_client.update(sparqapi_url, sparql_query)
 
         if response.status_code == 200:
+            indice_busca.indexar(repo, f"{repo}#{object_id}", data['titulo'], data['resumo'], data['descricao'])
             return jsonify({"message": "Objeto digital adicionado com sucesso", "id": object_id}), 200
         else:
             print (response.text)
@@ -277,10 +222,20 @@ def create():
     except KeyError as e:
         return jsonify({"error3": "KeyError", "message": str(e)}), 400
 
+    except (TypeError, ValueError) as e:
+        return jsonify({"error3": type(e).__name__, "message": str(e)}), 400
+
     except Exception as e:
         return jsonify({"error4": "Exception", "message": str(e)}), 500
 
 
+@dimapi_app.route('/bulk', methods=['POST'])
+@token_required
+def bulk():
+    # Corpo NDJSON: um objeto por linha, no mesmo formato de /create
+    return ingestao_ndjson(validar_dimensao, triplas_dimensao)
+
+
 
 @dimapi_app.route('/delete', methods=['DELETE','POST'])
 @token_required
@@ -295,7 +250,7 @@ def excluir():
         objeto_id = data["id"]
         #print(objeto_id)
         objeto_uri = f":{objeto_id}"
-        sparqapi_url = f"{repo}/{load_config().get('update')}"
+        sparqapi_url = f"{repo}/{get_settings().update}"
         
         sparql_query = f"""{get_prefix()}
             PREFIX : <{repo}#>
@@ -304,18 +259,10 @@ def excluir():
             }}
         """
         #print (sparql_query)
-        headers = {
-            'Content-Type': 'application/x-www-form-urlencoded; charset=UTF-8',
-            'Accept': 'application/sparql-results+json,*/*;q=0.9',
-            'X-Requested-With': 'XMLHttpRequest'
-        }
-
-        data = {'update': sparql_query}
-        encoded_data = urlencode(data)
-
-        response = requests.post(sparqapi_url, headers=headers, data=encoded_data)
+        response = sparql_client.update(sparqapi_url, sparql_query)
 
         if response.status_code == 200:
+            indice_busca.remover(repo, f"{repo}#{objeto_id}")
             return jsonify({"message": "Objeto físico excluído com sucesso", "id": objeto_id}), 200
         else:
             #print(response.text)
@@ -346,7 +293,7 @@ def remover_relacao():
         o = data["s"]
         
         
-        sparqapi_url = f"{repo}/{load_config().get('update')}"
+        sparqapi_url = f"{repo}/{get_settings().update}"
         
         sparql_query = f"""{get_prefix()}
             PREFIX : <{repo}#>
@@ -355,16 +302,7 @@ def remover_relacao():
             }}
         """
         
-        headers = {
-            'Content-Type': 'application/x-www-form-urlencoded; charset=UTF-8',
-            'Accept': 'application/sparql-results+json,*/*;q=0.9',
-            'X-Requested-With': 'XMLHttpRequest'
-        }
-
-        data = {'update': sparql_query}
-        encoded_data = urlencode(data)
-
-        response = requests.post(sparqapi_url, headers=headers, data=encoded_data)
+        response = sparql_client.update(sparqapi_url, sparql_query)
 
         if response.status_code == 200:
             return jsonify({"message": "relação excluído com sucessa", "id": '{s} {p} {o}'}), 200
@@ -401,7 +339,7 @@ def update():
         titulo = data['titulo']
         object_id = data['id']
         objeto_uri = f":{object_id}"
-        sparqapi_url = repo + '/' + load_config().get('update')
+        sparqapi_url = repo + '/' + get_settings().update
         coordenadas = data.get('coordenadas', None)
 
         # Começa a construir o bloco SPARQL
@@ -464,17 +402,10 @@ WHERE {{
         print('SPARQL UPDATE:', sparql_query)
 
         # Headers e envio da requisição
-        headers = {
-            'Content-Type': 'application/x-www-form-urlencoded; charset=UTF-8',
-            'Accept': 'application/sparql-results+json,*/*;q=0.9',
-            'X-Requested-With': 'XMLHttpRequest'
-        }
-        data_envio = {'update': sparql_query}
-        encoded_data = urlencode(data_envio)
-
-        response = requests.post(sparqapi_url, headers=headers, data=encoded_data)
+        response = sparql_client.update(sparqapi_url, sparql_query)
 
         if response.status_code == 200:
+            indice_busca.indexar(repo, f"{repo}#{object_id}", titulo, abstract, description)
             return jsonify({"message": "Objeto atualizado com sucesso", "id": object_id}), 200
         else:
             return jsonify({"error": response.status_code, "message": response.text}), response.status_code
@@ -504,7 +435,7 @@ def update_old():
         titulo=data['titulo']
         object_id = data['id']
         objeto_uri = f":{object_id}"
-        sparqapi_url = repo+'/'+load_config().get('update')
+        sparqapi_url = repo+'/'+get_settings().update
         coordenadas = data['coordenadas']
         
 
@@ -528,16 +459,10 @@ def update_old():
             }}
         """
         print('update',sparql_query)   
-        headers = {'Content-Type': 'application/x-www-form-urlencoded; charset=UTF-8',
-                'Accept': 'application/sparql-results+json,*/*;q=0.9',
-                'X-Requested-With': 'XMLHttpRequest'}
-        data = {'update': sparql_query}
-        encoded_data = urlencode(data)
-         
-        response = requests.post(
-            sparqapi_url, headers=headers, data=encoded_data)
+        response = sparql_client.update(sparqapi_url, sparql_query)
 
         if response.status_code == 200:
+            indice_busca.indexar(repo, f"{repo}#{object_id}", titulo, abstract, description)
             return jsonify({"message": "Objeto atualizado com sucesso", "id": object_id}), 200
         else:
             return jsonify({"error": response.status_code, "message": response.text}), response.status_code
@@ -558,7 +483,7 @@ def add_relation():
         midia = data["midia_uri"]
         propriedade = data["propriedade"]
         repo = data['repository']
-        sparqapi_url = repo+'/'+load_config().get('update')
+        sparqapi_url = repo+'/'+get_settings().update
         sparql_query = f"""{get_prefix()}
         PREFIX : <{repo}#>
         INSERT DATA {{
@@ -566,14 +491,7 @@ def add_relation():
         }}
         """
         #print('add relação:',sparql_query, ' no repositório ', sparqapi_url)
-        headers = {'Content-Type': 'application/x-www-form-urlencoded; charset=UTF-8',
-                   'Accept': 'application/sparql-results+json,*/*;q=0.9',
-                   'X-Requested-With': 'XMLHttpRequest'}
-        data = {'update': sparql_query}
-        encoded_data = urlencode(data)
-
-        response = requests.post(
-            sparqapi_url, headers=headers, data=encoded_data)
+        response = sparql_client.update(sparqapi_url, sparql_query)
 
         if response.status_code == 200:
             return jsonify({"message": "Objeto digital adicionado com sucesso", "id": objeto}), 200
@@ -1,10 +1,10 @@
-from flask import Blueprint, request, jsonify,current_app
+from flask import Blueprint, request, jsonify,current_app, send_file, url_for, abort
 import requests, os
 import uuid
 # Importe suas funções corretamente
 from ..consultas import get_sparq_obj, get_prefix
-from ..config_loader import load_config
-from urllib.parse import urlencode
+from ..config_loader import get_settings
+from .. import sparql_client, derivados
 from ..blueprints.auth import token_required
 from flask import g
 midiaapi_app = Blueprint('midiaapi_app', __name__)
@@ -39,15 +39,7 @@ def listar_arquivos():
                 FILTER (?a = :{objeto_id})
             }}
         """
-        headers = {
-            'Content-Type': 'application/x-www-form-urlencoded; charset=UTF-8',
-            'Accept': 'application/sparql-results+json,*/*;q=0.9',
-            'X-Requested-With': 'XMLHttpRequest'
-        }
-        data = {'query': sparql_query}
-        encoded_data = urlencode(data)
-
-        response = requests.post(repo, headers=headers, data=encoded_data)
+        response = sparql_client.query(repo, sparql_query)
 
         if response.status_code == 200:
             sparql_result = response.json()
@@ -70,6 +62,14 @@ def listar_arquivos():
 
         # Converter para uma lista
         arquivos_combinados = list(arquivos_map.values())
+        # Versões reduzidas para as galerias (geradas no upload ou sob demanda)
+        for arquivo in arquivos_combinados:
+            if derivados.eh_imagem(arquivo["nome"]):
+                arquivo["derivados"] = {
+                    tamanho: url_for('midiaapi_app.derivado', objeto_id=objeto_id, tamanho=tamanho,
+                                     nome=arquivo["nome"])
+                    for tamanho in derivados.TAMANHOS
+                }
         #print('combinados',arquivos_combinados)
         return jsonify({
             "arquivos_locais": arquivos,
@@ -84,6 +84,26 @@ def listar_arquivos():
         return jsonify({"error": "Exception", "message": str(e)}), 500
     
 
+@midiaapi_app.route('/derivado/<objeto_id>/<tamanho>/<nome>', methods=['GET'])
+def derivado(objeto_id, tamanho, nome):
+    # WebP para quem aceita, JPEG para os demais
+    if tamanho not in derivados.TAMANHOS:
+        return jsonify({"error": "Invalid input", "message": f"Tamanhos: {', '.join(derivados.TAMANHOS)}"}), 400
+    formato = 'webp' if request.accept_mimetypes['image/webp'] else 'jpg'
+
+    try:
+        arquivo = derivados.obter(current_app.config.get('UPLOAD_FOLDER'), objeto_id, nome, tamanho, formato)
+    except OSError as e:
+        return jsonify({"error": "OSError", "message": str(e)}), 500
+    if arquivo is None:
+        abort(404)
+
+    response = send_file(arquivo, mimetype=derivados.FORMATOS[formato][1], conditional=True,
+                         max_age=7 * 24 * 3600)
+    response.vary.add('Accept')
+    return response
+
+
 def add_relation(objeto_uri, repositorio_uri, target_uri, propriedade, repository):
     try:
         objeto = objeto_uri
@@ -91,7 +111,7 @@ def add_relation(objeto_uri, repositorio_uri, target_uri, propriedade, repositor
         target = target_uri
         propriedade = propriedade
         repo = repository
-        sparqapi_url = repo+'/'+load_config().get('update')
+        sparqapi_url = repo+'/'+get_settings().update
         sparql_query = f"""{get_prefix()}
         PREFIX : <{repo}#>
         INSERT DATA {{
@@ -99,14 +119,7 @@ def add_relation(objeto_uri, repositorio_uri, target_uri, propriedade, repositor
         }}
         """
         print('add relação:',sparql_query, ' no repositório ', sparqapi_url)
-        headers = {'Content-Type': 'application/x-www-form-urlencoded; charset=UTF-8',
-                   'Accept': 'application/sparql-results+json,*/*;q=0.9',
-                   'X-Requested-With': 'XMLHttpRequest'}
-        data = {'update': sparql_query}
-        encoded_data = urlencode(data)
-
-        response = requests.post(
-            sparqapi_url, headers=headers, data=encoded_data)
+        response = sparql_client.update(sparqapi_url, sparql_query)
 
         if response.status_code == 200:
             return jsonify({"message": "Objeto digital adicionado com sucesso", "id": objeto}), 200
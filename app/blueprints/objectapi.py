@@ -2,61 +2,41 @@ from flask import Blueprint, request, jsonify,current_app
 import requests, os
 import uuid
 # Importe suas funções corretamente
-from ..consultas import get_sparq_obj, get_prefix
-from ..config_loader import load_config
-from urllib.parse import urlencode
+from ..consultas import get_sparq_obj, get_prefix, CHAVES_OBJ, iri, literal, nome_local
+from ..config_loader import get_settings
+from .. import sparql_client, indice_busca
+from .utils.sparql_resposta import Consulta, EntradaInvalida, erro_listagem, limite_pagina, responder
+from .utils.ingestao import ingestao_ndjson
 from ..blueprints.auth import token_required
 from flask import g
 objectapi_app = Blueprint('objectapi_app', __name__)
 
 
-@objectapi_app.route('/list', methods=['POST','GET'])
-def list():
-    try:
-        data = request.get_json()
-        
-        if 'keyword' not in data:
-            return jsonify({"error": "Invalid input", "message": "Expected JSON with 'keyword' field"}), 400
-        if 'repository' not in data:
-            return jsonify({"error": 'Invalid input', "message": "Expected JSON with 'repository' "}), 400
-        if data['repository']=='' :
-            return jsonify({"error": 'Invalid input', "message": "Expected JSON with 'repository' "}), 400
-        keyword = data['keyword']
-        repo = data['repository']
-        
-        prefix_base = repo  + "#"
-        sparqapi_url = repo
-        
-        sparql_query = f'PREFIX : <{repo}#> ' + get_sparq_obj().replace('%keyword%', keyword)
-        
-        print('q',sparql_query);
-        headers = {'Content-Type': 'application/x-www-form-urlencoded; charset=UTF-8',
-                   'Accept': 'application/sparql-results+json,*/*;q=0.9',
-                   'X-Requested-With': 'XMLHttpRequest'}
-        data = {'query': sparql_query}
-        encoded_data = urlencode(data)
-        
-        response = requests.post(
-            sparqapi_url, headers=headers, data=encoded_data)
-        #print('response: ', response)
+def consulta_list(data, args=None):
+    """Valida o corpo de /fis/list e monta a consulta (também usada por app/asgi.py)."""
+    if 'keyword' not in data:
+        raise EntradaInvalida("Expected JSON with 'keyword' field")
+    if 'repository' not in data or data['repository'] == '':
+        raise EntradaInvalida("Expected JSON with 'repository' ")
+    keyword = data['keyword']
+    repo = data['repository']
 
-        if response.status_code == 200:
-            result = response.json()
-            return jsonify(result)
-        else:
-            return jsonify({"error": response.status_code, "message": response.text}), response.status_code
+    limite = limite_pagina(data)
+    ids = indice_busca.buscar(repo, keyword)
+    sparql_query = get_sparq_obj(repo, keyword, limite, data.get('cursor'), ids)
 
-    except requests.exceptions.RequestException as e:
-        return jsonify({"error": "RequestException", "message": str(e)}), 500
-
-    except KeyError as e:
-        return jsonify({"error": "KeyError", "message": str(e)}), 400
+    print('q',sparql_query);
+    return Consulta(repo, sparql_query, repo, CHAVES_OBJ, limite)
 
-    except TypeError as e:
-        return jsonify({"error": "TypeError", "message": str(e)}), 400
 
+@objectapi_app.route('/list', methods=['POST','GET'])
+def list():
+    try:
+        return responder(consulta_list(request.get_json()))
     except Exception as e:
-        return jsonify({"error": "Exception", "message": str(e)}), 500
+        corpo, status = erro_listagem(e)
+        return jsonify(corpo), status
+
 
 @objectapi_app.route('/listar_arquivos', methods=['GET'])
 def listar_arquivos():
@@ -86,15 +66,7 @@ def listar_arquivos():
                 FILTER (?a = :{objeto_id})
             }}
         """
-        headers = {
-            'Content-Type': 'application/x-www-form-urlencoded; charset=UTF-8',
-            'Accept': 'application/sparql-results+json,*/*;q=0.9',
-            'X-Requested-With': 'XMLHttpRequest'
-        }
-        data = {'query': sparql_query}
-        encoded_data = urlencode(data)
-
-        response = requests.post(repo, headers=headers, data=encoded_data)
+        response = sparql_client.query(repo, sparql_query)
 
         if response.status_code == 200:
             sparql_result = response.json()
@@ -132,72 +104,81 @@ def listar_arquivos():
     except Exception as e:
         return jsonify({"error": "Exception", "message": str(e)}), 500
     
+CAMPOS_OBRIGATORIOS = ['descricao', 'titulo', 'resumo','colecao','repository']
+
+
+def validar_objeto(data):
+    """
+    Retorna a mensagem de erro do registro, ou None se ele é válido.
+    """
+    if not isinstance(data, dict):
+        return "Expected JSON object"
+    for field in CAMPOS_OBRIGATORIOS:
+        if field not in data:
+            return f"Expected JSON with '{field}' field"
+    if data['titulo']=='':
+        return "Informe um nome/título"
+    return None
+
+
+def triplas_objeto(data, object_id):
+    """
+    Triplas do objeto físico para um INSERT DATA (com PREFIX : do repositório).
+    Levanta ValueError/TypeError/KeyError para valores que não cabem no SPARQL.
+    """
+    objeto_uri = nome_local(object_id)
+    colecao = data['colecao'].split('#')[-1]
+
+    tem_relacao_part = f':temRelacao {", ".join(iri(relacao) for relacao in data["temRelacao"])}' if "temRelacao" in data and data["temRelacao"] else ''
+    associated_media_part = f'schema:associatedMedia {", ".join(iri(url) for url in data["associatedMedia"])}' if "associatedMedia" in data and data["associatedMedia"] else ''
+    colecao_part = f'obj:colecao {nome_local(colecao)}' if "colecao" in data and data["colecao"] else ''
+    tipo_fisico_part = f'obj:tipoFisico {", ".join(nome_local(tipo) for tipo in data["tipoFisicoAbreviado"])}' if "tipoFisicoAbreviado" in data and data["tipoFisicoAbreviado"] else ''
+
+    # Montando a lista de partes da query
+    parts = [
+        f'dc:description {literal(data["descricao"])}',
+        f'dc:abstract {literal(data["resumo"])}',
+        f'dc:title {literal(data["titulo"])}',
+        colecao_part,
+        tem_relacao_part,
+        associated_media_part,
+        tipo_fisico_part
+    ]
+
+    # Remover partes vazias (strings vazias ou espaços em branco)
+    parts = [part for part in parts if part.strip()]
+    separador = ' ;\n                                '
+    return f"""{objeto_uri} rdf:type obj:ObjetoFisico ;
+                                {separador.join(parts)} ."""
+
+
 @objectapi_app.route('/create', methods=['POST'])
 @token_required
 def create():
     try:
         data = request.get_json()
-        required_fields = ['descricao', 'titulo', 'resumo','colecao','repository']
+        erro = validar_objeto(data)
+        if erro:
+            return jsonify({"error": "Invalid input", "message": erro}), 400
         repo = data['repository']
-        for field in required_fields:
-            if field not in data:
-                return jsonify({"error": "Invalid input", "message": f"Expected JSON with '{field}' field"}), 400
-        
-        if data['titulo']=='':
-            return jsonify({"error": "Invalid input", "message": "Informe um nome/título"}), 400
-        
-        object_id = str(uuid.uuid4())
-        colecao = data['colecao'].split('#')[-1] 
-        
 
-        objeto_uri = f":{object_id}"
-        sparqapi_url = repo+'/'+load_config().get('update')
-        
-        
-        tem_relacao_part = f':temRelacao {", ".join(f"<{relacao}>" for relacao in data["temRelacao"])}' if "temRelacao" in data and data["temRelacao"] else ''
-        associated_media_part = f'schema:associatedMedia {", ".join(f"<{url}>" for url in data["associatedMedia"])}' if "associatedMedia" in data and data["associatedMedia"] else ''
-        colecao_part = f'obj:colecao :{colecao}' if "colecao" in data and data["colecao"] else ''
-        tipo_fisico_part = f'obj:tipoFisico {", ".join(f":{tipo}" for tipo in data["tipoFisicoAbreviado"])}' if "tipoFisicoAbreviado" in data and data["tipoFisicoAbreviado"] else ''
-
-        #print (tipo_fisico_part)
-        # Montando a lista de partes da query
-        descricao = '"""' + data["descricao"].replace('"""', '\\"""') + '"""'
-        resumo = '"""' + data["resumo"].replace('"""', '\\"""') + '"""'
-        titulo = '"""' + data["titulo"].replace('"""', '\\"""') + '"""'
-        parts = [
-            f'dc:description {descricao}',
-            f'dc:abstract {resumo}',
-            f'dc:title {titulo}',
-            colecao_part,
-            tem_relacao_part,
-            associated_media_part,
-            tipo_fisico_part
-        ]
-
-        # Remover partes vazias (strings vazias ou espaços em branco)
-        parts = [part for part in parts if part.strip()]
+        object_id = str(uuid.uuid4())
+        sparqapi_url = repo+'/'+get_settings().update
 
         # Construção final da query SPARQL
         sparql_query = f"""{get_prefix()}
             PREFIX : <{repo}#>
             INSERT DATA {{
-                {objeto_uri} rdf:type obj:ObjetoFisico ;
-                                { ' ;\n'.join(parts) } .
+                {triplas_objeto(data, object_id)}
             }}
         """
 
         print('->', sparql_query)  # Debugging
         # Enviar a query SPARQL para o endpoint de atualização
-        headers = {'Content-Type': 'application/x-www-form-urlencoded; charset=UTF-8',
-                   'Accept': 'application/sparql-results+json,*/*;q=0.9',
-                   'X-Requested-With': 'XMLHttpRequest'}
-        data = {'update': sparql_query}
-        encoded_data = urlencode(data)
-
-        response = requests.post(
-            sparqapi_url, headers=headers, data=encoded_data)
+        response = sparql_client.update(sparqapi_url, sparql_query)
 
         if response.status_code == 200:
+            indice_busca.indexar(repo, f"{repo}#{object_id}", data['titulo'], data['resumo'], data['descricao'])
             return jsonify({"message": "Objeto digital adicionado com sucesso", "id": object_id}), 200
         else:
             print (response.text)
@@ -209,9 +190,19 @@ def create():
     except KeyError as e:
         return jsonify({"error3": "KeyError", "message": str(e)}), 400
 
+    except (TypeError, ValueError) as e:
+        return jsonify({"error3": type(e).__name__, "message": str(e)}), 400
+
     except Exception as e:
         return jsonify({"error4": "Exception", "message": str(e)}), 500
 
+
+@objectapi_app.route('/bulk', methods=['POST'])
+@token_required
+def bulk():
+    # Corpo NDJSON: um objeto por linha, no mesmo formato de /create
+    return ingestao_ndjson(validar_objeto, triplas_objeto)
+
 @objectapi_app.route('/delete', methods=['DELETE'])
 @token_required
 def excluir_objeto_fisico():
@@ -227,7 +218,7 @@ def excluir_objeto_fisico():
         objeto_id = data["id"]
         
         objeto_uri = f":{objeto_id}"
-        sparqapi_url = f"{repo}/{load_config().get('update')}"
+        sparqapi_url = f"{repo}/{get_settings().update}"
         
         sparql_query = f"""{get_prefix()}
             PREFIX : <{repo}#>
@@ -236,18 +227,10 @@ def excluir_objeto_fisico():
             }}
         """
         #print (sparql_query)
-        headers = {
-            'Content-Type': 'application/x-www-form-urlencoded; charset=UTF-8',
-            'Accept': 'application/sparql-results+json,*/*;q=0.9',
-            'X-Requested-With': 'XMLHttpRequest'
-        }
-
-        data = {'update': sparql_query}
-        encoded_data = urlencode(data)
-
-        response = requests.post(sparqapi_url, headers=headers, data=encoded_data)
+        response = sparql_client.update(sparqapi_url, sparql_query)
 
         if response.status_code == 200:
+            indice_busca.remover(repo, f"{repo}#{objeto_id}")
             return jsonify({"message": "Objeto físico excluído com sucesso", "id": objeto_id}), 200
         else:
             #print(response.text)
@@ -275,10 +258,10 @@ def remover_relacao():
         
         s = data["s"]
         p = data["p"]
-        o = data["s"]
+        o = data["o"]
         
         
-        sparqapi_url = f"{repo}/{load_config().get('update')}"
+        sparqapi_url = f"{repo}/{get_settings().update}"
         
         sparql_query = f"""{get_prefix()}
             PREFIX : <{repo}#>
@@ -287,16 +270,7 @@ def remover_relacao():
             }}
         """
         
-        headers = {
-            'Content-Type': 'application/x-www-form-urlencoded; charset=UTF-8',
-            'Accept': 'application/sparql-results+json,*/*;q=0.9',
-            'X-Requested-With': 'XMLHttpRequest'
-        }
-
-        data = {'update': sparql_query}
-        encoded_data = urlencode(data)
-
-        response = requests.post(sparqapi_url, headers=headers, data=encoded_data)
+        response = sparql_client.update(sparqapi_url, sparql_query)
 
         if response.status_code == 200:
             return jsonify({"message": "relação excluído com sucessa", "id": '{s} {p} {o}'}), 200
@@ -332,7 +306,7 @@ def update():
         objeto_uri = f":{object_id}"
         colecao = data['colecao'].split('#')[-1] 
         
-        sparqapi_url = repo + '/' + load_config().get('update')
+        sparqapi_url = repo + '/' + get_settings().update
                 
         
         tipo_fisico_part = f'obj:tipoFisico {", ".join(f"obj:{tipo}" for tipo in data["tipoFisicoAbreviado"])}' if "tipoFisicoAbreviado" in data and data["tipoFisicoAbreviado"] else ''
@@ -371,20 +345,14 @@ def update():
                 }}
             """
             print('#query:',sparql_query)
-            headers = {'Content-Type': 'application/x-www-form-urlencoded; charset=UTF-8',
-                   'Accept': 'application/sparql-results+json,*/*;q=0.9',
-                   'X-Requested-With': 'XMLHttpRequest'}
-            data = {'update': sparql_query}
-            encoded_data = urlencode(data)
-            
-            response = requests.post(
-                sparqapi_url, headers=headers, data=encoded_data)
+            response = sparql_client.update(sparqapi_url, sparql_query)
 
             
             
 
 
             if response.status_code == 200:
+                indice_busca.indexar(repo, f"{repo}#{object_id}", data['titulo'], data['resumo'], data['descricao'])
                 return jsonify({"message": "Objeto atualizado com sucesso", "id": object_id}), 200
             else:
                 return jsonify({"error": response.status_code, "message": response.text}), response.status_code
@@ -410,29 +378,43 @@ def adicionar_relacao():
     except KeyError as e:
         return jsonify({"error": "KeyError", "message": str(e)}), 400
 
-def add_relation(objeto_uri, repositorio_uri, midia_uri, propriedade, repository):
-    try:
-        objeto = objeto_uri
-        repositorio = repositorio_uri
-        midia = midia_uri
-        propriedade = propriedade
-        repo = repository
-        sparqapi_url = repo+'/'+load_config().get('update')
-        sparql_query = f"""{get_prefix()}
+def add_relations(objeto_uri, propriedade, midias, repository):
+    """
+    Grava todas as relações objeto -> mídia num único INSERT DATA.
+    Retorna a resposta do Fuseki.
+    """
+    repo = repository
+    sparqapi_url = repo+'/'+get_settings().update
+    sparql_query = f"""{get_prefix()}
         PREFIX : <{repo}#>
         INSERT DATA {{
-        {objeto} {propriedade} {midia} .
+        {objeto_uri} {propriedade} {", ".join(midias)} .
         }}
         """
-        print('add relação:',sparql_query, ' no repositório ', sparqapi_url)
-        headers = {'Content-Type': 'application/x-www-form-urlencoded; charset=UTF-8',
-                   'Accept': 'application/sparql-results+json,*/*;q=0.9',
-                   'X-Requested-With': 'XMLHttpRequest'}
-        data = {'update': sparql_query}
-        encoded_data = urlencode(data)
-
-        response = requests.post(
-            sparqapi_url, headers=headers, data=encoded_data)
+    print('add relações:',sparql_query, ' no repositório ', sparqapi_url)
+    return sparql_client.update(sparqapi_url, sparql_query)
+
+
+def remove_relations(objeto_uri, propriedade, midias, repository):
+    """
+    Remove as relações objeto -> mídia num único DELETE DATA.
+    Retorna a resposta do Fuseki.
+    """
+    repo = repository
+    sparqapi_url = repo+'/'+get_settings().update
+    sparql_query = f"""{get_prefix()}
+        PREFIX : <{repo}#>
+        DELETE DATA {{
+        {objeto_uri} {propriedade} {", ".join(midias)} .
+        }}
+        """
+    return sparql_client.update(sparqapi_url, sparql_query)
+
+
+def add_relation(objeto_uri, repositorio_uri, midia_uri, propriedade, repository):
+    try:
+        objeto = objeto_uri
+        response = add_relations(objeto, propriedade, [midia_uri], repository)
 
         if response.status_code == 200:
             return jsonify({"message": "Objeto digital adicionado com sucesso", "id": objeto}), 200
@@ -2,88 +2,51 @@ from flask import Blueprint, request, jsonify,current_app
 import requests, os
 import uuid
 # Importe suas funções corretamente
-from ..consultas import get_sparq_all,get_sparq_dim, get_prefix
-from ..config_loader import load_config
-from urllib.parse import urlencode
+from ..consultas import get_sparq_relacoes, get_prefix
+from ..config_loader import get_settings
+from .. import sparql_client, indice_busca
+from .utils.sparql_resposta import Consulta, EntradaInvalida, erro_listagem, responder
 from ..blueprints.auth import token_required
 relationapi_app = Blueprint('relationapi_app', __name__)
 
 
-@relationapi_app.route('/list', methods=['GET','POST'])
-def list():
-    try:
-        data = request.get_json()
-        if 'keyword' not in data:
-            return jsonify({"error": "Invalid input", "message": "Expected JSON with 'keyword' field"}), 400
-        if 'repository' not in data:
-            return jsonify({"error": 'Invalid input', "message": "Expected JSON with 'repository' "}), 400
-        if 'id' not in data:
-            return jsonify({"error": 'Invalid input', "message": "Expected JSON with 'id' "}), 400
-        if data['repository']=='' :
-            return jsonify({"error": 'Invalid input', "message": "Expected JSON with 'repository' "}), 400
-        
-        objectUri = data['id']
-        keyword = data['keyword']
-        repo = data['repository']
-        type = data['type']
-        
-        prefix_base = repo  + "#"
-        sparqapi_url = repo
-        
-        sparql_query = get_prefix() + f"""
-                SELECT ?id ?propriedade ?valor  
-                    (IF(isURI(?valor), "URI", "Literal") AS ?tipo_recurso)
-                    ?titulo
-                WHERE {{
-                {{
-                    # Relações diretas
-                    ?id ?propriedade ?valor .
-                    FILTER(?id = <{objectUri}>)
-                }}
-                UNION
-                {{
-                    # Relações inversas
-                    ?valor ?propriedade ?id .
-                    FILTER(?id = <{objectUri}>)
-                    BIND("direta" AS ?direcao)
-                }}
-                OPTIONAL {{
-                    ?valor dc:title ?titulo .
-                    FILTER(isURI(?valor))
-                    BIND("direta" AS ?direcao)
-                }}
-                }}
-                """
-
-        print('query',sparql_query) 
-        headers = {'Content-Type': 'application/x-www-form-urlencoded; charset=UTF-8',
-                   'Accept': 'application/sparql-results+json,*/*;q=0.9',
-                   'X-Requested-With': 'XMLHttpRequest'}
-        data = {'query': sparql_query}
-        encoded_data = urlencode(data)
-        
-        response = requests.post(
-            sparqapi_url, headers=headers, data=encoded_data)
-        
+def _indexada(propriedade):
+    # <http://purl.org/dc/terms/title>, dc:title, ...
+    propriedade = propriedade.strip().strip('<>')
+    if propriedade.startswith('dc:'):
+        propriedade = 'http://purl.org/dc/terms/' + propriedade[3:]
+    return propriedade in indice_busca.PROPRIEDADES
 
-        if response.status_code == 200:
-            result = response.json()
-            return jsonify(result)
-        else:
-            return jsonify({"error": response.status_code, "message": response.text}), response.status_code
 
-    except requests.exceptions.RequestException as e:
-        return jsonify({"error": "RequestException", "message": str(e)}), 500
+def consulta_list(data, args=None):
+    """Valida o corpo de /relation/list e monta a consulta (também usada por app/asgi.py)."""
+    if 'keyword' not in data:
+        raise EntradaInvalida("Expected JSON with 'keyword' field")
+    if 'repository' not in data:
+        raise EntradaInvalida("Expected JSON with 'repository' ")
+    if 'id' not in data:
+        raise EntradaInvalida("Expected JSON with 'id' ")
+    if data['repository'] == '':
+        raise EntradaInvalida("Expected JSON with 'repository' ")
 
-    except KeyError as e:
-        return jsonify({"error": "KeyError", "message": str(e)}), 400
+    objectUri = data['id']
+    keyword = data['keyword']
+    repo = data['repository']
+    type = data['type']
 
-    except TypeError as e:
-        return jsonify({"error": "TypeError", "message": str(e)}), 400
+    sparql_query = get_sparq_relacoes(objectUri)
+
+    print('query',sparql_query)
+    return Consulta(repo, sparql_query)
 
-    except Exception as e:
-        return jsonify({"error": "Exception", "message": str(e)}), 500
 
+@relationapi_app.route('/list', methods=['GET','POST'])
+def list():
+    try:
+        return responder(consulta_list(request.get_json()))
+    except Exception as e:
+        corpo, status = erro_listagem(e)
+        return jsonify(corpo), status
 
 
 @relationapi_app.route('/add', methods=['POST'])
@@ -117,16 +80,11 @@ def add():
 
         print('->', sparql_query)  # Debugging
         # Enviar a query SPARQL para o endpoint de atualização
-        headers = {'Content-Type': 'application/x-www-form-urlencoded; charset=UTF-8',
-                   'Accept': 'application/sparql-results+json,*/*;q=0.9',
-                   'X-Requested-With': 'XMLHttpRequest'}
-        data = {'update': sparql_query}
-        encoded_data = urlencode(data)
-
-        response = requests.post(
-            sparqapi_url, headers=headers, data=encoded_data)
+        response = sparql_client.update(sparqapi_url, sparql_query)
 
         if response.status_code == 200:
+            if _indexada(property):
+                indice_busca.atualizar_objeto(repo, f"{repo}#{object_id}")
             return jsonify({"message": "Objeto digital adicionado com sucesso", "id": object_id}), 200
         else:
             print (response.text)
@@ -156,7 +114,7 @@ def remove():
         objeto_id = data["id"]
         #print(objeto_id)
         objeto_uri = f":{objeto_id}"
-        sparqapi_url = f"{repo}/{load_config().get('update')}"
+        sparqapi_url = f"{repo}/{get_settings().update}"
         
         sparql_query = f"""{get_prefix()}
             PREFIX : <{repo}#>
@@ -165,18 +123,10 @@ def remove():
             }}
         """
         #print (sparql_query)
-        headers = {
-            'Content-Type': 'application/x-www-form-urlencoded; charset=UTF-8',
-            'Accept': 'application/sparql-results+json,*/*;q=0.9',
-            'X-Requested-With': 'XMLHttpRequest'
-        }
-
-        data = {'update': sparql_query}
-        encoded_data = urlencode(data)
-
-        response = requests.post(sparqapi_url, headers=headers, data=encoded_data)
+        response = sparql_client.update(sparqapi_url, sparql_query)
 
         if response.status_code == 200:
+            indice_busca.remover(repo, f"{repo}#{objeto_id}")
             return jsonify({"message": "Objeto físico excluído com sucesso", "id": objeto_id}), 200
         else:
             #print(response.text)
@@ -207,7 +157,7 @@ def remover_relacao():
         o = data["s"]
         
         
-        sparqapi_url = f"{repo}/{load_config().get('update')}"
+        sparqapi_url = f"{repo}/{get_settings().update}"
         
         sparql_query = f"""{get_prefix()}
             PREFIX : <{repo}#>
@@ -216,18 +166,12 @@ def remover_relacao():
             }}
         """
         
-        headers = {
-            'Content-Type': 'application/x-www-form-urlencoded; charset=UTF-8',
-            'Accept': 'application/sparql-results+json,*/*;q=0.9',
-            'X-Requested-With': 'XMLHttpRequest'
-        }
-
-        data = {'update': sparql_query}
-        encoded_data = urlencode(data)
-
-        response = requests.post(sparqapi_url, headers=headers, data=encoded_data)
+        response = sparql_client.update(sparqapi_url, sparql_query)
 
         if response.status_code == 200:
+            if _indexada(p):
+                # s é um termo SPARQL qualquer: sem o objeto, o índice inteiro sai de uso
+                indice_busca.desmarcar(repo)
             return jsonify({"message": "relação excluído com sucessa", "id": '{s} {p} {o}'}), 200
         else:
             #print(response.text)
@@ -263,7 +207,7 @@ def update():
         titulo=data['titulo']
         object_id = data['id']
         objeto_uri = f":{object_id}"
-        sparqapi_url = repo+'/'+load_config().get('update')
+        sparqapi_url = repo+'/'+get_settings().update
         
         
 
@@ -286,16 +230,10 @@ def update():
             }}
         """
         print('update',sparql_query)   
-        headers = {'Content-Type': 'application/x-www-form-urlencoded; charset=UTF-8',
-                'Accept': 'application/sparql-results+json,*/*;q=0.9',
-                'X-Requested-With': 'XMLHttpRequest'}
-        data = {'update': sparql_query}
-        encoded_data = urlencode(data)
-         
-        response = requests.post(
-            sparqapi_url, headers=headers, data=encoded_data)
+        response = sparql_client.update(sparqapi_url, sparql_query)
 
         if response.status_code == 200:
+            indice_busca.atualizar_objeto(repo, f"{repo}#{object_id}")
             return jsonify({"message": "Objeto atualizado com sucesso", "id": object_id}), 200
         else:
             return jsonify({"error": response.status_code, "message": response.text}), response.status_code
@@ -316,7 +254,7 @@ def add_relation():
         midia = data["midia_uri"]
         propriedade = data["propriedade"]
         repo = data['repository']
-        sparqapi_url = repo+'/'+load_config().get('update')
+        sparqapi_url = repo+'/'+get_settings().update
         sparql_query = f"""{get_prefix()}
         PREFIX : <{repo}#>
         INSERT DATA {{
@@ -324,16 +262,11 @@ def add_relation():
         }}
         """
         #print('add relação:',sparql_query, ' no repositório ', sparqapi_url)
-        headers = {'Content-Type': 'application/x-www-form-urlencoded; charset=UTF-8',
-                   'Accept': 'application/sparql-results+json,*/*;q=0.9',
-                   'X-Requested-With': 'XMLHttpRequest'}
-        data = {'update': sparql_query}
-        encoded_data = urlencode(data)
-
-        response = requests.post(
-            sparqapi_url, headers=headers, data=encoded_data)
+        response = sparql_client.update(sparqapi_url, sparql_query)
 
         if response.status_code == 200:
+            if _indexada(propriedade):
+                indice_busca.desmarcar(repo)
             return jsonify({"message": "Objeto digital adicionado com sucesso", "id": objeto}), 200
         else:
             #print (response.text)
@@ -1,9 +1,8 @@
 from flask import Blueprint, request, jsonify
 import requests
 from app.consultas import get_sparq_repo, get_prefix
-from app.config_loader import load_config
-from urllib.parse import urlencode
-from app.config_loader import load_config
+from app.config_loader import get_settings
+from app import sparql_client
 from auth import token_required 
 from utils.file_utils import salvar_arquivos
 from werkzeug.utils import secure_filename
@@ -29,9 +28,9 @@ def create():
 
         
 
-        prefix_base = load_config().get('prefix_base_repo')
+        prefix_base = get_settings().prefix_base_repo
         repo_uri=prefix_base+data['uri']
-        sparqapi_url = load_config().get('class_update_url')
+        sparqapi_url = get_settings().class_update_url
         
         # Montagem da query SPARQL de inserção
         sparql_query = f"""
@@ -54,18 +53,8 @@ def create():
         #print('uri', repo_uri)
         #print('q', sparql_query)
 
-        # Preparação dos headers e dados para a requisição POST
-        headers = {
-            'Content-Type': 'application/x-www-form-urlencoded; charset=UTF-8',
-            'Accept': 'application/sparql-results+json,*/*;q=0.9',
-            'X-Requested-With': 'XMLHttpRequest'
-        }
-        data_envio = {'update': sparql_query}
-        encoded_data = urlencode(data_envio)
-
         # Enviar a query SPARQL para o endpoint de atualização
-        response = requests.post(
-            sparqapi_url, headers=headers, data=encoded_data)
+        response = sparql_client.update(sparqapi_url, sparql_query)
 
         if response.status_code == 200:
             return jsonify({"message": "Classe adicionada com sucesso", "id": data['label']}), 200
@@ -108,9 +97,9 @@ def update():
                     arquivos_salvos.append(filename)
 
 
-        prefix_base = load_config().get('prefix_base_repo')
+        prefix_base = get_settings().prefix_base_repo
         repo_uri=prefix_base+data['uri']
-        sparqapi_url = load_config().get('class_update_url')
+        sparqapi_url = get_settings().class_update_url
         
         # Montagem da query SPARQL de inserção
         sparql_query = f"""
@@ -135,18 +124,8 @@ def update():
         #print('uri', repo_uri)
         #print('q', sparql_query)
 
-        # Preparação dos headers e dados para a requisição POST
-        headers = {
-            'Content-Type': 'application/x-www-form-urlencoded; charset=UTF-8',
-            'Accept': 'application/sparql-results+json,*/*;q=0.9',
-            'X-Requested-With': 'XMLHttpRequest'
-        }
-        data_envio = {'update': sparql_query}
-        encoded_data = urlencode(data_envio)
-
         # Enviar a query SPARQL para o endpoint de atualização
-        response = requests.post(
-            sparqapi_url, headers=headers, data=encoded_data)
+        response = sparql_client.update(sparqapi_url, sparql_query)
 
         if response.status_code == 200:
             return jsonify({"message": "Classe adicionada com sucesso", "id": data['label']}), 200
@@ -1,19 +1,22 @@
 from flask import Blueprint, request, jsonify
-import requests
+import requests, os
 from ..consultas import get_sparq_repo, get_prefix
-from ..config_loader import load_config
-from urllib.parse import urlencode
-from ..config_loader import load_config
+from .. import sparql_client, indice_busca, carregador_rdf
+from .utils.sparql_resposta import Consulta, erro_listagem, responder
+from ..config_loader import get_settings
+from ..blueprints.auth import token_required
 
 repo_app = Blueprint('repo_app', __name__)
 
 
 def obter_repositorio_por_nome(name):
-    response = list()  # Chama a função
+    # Usado no login: consulta direto pelo cliente compartilhado
+    sparqapi_url = get_settings().repo_query_url
+    response = sparql_client.query(sparqapi_url, get_sparq_repo())
     if response.status_code != 200:   # Verifica erro na resposta
         return None
    
-    repositorios = response.get_json()  # Extrai o JSON corretamente
+    repositorios = response.json()  # Extrai o JSON corretamente
 
     
 
@@ -32,40 +35,43 @@ def obter_repositorio_por_nome(name):
     
     return None  # Se não encontrar o repositórioreturn None 
 
+def consulta_list(data, args):
+    """Monta a consulta de /repositorios/list (também usada por app/asgi.py)."""
+    nome = args.get('name', default=None, type=str)
+    sparqapi_url = get_settings().repo_query_url
+    #print('url:',sparqapi_url)
+    sparql_query = get_sparq_repo(nome)
+
+    print('query:',sparql_query)
+    return Consulta(sparqapi_url, sparql_query)
+
+
 @repo_app.route('/list', methods=['GET','POST'])
 @repo_app.route('/listar_repositorios', methods=['GET','POST'])
 def list():
     try:
-        nome = request.args.get('name', default=None, type=str)
-        filtro = f'FILTER(?nome = "{nome}"^^xsd:string)' if nome else ''
-        sparqapi_url = load_config().get('repo_query_url')
-        #print('url:',sparqapi_url)
-        sparql_query = get_sparq_repo().replace("%filter%", filtro)
-                        
-        print('query:',sparql_query)
-        headers = {'Content-Type': 'application/x-www-form-urlencoded; charset=UTF-8',
-                   'Accept': 'application/sparql-results+json,*/*;q=0.9',
-                   'X-Requested-With': 'XMLHttpRequest'}
-        data = {'query': sparql_query}
-        encoded_data = urlencode(data)
-
-        response = requests.post(
-            sparqapi_url, headers=headers, data=encoded_data)
+        return responder(consulta_list(None, request.args))
+    except Exception as e:
+        corpo, status = erro_listagem(e)
+        return jsonify(corpo), status
 
-        if response.status_code == 200:
-            result = response.json()
-            return jsonify(result)
-        else:
-            return jsonify({"error": response.status_code, "message": response.text}), response.status_code
 
-    except requests.exceptions.RequestException as e:
-        return jsonify({"error": "RequestException", "message": str(e)}), 500
+@repo_app.route('/reindexar', methods=['POST'])
+@token_required
+def reindexar():
+    # Recria o índice local de busca textual do repositório informado
+    try:
+        data = request.get_json()
+        if not data or not data.get('repository'):
+            return jsonify({"error": 'Invalid input', "message": "Expected JSON with 'repository' "}), 400
 
-    except KeyError as e:
-        return jsonify({"error": "KeyError", "message": str(e)}), 400
+        total = indice_busca.reindexar(data['repository'])
+        transcricoes = indice_busca.reindexar_transcricoes(data['repository'])
+        return jsonify({"message": "Repositório indexado com sucesso", "indexados": total,
+                        "transcricoes": transcricoes}), 200
 
-    except TypeError as e:
-        return jsonify({"error": "TypeError", "message": str(e)}), 400
+    except requests.exceptions.RequestException as e:
+        return jsonify({"error": "RequestException", "message": str(e)}), 500
 
     except Exception as e:
         return jsonify({"error": "Exception", "message": str(e)}), 500
@@ -84,9 +90,9 @@ def create():
 
         
 
-        prefix_base = load_config().get('prefix_base_repo')
+        prefix_base = get_settings().prefix_base_repo
         repo_uri=prefix_base+data['uri']
-        sparqapi_url = load_config().get('class_update_url')
+        sparqapi_url = get_settings().class_update_url
         
         # Montagem da query SPARQL de inserção
         sparql_query = f"""
@@ -109,18 +115,8 @@ def create():
         #print('uri', repo_uri)
         #print('q', sparql_query)
 
-        # Preparação dos headers e dados para a requisição POST
-        headers = {
-            'Content-Type': 'application/x-www-form-urlencoded; charset=UTF-8',
-            'Accept': 'application/sparql-results+json,*/*;q=0.9',
-            'X-Requested-With': 'XMLHttpRequest'
-        }
-        data_envio = {'update': sparql_query}
-        encoded_data = urlencode(data_envio)
-
         # Enviar a query SPARQL para o endpoint de atualização
-        response = requests.post(
-            sparqapi_url, headers=headers, data=encoded_data)
+        response = sparql_client.update(sparqapi_url, sparql_query)
 
         if response.status_code == 200:
             return jsonify({"message": "Classe adicionada com sucesso", "id": data['label']}), 200
@@ -149,6 +145,8 @@ def criar_dataset():
 
         nome_dataset = data['nome']
         tipo_dataset = data.get('tipo', 'tdb2') 
+        # Arquivos de ontology/ a carregar no dataset depois de criado
+        ontologias = [carregador_rdf.arquivo_ontologia(nome) for nome in data.get('ontologias') or []]
 
         # URL do Fuseki
         fuseki_admin_url = 'http://localhost:3030/$/datasets'  # ou IP externo
@@ -164,14 +162,21 @@ def criar_dataset():
         }
 
         # Enviar requisição
-        response = requests.post(
+        response = sparql_client.get_session(fuseki_admin_url).post(
             fuseki_admin_url,
             data=form_data,
             auth=(username, password)
         )
 
         if response.status_code == 200:
-            return jsonify({"message": "Dataset criado com sucesso", "nome": nome_dataset}), 200
+            # Carga opcional de arquivos de ontology/ no dataset recém-criado
+            carregados = {}
+            dataset_url = fuseki_admin_url.split('/$/')[0] + '/' + nome_dataset
+            for caminho in ontologias:
+                carregados[os.path.basename(caminho)] = carregador_rdf.carregar_arquivo(
+                    dataset_url, caminho, recomecar=True, auth=(username, password))
+            return jsonify({"message": "Dataset criado com sucesso", "nome": nome_dataset,
+                            "triplas": carregados}), 200
         else:
             return jsonify({
                 "error": response.status_code,
@@ -181,5 +186,11 @@ def criar_dataset():
     except requests.exceptions.RequestException as e:
         return jsonify({"error": "RequestException", "message": str(e)}), 500
 
+    except carregador_rdf.ErroCarga as e:
+        return jsonify({"error": "ErroCarga", "message": str(e)}), 502
+
+    except ValueError as e:
+        return jsonify({"error": "ValueError", "message": str(e)}), 400
+
     except Exception as e:
         return jsonify({"error": "Exception", "message": str(e)}), 500
\ No newline at end of file
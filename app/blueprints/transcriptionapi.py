@@ -1,35 +1,131 @@
-from flask import Blueprint, request, jsonify
-from kraken import binarization, pageseg, rpred
-from PIL import Image
-from pdf2image import convert_from_bytes
-import io
+from flask import Blueprint, Response, request, jsonify, stream_with_context, url_for
+import json
+from .. import indice_busca, ocr_jobs
+from ..config_loader import get_settings
+from ..blueprints.auth import autenticar, token_required
+from .utils.sparql_resposta import limite_pagina
 
 bp_transcricao = Blueprint('transcricao', __name__)
 
+
+def _quer_stream():
+    # ?stream=1 ou Accept: application/x-ndjson
+    return request.args.get('stream') in ('1', 'true') or \
+        request.accept_mimetypes.best == 'application/x-ndjson'
+
+
+def _stream(job_id):
+    """
+    Uma linha NDJSON por página, na ordem em que o worker as conclui, e uma
+    linha final com o estado do trabalho (ainda pendente ou executando se
+    passar de ocr_stream_prazo: o cliente segue pela URL de status).
+    """
+    def gerar():
+        yield json.dumps({'id': job_id, 'status': url_for('transcricao.status', job_id=job_id)}) + '\n'
+        for evento in ocr_jobs.acompanhar(job_id):
+            yield json.dumps(evento, ensure_ascii=False) + '\n'
+
+    return Response(stream_with_context(gerar()), content_type='application/x-ndjson',
+                    headers={'X-Accel-Buffering': 'no'})
+
+
 @bp_transcricao.route('/api/transcricao', methods=['POST'])
 def transcrever():
     if 'arquivo' not in request.files:
         return jsonify({'erro': 'Envie um arquivo PDF ou imagem com a chave "arquivo".'}), 400
 
     arquivo = request.files['arquivo']
-    nome = arquivo.filename.lower()
-
-    resultados = []
+    # Opcionais: a transcrição fica gravada no objeto e pesquisável
+    objeto_id = request.form.get('objetoId')
+    repository = request.form.get('repository')
+    # Valor de schema:associatedMedia da mídia no objeto; sem ele, vale a
+    # mídia do objeto com o mesmo conteúdo do arquivo enviado
+    midia = request.form.get('midia')
+    if objeto_id and not repository:
+        return jsonify({'erro': 'Informe o repository do objeto.'}), 400
+    if objeto_id:
+        # Só a transcrição avulsa é aberta; gravar no objeto exige login
+        erro = autenticar()
+        if erro is not None:
+            return erro
 
     try:
-        if nome.endswith('.pdf'):
-            paginas = convert_from_bytes(arquivo.read())
-        else:
-            paginas = [Image.open(arquivo.stream)]
+        # O OCR roda no worker (python -m app.ocr_jobs); aqui só entra na fila
+        job_id = ocr_jobs.criar(arquivo, repository, f'{repository}#{objeto_id}' if objeto_id else None, midia)
+        if _quer_stream():
+            return _stream(job_id)
+        return jsonify({
+            'id': job_id,
+            'estado': ocr_jobs.PENDENTE,
+            'status': url_for('transcricao.status', job_id=job_id)
+        }), 202
 
-        for i, img in enumerate(paginas):
-            bin_img = binarization.nlbin(img)
-            linhas = pageseg.segment(bin_img)
-            predicoes = rpred.rpred(model='default', im=bin_img, bounds=linhas)
-            texto = '\n'.join([line.prediction for line in predicoes])
-            resultados.append({'pagina': i + 1, 'texto': texto})
+    except ocr_jobs.FilaCheia as e:
+        return jsonify({'erro': str(e)}), 503, {'Retry-After': '30'}
 
-        return jsonify({'transcricoes': resultados})
+    except ValueError as e:
+        return jsonify({'erro': str(e)}), 400
 
     except Exception as e:
         return jsonify({'erro': str(e)}), 500
+
+
+@bp_transcricao.route('/api/transcricao/lote', methods=['POST'])
+@token_required
+def transcrever_lote():
+    # Transcreve as mídias do repositório (ou da coleção) que ainda não têm texto
+    data = request.get_json(silent=True) or {}
+    if not data.get('repository'):
+        return jsonify({"error": 'Invalid input', "message": "Expected JSON with 'repository' "}), 400
+
+    try:
+        job_id = ocr_jobs.criar_lote(data['repository'], data.get('colecao'))
+        return jsonify({
+            'id': job_id,
+            'estado': ocr_jobs.PENDENTE,
+            'status': url_for('transcricao.status', job_id=job_id)
+        }), 202
+
+    except ocr_jobs.FilaCheia as e:
+        return jsonify({'erro': str(e)}), 503, {'Retry-After': '30'}
+
+    except Exception as e:
+        return jsonify({'erro': str(e)}), 500
+
+
+@bp_transcricao.route('/api/transcricao/busca', methods=['POST'])
+@token_required
+def buscar():
+    # Busca no texto das transcrições, só no índice local (sem Fuseki)
+    try:
+        data = request.get_json(silent=True) or {}
+        if not data.get('repository'):
+            return jsonify({"error": 'Invalid input', "message": "Expected JSON with 'repository' "}), 400
+        if not data.get('keyword'):
+            return jsonify({"error": "Invalid input", "message": "Expected JSON with 'keyword' field"}), 400
+
+        limite = limite_pagina(data) or get_settings().paginacao_limite_padrao
+        objetos = indice_busca.buscar_transcricoes(data['repository'], data['keyword'], limite)
+        return jsonify({'objetos': objetos}), 200
+
+    except ValueError as e:
+        return jsonify({"error": "ValueError", "message": str(e)}), 400
+
+    except Exception as e:
+        return jsonify({"error": "Exception", "message": str(e)}), 500
+
+
+@bp_transcricao.route('/api/transcricao/<job_id>', methods=['GET'])
+def status(job_id):
+    status = ocr_jobs.ler_status(job_id)
+    if status is None:
+        return jsonify({'erro': 'Transcrição não encontrada'}), 404
+    if _quer_stream():
+        return _stream(job_id)
+
+    status.pop('entrada', None)
+    if status.get('tipo') == 'lote':
+        status['midias'] = status.pop('resultados')
+    else:
+        status['transcricoes'] = sorted(status.pop('resultados'), key=lambda r: r['pagina'])
+    return jsonify(status)
@@ -1,7 +1,11 @@
 from flask import Blueprint, request, jsonify, current_app
-import os, uuid, shutil
-from werkzeug.utils import secure_filename
-from  ..blueprints.objectapi import add_relation
+import os, shutil
+from werkzeug.security import safe_join
+from  ..blueprints.objectapi import add_relations, remove_relations
+from ..blueprints.auth import token_required
+from ..consultas import literal
+from .. import derivados
+from .utils import cas, envio_midia, upload_parcial
 
 import requests 
 uploadapp = Blueprint('uploadapi', __name__)
@@ -11,73 +15,265 @@ def upload():
     # Obtém o ID do objeto a partir do formulário
     objeto_id = request.form.get('objetoId')
     repository = request.form.get('repository')
-    links = request.form.getlist('links')
-    arquivos = request.files.getlist('midias')    
-    
+    links = [link.strip() for link in request.form.getlist('links') if link.strip()]
+    arquivos = request.files.getlist('midias')
+
+    if not objeto_id:
+        return jsonify({'error': 'ID do objeto não fornecido'}), 400
+
+    # Verifica se arquivos foram enviados e se estão válidos (não vazios)
+    arquivos_validos = [file for file in arquivos if file and file.filename.strip() != '']
+
+    # Verifica se há ao menos um link ou ao menos um arquivo válido
+    if not arquivos_validos and len(links) == 0:
+        return jsonify({'error': 'Nenhuma mídia ou link enviado'}), 400
+
     upload_folder = current_app.config.get('UPLOAD_FOLDER')
     objeto_folder = os.path.join(upload_folder, str(objeto_id))
-    
+
     if not os.path.exists(objeto_folder):
         os.makedirs(objeto_folder)
 
+    # Situação de cada mídia na resposta; as relações das que foram salvas
+    # vão todas para o Fuseki num único update ao final
+    midias = []
+    relacoes = []
+
+    for file in arquivos_validos:
+        # Conteúdo já armazenado (mesmo SHA-256) só ganha um link na pasta do objeto
+        try:
+            file_path, novo = cas.salvar(upload_folder, file.stream, objeto_id, file.filename)
+        except OSError as e:
+            midias.append({'arquivo': file.filename, 'status': 'erro', 'message': str(e)})
+            continue
+        caminho = file_path.replace("\\", "/")
+        midias.append({'arquivo': file.filename, 'nome': os.path.basename(file_path), 'path': file_path,
+                       'novo': novo, 'status': 'salvo'})
+        relacoes.append(literal(caminho))
+
+    for link in links:
+        midias.append({'link': link, 'status': 'salvo'})
+        relacoes.append(literal(link))
+
+    if relacoes:
+        try:
+            response = add_relations(objeto_uri=f":{objeto_id}",
+                                     propriedade="schema:associatedMedia",
+                                     midias=relacoes,
+                                     repository=repository)
+            erro = None if response.status_code == 200 else response.text
+            status_erro = response.status_code
+        except requests.exceptions.RequestException as e:
+            erro, status_erro = str(e), 500
+
+        if erro is not None:
+            # Sem a relação os arquivos ficariam órfãos na pasta do objeto
+            for midia in midias:
+                if midia['status'] == 'salvo':
+                    if midia.get('novo'):
+                        cas.desvincular(upload_folder, midia['path'])
+                    midia['status'] = 'erro'
+                    midia['message'] = erro
+            return jsonify({'error': status_erro, 'message': erro,
+                            'midias': [_sem_path(m) for m in midias]}), status_erro
+
+    derivados.agendar(upload_folder, objeto_id,
+                      [m['nome'] for m in midias if m['status'] == 'salvo' and 'nome' in m])
+    return jsonify({
+        'message': 'Mídias adicionadas!',
+        'midias': [_sem_path(m) for m in midias]
+    }), 200
+
+
+def _sem_path(midia):
+    return {chave: valor for chave, valor in midia.items() if chave not in ('path', 'novo')}
+
+@uploadapp.route('/cas/verificar', methods=['POST'])
+@token_required
+def verificar_hashes():
+    # {sha256: [...]} -> quais conteúdos já estão armazenados e não precisam ser enviados
+    data = request.get_json(silent=True) or {}
+    hashes = data.get('sha256')
+    if not isinstance(hashes, list):
+        return jsonify({'error': 'Invalid input', 'message': "Expected JSON with 'sha256' list"}), 400
+    upload_folder = current_app.config.get('UPLOAD_FOLDER')
+    hashes = [str(h).lower() for h in hashes]
+    existentes = [h for h in hashes if cas.existe(upload_folder, h)]
+    return jsonify({'existentes': existentes,
+                    'faltando': [h for h in hashes if h not in existentes]}), 200
+
+
+@uploadapp.route('/vincular', methods=['POST'])
+@token_required
+def vincular():
+    # Associa ao objeto conteúdos já armazenados: {objetoId, repository, midias: [{sha256, nome}]}
+    data = request.get_json(silent=True) or {}
+    objeto_id = data.get('objetoId')
     if not objeto_id:
         return jsonify({'error': 'ID do objeto não fornecido'}), 400
+    if not isinstance(data.get('midias'), list) or not data['midias']:
+        return jsonify({'error': 'Nenhuma mídia ou link enviado'}), 400
 
+    upload_folder = current_app.config.get('UPLOAD_FOLDER')
+    midias = []
+    relacoes = []
+    for item in data['midias']:
+        sha256 = str(item.get('sha256', '')).lower()
+        nome = item.get('nome') or ''
+        if not cas.valido(sha256):
+            midias.append({'sha256': sha256, 'arquivo': nome, 'status': 'erro', 'message': 'Hash inválido'})
+            continue
+        try:
+            file_path, novo = cas.vincular(upload_folder, sha256, objeto_id, nome)
+        except FileNotFoundError as e:
+            midias.append({'sha256': sha256, 'arquivo': nome, 'status': 'erro', 'message': str(e)})
+            continue
+        midias.append({'sha256': sha256, 'arquivo': nome, 'nome': os.path.basename(file_path),
+                       'path': file_path, 'novo': novo, 'status': 'salvo'})
+        relacoes.append(literal(file_path.replace("\\", "/")))
 
+    if relacoes:
+        try:
+            response = add_relations(objeto_uri=f":{objeto_id}",
+                                     propriedade="schema:associatedMedia",
+                                     midias=relacoes,
+                                     repository=data.get('repository'))
+            erro = None if response.status_code == 200 else response.text
+            status_erro = response.status_code
+        except requests.exceptions.RequestException as e:
+            erro, status_erro = str(e), 500
 
-    # Verifica se arquivos foram enviados e se estão válidos (não vazios)
-    arquivos_validos = [file for file in arquivos if file and file.filename.strip() != '']
+        if erro is not None:
+            for midia in midias:
+                if midia['status'] == 'salvo':
+                    if midia['novo']:
+                        cas.desvincular(upload_folder, midia['path'])
+                    midia['status'] = 'erro'
+                    midia['message'] = erro
+            return jsonify({'error': status_erro, 'message': erro,
+                            'midias': [_sem_path(m) for m in midias]}), status_erro
+
+    derivados.agendar(upload_folder, objeto_id, [m['nome'] for m in midias if m['status'] == 'salvo'])
+    return jsonify({
+        'message': 'Mídias adicionadas!' if relacoes else 'Nenhuma mídia vinculada',
+        'midias': [_sem_path(m) for m in midias]
+    }), 200 if relacoes else 404
+
+
+@uploadapp.route('/midias/<objeto_id>/<filename>', methods=['GET'])
+def serve_midia(objeto_id, filename):
+    # Range, ETag/Last-Modified e offload para o servidor web: envio_midia
+    return envio_midia.enviar(str(objeto_id), filename)
+
+
+@uploadapp.route('/parcial', methods=['POST'])
+def iniciar_parcial():
+    # Início de um upload em partes: {objetoId, repository, nome, tamanho}
+    data = request.get_json(silent=True) or {}
+    if not data.get('objetoId'):
+        return jsonify({'error': 'ID do objeto não fornecido'}), 400
+    nome = data.get('nome') or ''
+    tamanho = data.get('tamanho')
+    if isinstance(tamanho, bool) or not isinstance(tamanho, int) or tamanho <= 0:
+        return jsonify({'error': 'Invalid input', 'message': "'tamanho' deve ser um inteiro positivo"}), 400
+    extensao = os.path.splitext(nome)[-1].lower().lstrip('.')
+    if extensao not in current_app.config['ALLOWED_EXTENSIONS']:
+        return jsonify({'error': 'Invalid input', 'message': f"Extensão não permitida: '{extensao}'"}), 400
+
+    estado = upload_parcial.iniciar(current_app.config.get('UPLOAD_FOLDER'), data['objetoId'],
+                                    data.get('repository'), nome, tamanho)
+    return jsonify(_estado_parcial(estado)), 201
+
+
+@uploadapp.route('/parcial/<upload_id>', methods=['GET'])
+def status_parcial(upload_id):
+    # Para retomar: a próxima parte começa em 'recebido'
+    estado = upload_parcial.ler(current_app.config.get('UPLOAD_FOLDER'), upload_id)
+    if estado is None:
+        return jsonify({'error': 'Upload não encontrado'}), 404
+    return jsonify(_estado_parcial(estado)), 200
+
+
+@uploadapp.route('/parcial/<upload_id>', methods=['PUT'])
+def enviar_parte(upload_id):
+    # Corpo: bytes da parte, no máximo MAX_CONTENT_LENGTH; ?offset=<posição>
+    upload_folder = current_app.config.get('UPLOAD_FOLDER')
+    estado = upload_parcial.ler(upload_folder, upload_id)
+    if estado is None:
+        return jsonify({'error': 'Upload não encontrado'}), 404
+    offset = request.args.get('offset', '')
+    if not offset.isdigit():
+        return jsonify({'error': 'Invalid input', 'message': "Expected 'offset' parameter"}), 400
+
+    try:
+        estado = upload_parcial.gravar_parte(upload_folder, estado['id'], int(offset), request.stream)
+    except upload_parcial.OffsetInvalido as e:
+        return jsonify({'error': str(e), 'recebido': e.recebido}), 409
+    except upload_parcial.UploadOcupado as e:
+        return jsonify({'error': str(e)}), 409
+    except ValueError as e:
+        return jsonify({'error': 'Invalid input', 'message': str(e)}), 400
+    return jsonify(_estado_parcial(estado)), 200
 
-    # Verifica se há ao menos um link ou ao menos um arquivo válido
-    if not arquivos_validos and len(links) == 0:
-        return jsonify({'error': 'Nenhuma mídia ou link enviado'}), 400
 
-    arquivos_salvos = []
-
-    if len(arquivos)>0:
-        for file in arquivos:
-            if file.filename:
-                extensao = os.path.split(".")[-1]
-            
-                filename = secure_filename(f"{uuid.uuid4().hex}{extensao}")
-                file_path = os.path.join(objeto_folder, filename)
-                       
-                file.save(file_path)
-                arquivos_salvos.append(filename)  # Armazena apenas o nome do arquivo
-            
-            
-                objeto_uri = f":{objeto_id}"
-                midia_uri = f'"{file_path.replace("\\", "/")}"'
-                print('midiaURI',midia_uri)
-                repositorio_uri = "http://www.guara.ueg.br/repositorio"  
-                propriedade = "schema:associatedMedia"
-                            
-                resultado = add_relation(midia_uri=midia_uri,
-                                         objeto_uri=objeto_uri,
-                                         propriedade=propriedade,
-                                         repositorio_uri=repositorio_uri,
-                                         repository=repository,
-                                         )
-                print('#resultado',resultado)
-                
-    if len(links)>0:
-        for file in arquivos:
-            objeto_uri = f":{objeto_id}"
-            midia_uri = f'"{file_path.replace("\\", "/")}"'
-            print('midiaURI',midia_uri)
-            repositorio_uri = "http://www.guara.ueg.br/repositorio"  
-            propriedade = "schema:associatedMedia"
-                        
-            resultado = add_relation(midia_uri=midia_uri,
-                                        objeto_uri=objeto_uri,
-                                        propriedade=propriedade,
-                                        repositorio_uri=repositorio_uri,
-                                        repository=repository,
-                                        )
-            print('#resultado',resultado)
+@uploadapp.route('/parcial/<upload_id>/concluir', methods=['POST'])
+def concluir_parcial(upload_id):
+    upload_folder = current_app.config.get('UPLOAD_FOLDER')
+    estado = upload_parcial.ler(upload_folder, upload_id)
+    if estado is None:
+        return jsonify({'error': 'Upload não encontrado'}), 404
+
+    try:
+        estado, file_path, novo = upload_parcial.concluir(upload_folder, estado['id'])
+    except upload_parcial.OffsetInvalido as e:
+        return jsonify({'error': 'Upload incompleto', 'recebido': e.recebido,
+                        'tamanho': estado['tamanho']}), 409
+    except upload_parcial.UploadOcupado as e:
+        return jsonify({'error': str(e)}), 409
+
+    caminho = file_path.replace("\\", "/")
+    try:
+        response = add_relations(objeto_uri=f":{estado['objetoId']}",
+                                 propriedade="schema:associatedMedia",
+                                 midias=[literal(caminho)],
+                                 repository=estado['repository'])
+        erro = None if response.status_code == 200 else response.text
+        status_erro = response.status_code
+    except requests.exceptions.RequestException as e:
+        erro, status_erro = str(e), 500
+
+    if erro is not None:
+        upload_parcial.reabrir(upload_folder, estado['id'], file_path, novo)
+        return jsonify({'error': status_erro, 'message': erro}), status_erro
+
+    upload_parcial.descartar(upload_folder, estado['id'])
+    derivados.agendar(upload_folder, estado['objetoId'], [os.path.basename(file_path)])
     return jsonify({
-        'message': 'Mídias adicionadas!'
+        'message': 'Mídias adicionadas!',
+        'midias': [{'arquivo': estado['nome'], 'nome': os.path.basename(file_path), 'status': 'salvo'}]
     }), 200
+
+
+@uploadapp.route('/parcial/<upload_id>', methods=['DELETE'])
+def cancelar_parcial(upload_id):
+    upload_folder = current_app.config.get('UPLOAD_FOLDER')
+    estado = upload_parcial.ler(upload_folder, upload_id)
+    if estado is None:
+        return jsonify({'error': 'Upload não encontrado'}), 404
+    upload_parcial.descartar(upload_folder, estado['id'])
+    return jsonify({'message': 'Upload cancelado'}), 200
+
+
+def _estado_parcial(estado):
+    return {
+        'id': estado['id'],
+        'nome': estado['nome'],
+        'tamanho': estado['tamanho'],
+        'recebido': estado['recebido'],
+        'parte_max': current_app.config['MAX_CONTENT_LENGTH'],
+    }
+
+
 @uploadapp.route('/remove', methods=['POST'])
 def remove_file():
     # Obtém o ID do objeto a partir do formulário
@@ -92,44 +288,39 @@ def remove_file():
     
     upload_folder = current_app.config.get('UPLOAD_FOLDER')
     objeto_folder = os.path.join(upload_folder, str(objeto_id))
-    pasta_excluidos = os.path.join(objeto_folder, "excluidos")
-    
-    if not os.path.exists(pasta_excluidos):
-        os.makedirs(pasta_excluidos)
-
-
-    destino_path = os.path.join(pasta_excluidos, file_name)
 
     if file_name:
-        
-        file_path = os.path.join(objeto_folder, file_name)
-        #os.remove (file_path)
-        try: 
-            shutil.move(file_path, destino_path)                
-        except:
-            ()
-        objeto_uri = f":{objeto_id}"
-        midia_uri = f":{file_name}"
-        propriedade = "schema:associatedMedia"
-        
+        file_path = safe_join(upload_folder, str(objeto_id), file_name)
+        if file_path is None:
+            return jsonify({'error': 'Nome de arquivo inválido'}), 400
 
+        # Primeiro sai a relação no Fuseki (o valor gravado no upload é o
+        # caminho do arquivo); se ela falhar, o arquivo fica onde está
         try:
-            response = requests.delete(
-                "http://localhost:5000/objectapi/remover_relacao",  # URL da rota `adicionar_relacao`
-                json={
-                    "s": objeto_uri,
-                    "p": propriedade,
-                    "o": midia_uri,
-                    "repository": repository
-                }
-            )
-
-            if response.status_code != 200:
-                
-                return jsonify("erro",response.text), response.status_code  # Retorna erro se falhar
+            response = remove_relations(objeto_uri=f":{objeto_id}",
+                                        propriedade="schema:associatedMedia",
+                                        midias=[literal(file_path.replace("\\", "/"))],
+                                        repository=repository)
         except requests.exceptions.RequestException as e:
-            return jsonify({"error": "Erro ao chamar adicionar_relacao", "message": str (e)}), 500   
-    
+            return jsonify({"error": "RequestException", "message": str(e)}), 500
+        if response.status_code != 200:
+            return jsonify({"error": response.status_code, "message": response.text}), response.status_code
+
+        if cas.valido(os.path.splitext(file_name)[0]):
+            # Link para o armazenamento por conteúdo: sai a referência do
+            # objeto e, se era a última, o conteúdo
+            cas.desvincular(upload_folder, file_path)
+        else:
+            # Uploads antigos (<uuid>.<ext>) continuam indo para excluidos/
+            pasta_excluidos = os.path.join(objeto_folder, "excluidos")
+            if not os.path.exists(pasta_excluidos):
+                os.makedirs(pasta_excluidos)
+            destino_path = os.path.join(pasta_excluidos, file_name)
+            try:
+                shutil.move(file_path, destino_path)
+            except OSError:
+                pass
+
     return jsonify({
         'message': 'Arquivos excluído com sucesso!'
     }), 200
\ No newline at end of file
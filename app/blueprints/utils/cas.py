@@ -0,0 +1,172 @@
+"""
+Armazenamento das mídias endereçado pelo conteúdo (SHA-256).
+
+O conteúdo fica uma única vez em UPLOAD_FOLDER/.cas/<ab>/<sha256>; a pasta de
+cada objeto recebe um hard link <sha256><ext> para ele. A mesma foto
+associada a cinco objetos ocupa o disco uma vez, e os caminhos gravados no
+Fuseki continuam sendo arquivos comuns da pasta do objeto.
+
+A contagem de referências é o próprio st_nlink: o arquivo em .cas conta 1 e
+cada link de objeto mais 1. desvincular() apaga o link e, quando só resta o
+arquivo em .cas, o conteúdo; é o que fazem a remoção de mídias (/remove) e
+os desfazimentos de upload. Esses arquivos não vão para excluidos/: a cópia
+seria mais uma referência e o conteúdo nunca seria liberado. As operações
+de link e remoção passam por um flock em .cas/.lock para não apagar um
+conteúdo que está sendo vinculado.
+"""
+import fcntl
+import hashlib
+import os
+import re
+import shutil
+import uuid
+from contextlib import contextmanager
+
+from werkzeug.utils import secure_filename
+
+PASTA = '.cas'
+BLOCO = 1024 * 1024
+_HASH = re.compile(r'^[0-9a-f]{64}$')
+
+
+def valido(sha256):
+    return bool(_HASH.match(sha256 or ''))
+
+
+def diretorio(upload_folder, *partes):
+    caminho = os.path.join(upload_folder, PASTA, *partes)
+    os.makedirs(caminho, exist_ok=True)
+    return caminho
+
+
+def caminho(upload_folder, sha256):
+    return os.path.join(diretorio(upload_folder, sha256[:2]), sha256)
+
+
+def existe(upload_folder, sha256):
+    return valido(sha256) and os.path.isfile(caminho(upload_folder, sha256))
+
+
+@contextmanager
+def _travado(upload_folder):
+    with open(os.path.join(diretorio(upload_folder), '.lock'), 'w') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        yield
+
+
+def _guardar(upload_folder, temporario, sha256):
+    # Chamada com o flock: conteúdo repetido descarta o temporário e vale o
+    # que já existe
+    destino = caminho(upload_folder, sha256)
+    if os.path.exists(destino):
+        os.remove(temporario)
+    else:
+        os.replace(temporario, destino)
+
+
+def gravar_temporario(upload_folder, stream):
+    """
+    Grava o stream num temporário de .cas calculando o SHA-256 na mesma
+    passada. Retorna (temporario, sha256), para vincular().
+    """
+    temporario = os.path.join(diretorio(upload_folder, 'tmp'), uuid.uuid4().hex)
+    h = hashlib.sha256()
+    try:
+        with open(temporario, 'wb') as f:
+            for bloco in iter(lambda: stream.read(BLOCO), b''):
+                h.update(bloco)
+                f.write(bloco)
+    except BaseException:
+        os.remove(temporario)
+        raise
+    return temporario, h.hexdigest()
+
+
+def mover_temporario(upload_folder, origem):
+    """
+    Leva para a pasta de temporários de .cas um arquivo já montado (upload
+    em partes), para vincular().
+    """
+    temporario = os.path.join(diretorio(upload_folder, 'tmp'), uuid.uuid4().hex)
+    os.replace(origem, temporario)
+    return temporario
+
+
+def nome_arquivo(sha256, nome_original):
+    return secure_filename(sha256 + os.path.splitext(nome_original)[-1].lower())
+
+
+def vincular(upload_folder, sha256, objeto_id, nome_original, temporario=None):
+    """
+    Cria na pasta do objeto o link para o conteúdo. Retorna (caminho, novo);
+    novo é False quando o objeto já tinha essa mídia.
+
+    Com temporario (gravar_temporario/mover_temporario), o conteúdo entra em
+    .cas sob o mesmo flock do link: um desvincular() concorrente do mesmo
+    hash não o apaga entre uma coisa e outra. Sem ele, levanta
+    FileNotFoundError se o hash não está no armazenamento.
+    """
+    objeto_folder = os.path.join(upload_folder, str(objeto_id))
+    os.makedirs(objeto_folder, exist_ok=True)
+    destino = os.path.join(objeto_folder, nome_arquivo(sha256, nome_original))
+    with _travado(upload_folder):
+        if temporario is not None:
+            _guardar(upload_folder, temporario, sha256)
+        origem = caminho(upload_folder, sha256)
+        if not os.path.isfile(origem):
+            raise FileNotFoundError(f'Conteúdo {sha256} não encontrado')
+        if os.path.exists(destino):
+            return destino, False
+        try:
+            os.link(origem, destino)
+        except OSError:
+            # Sistema de arquivos sem hard links: cópia, sem deduplicação
+            shutil.copyfile(origem, destino)
+    return destino, True
+
+
+def salvar(upload_folder, stream, objeto_id, nome_original):
+    temporario, sha256 = gravar_temporario(upload_folder, stream)
+    return vincular(upload_folder, sha256, objeto_id, nome_original, temporario)
+
+
+def desvincular(upload_folder, arquivo):
+    """
+    Remove o link do objeto e, se era a última referência, o conteúdo.
+    """
+    sha256 = os.path.splitext(os.path.basename(arquivo))[0]
+    with _travado(upload_folder):
+        try:
+            os.remove(arquivo)
+        except FileNotFoundError:
+            pass
+        if not valido(sha256):
+            return
+        origem = caminho(upload_folder, sha256)
+        try:
+            if os.stat(origem).st_nlink == 1:
+                os.remove(origem)
+        except FileNotFoundError:
+            pass
+
+
+def retirar(upload_folder, arquivo, destino):
+    """
+    Desfaz o vínculo como desvincular(), mas deixa em destino uma cópia
+    independente do conteúdo, fora da contagem de referências. Se o link era
+    a última referência, o conteúdo é movido em vez de copiado.
+    """
+    sha256 = os.path.splitext(os.path.basename(arquivo))[0]
+    with _travado(upload_folder):
+        origem = caminho(upload_folder, sha256) if valido(sha256) else None
+        try:
+            ultima = (origem is not None and os.stat(origem).st_nlink == 2
+                      and os.path.samefile(origem, arquivo))
+        except FileNotFoundError:
+            ultima = False
+        if ultima:
+            os.replace(origem, destino)
+            os.remove(arquivo)
+            return
+    shutil.copyfile(arquivo, destino)
+    desvincular(upload_folder, arquivo)
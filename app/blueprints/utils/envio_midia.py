@@ -0,0 +1,66 @@
+"""
+Envio dos arquivos de mídia gravados em UPLOAD_FOLDER.
+
+Sem offload, o Flask responde com send_file condicional: ETag forte e
+Last-Modified a partir do stat do arquivo (304 para If-None-Match /
+If-Modified-Since) e Range (206) para o vídeo poder ser posicionado sem
+baixar tudo de novo; o corpo sai pelo wsgi.file_wrapper, que o gunicorn
+envia com sendfile(). Com midia_envio no config.json, quem lê o disco é o
+servidor web:
+    - "x-accel-redirect" (nginx): a resposta leva só o cabeçalho
+      X-Accel-Redirect com midia_accel_prefixo + caminho relativo, ex.:
+          location /midias-internas/ { internal; alias /var/www/imagens/; }
+    - "x-sendfile" (Apache/lighttpd): USE_X_SENDFILE do Flask.
+
+Os uploads recebem nomes <uuid>.<ext> ou <sha256>.<ext> e nunca são
+reescritos, então esses arquivos vão com Cache-Control immutable de um ano.
+"""
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from flask import abort, current_app, send_file
+from werkzeug.security import safe_join
+
+from ...config_loader import get_settings
+
+# <uuid>.<ext> dos uploads antigos, <sha256>.<ext> do armazenamento cas
+_IMUTAVEL = re.compile(r'^([0-9a-f]{32}|[0-9a-f]{64})\.\w+$')
+UM_ANO = 365 * 24 * 3600
+
+
+def imutavel(nome):
+    return bool(_IMUTAVEL.match(nome))
+
+
+def etag(info):
+    return f'{info.st_ino:x}-{info.st_size:x}-{info.st_mtime_ns:x}'
+
+
+def enviar(*partes):
+    upload_folder = current_app.config.get('UPLOAD_FOLDER')
+    caminho = safe_join(upload_folder, *partes)
+    if caminho is None or not os.path.isfile(caminho):
+        abort(404)
+    nome = os.path.basename(caminho)
+    max_age = UM_ANO if imutavel(nome) else 0
+
+    if get_settings().midia_envio == 'x-accel-redirect':
+        # O nginx trata Range, ETag e Last-Modified do próprio arquivo
+        relativo = os.path.relpath(caminho, upload_folder).replace(os.sep, '/')
+        response = current_app.response_class(
+            mimetype=mimetypes.guess_type(nome)[0] or 'application/octet-stream')
+        response.headers['X-Accel-Redirect'] = get_settings().midia_accel_prefixo + quote(relativo)
+    else:
+        info = os.stat(caminho)
+        response = send_file(caminho, conditional=True, etag=etag(info),
+                             last_modified=info.st_mtime, max_age=max_age)
+
+    if max_age:
+        response.cache_control.public = True
+        response.cache_control.max_age = max_age
+        response.cache_control.immutable = True
+    else:
+        response.cache_control.no_cache = True
+    return response
@@ -0,0 +1,114 @@
+import json
+import uuid
+
+import requests
+from flask import Response, jsonify, request, stream_with_context
+
+from ... import indice_busca, sparql_client
+from ...config_loader import get_settings
+from ...consultas import get_prefix
+
+
+def _saida(resultado):
+    return json.dumps(resultado, ensure_ascii=False) + '\n'
+
+
+def _inserir(repo, pendentes):
+    # Um único INSERT DATA; retorna (erro, status HTTP) ou (None, 200)
+    blocos = '\n'.join(bloco for _, _, _, bloco in pendentes)
+    sparql_query = f"""{get_prefix()}
+            PREFIX : <{repo}#>
+            INSERT DATA {{
+                {blocos}
+            }}
+        """
+    try:
+        response = sparql_client.update(repo + '/' + get_settings().update, sparql_query)
+    except requests.exceptions.RequestException as e:
+        return {"error": "RequestException", "message": str(e)}, 500
+    if response.status_code == 200:
+        return None, 200
+    return {"error": response.status_code, "message": response.text}, response.status_code
+
+
+def _gravar(repo, pendentes):
+    """
+    Grava um lote de registros já validados num único INSERT DATA e devolve
+    uma linha de resultado por registro. Se o Fuseki recusar o lote (4xx), ele
+    é dividido ao meio até isolar os registros recusados, e só as linhas
+    deles saem com erro.
+    """
+    erro, status = _inserir(repo, pendentes)
+    if erro is not None and 400 <= status < 500 and len(pendentes) > 1:
+        meio = len(pendentes) // 2
+        yield from _gravar(repo, pendentes[:meio])
+        yield from _gravar(repo, pendentes[meio:])
+        return
+
+    if erro is None:
+        indice_busca.indexar_lote(repo, [
+            (f"{repo}#{object_id}", data['titulo'], data['resumo'], data['descricao'])
+            for _, object_id, data, _ in pendentes])
+
+    for numero, object_id, _, _ in pendentes:
+        if erro is None:
+            yield _saida({"linha": numero, "status": "criado", "id": object_id})
+        else:
+            yield _saida({"linha": numero, "status": "erro", **erro})
+
+
+def ingestao_ndjson(validar, triplas):
+    """
+    Lê o corpo NDJSON linha a linha e grava os registros válidos em lotes de
+    'chunk' registros (parâmetro da URL, limitado por bulk_lote_max). A resposta
+    também é NDJSON, com o resultado de cada linha à medida que o lote dela é
+    gravado. validar(data) e triplas(data, id) são os mesmos usados no /create;
+    cada registro é validado e convertido em triplas (com os valores já
+    escapados) antes de entrar no lote, e os que falham saem como "invalido"
+    com o número da linha.
+    """
+    settings = get_settings()
+    repo = request.args.get('repository')
+    if not repo:
+        return jsonify({"error": 'Invalid input', "message": "Expected 'repository' parameter"}), 400
+
+    lote = request.args.get('chunk', settings.bulk_lote, type=int)
+    lote = max(1, min(lote, settings.bulk_lote_max))
+    # O limite global de upload não serve para cargas em lote
+    request.max_content_length = settings.bulk_max_bytes
+
+    def gerar():
+        pendentes = []
+        for numero, linha in enumerate(request.stream, 1):
+            if not linha.strip():
+                continue
+            try:
+                data = json.loads(linha)
+            except ValueError as e:
+                yield _saida({"linha": numero, "status": "invalido", "message": f"JSON inválido: {e}"})
+                continue
+
+            if isinstance(data, dict):
+                data.setdefault('repository', repo)
+            erro = validar(data)
+            if erro is None and data['repository'] != repo:
+                erro = "Todos os registros devem ser do repositório informado na URL"
+            if erro is None:
+                object_id = str(uuid.uuid4())
+                try:
+                    bloco = triplas(data, object_id)
+                except (KeyError, TypeError, ValueError, AttributeError) as e:
+                    erro = f"{type(e).__name__}: {e}"
+            if erro is not None:
+                yield _saida({"linha": numero, "status": "invalido", "message": erro})
+                continue
+
+            pendentes.append((numero, object_id, data, bloco))
+            if len(pendentes) >= lote:
+                yield from _gravar(repo, pendentes)
+                pendentes = []
+
+        if pendentes:
+            yield from _gravar(repo, pendentes)
+
+    return Response(stream_with_context(gerar()), content_type='application/x-ndjson')
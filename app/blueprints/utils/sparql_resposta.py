@@ -0,0 +1,141 @@
+import json
+from collections import namedtuple
+
+import httpx
+import requests
+from flask import Response, jsonify
+
+from ... import sparql_cache, sparql_client
+from ...config_loader import get_settings
+from ...consultas import cursor_da_linha
+
+BLOCO = 64 * 1024
+
+# Consulta de listagem já validada: montada pelas views dos blueprints e
+# respondida tanto por elas (WSGI) quanto por app/asgi.py (assíncrono).
+# repo=None desliga o cache; limite=None devolve o resultado sem paginar.
+Consulta = namedtuple('Consulta', 'url sparql repo chaves limite', defaults=(None, None, None))
+
+
+class EntradaInvalida(Exception):
+    """Corpo da listagem sem um campo obrigatório."""
+
+
+def erro_listagem(e):
+    """
+    Corpo e status do erro de uma listagem, iguais nas views síncronas e
+    nas assíncronas. Falhas de comunicação com o Fuseki (requests ou httpx)
+    viram RequestException.
+    """
+    if isinstance(e, EntradaInvalida):
+        return {"error": "Invalid input", "message": str(e)}, 400
+    if isinstance(e, (requests.exceptions.RequestException, httpx.HTTPError)):
+        return {"error": "RequestException", "message": str(e)}, 500
+    for tipo in (KeyError, TypeError, ValueError):
+        if isinstance(e, tipo):
+            return {"error": tipo.__name__, "message": str(e)}, 400
+    return {"error": "Exception", "message": str(e)}, 500
+
+
+def responder(consulta):
+    """Executa uma Consulta de listagem pelo cliente síncrono."""
+    try:
+        if consulta.limite:
+            return pagina_sparql(consulta.url, consulta.sparql, consulta.repo,
+                                 consulta.chaves, consulta.limite)
+        return resposta_sparql(consulta.url, consulta.sparql, consulta.repo)
+    except Exception as e:
+        corpo, status = erro_listagem(e)
+        return jsonify(corpo), status
+
+
+def resposta_sparql(url, sparql_query, repo=None):
+    """
+    Repassa ao cliente o corpo JSON do Fuseki bloco a bloco, com o mesmo
+    Content-Type, sem decodificar e recodificar o resultado em Python.
+    Com repo informado, consulta e abastece o cache de resultados.
+
+    A thread do worker fica ocupada até o fim do repasse; servido por
+    app/asgi.py, o mesmo repasse das listagens roda no laço de eventos
+    (ver sparql_async.py).
+    """
+    geracao = None
+    if repo is not None:
+        # Capturada antes da consulta: ver sparql_cache.guardar()
+        geracao = sparql_cache.geracao(repo)
+        cached = sparql_cache.obter(repo, sparql_query)
+        if cached is not None:
+            corpo, tipo = cached
+            return Response(corpo, content_type=tipo)
+
+    response = sparql_client.query_stream(url, sparql_query)
+    if response.status_code != 200:
+        texto = response.text
+        response.close()
+        return jsonify({"error": response.status_code, "message": texto}), response.status_code
+
+    tipo = response.headers.get('content-type', 'application/sparql-results+json')
+    limite = get_settings().sparql_cache_max_bytes
+
+    def corpo():
+        # Guarda uma cópia dos blocos enquanto couber no limite do cache
+        copia = [] if repo is not None else None
+        tamanho = 0
+        try:
+            for bloco in response.iter_content(BLOCO):
+                if copia is not None:
+                    tamanho += len(bloco)
+                    if tamanho <= limite:
+                        copia.append(bloco)
+                    else:
+                        copia = None
+                yield bloco
+        finally:
+            response.close()
+        if copia is not None:
+            sparql_cache.guardar(repo, sparql_query, (b''.join(copia), tipo), geracao)
+
+    return Response(corpo(), content_type=tipo)
+
+
+def limite_pagina(data):
+    """
+    Lê 'limit' do corpo da requisição. Sem 'limit' nem 'cursor' a listagem
+    não é paginada; com cursor e sem limit vale o limite padrão.
+    """
+    settings = get_settings()
+    limite = data.get('limit')
+    if limite is None:
+        return settings.paginacao_limite_padrao if data.get('cursor') else None
+    if isinstance(limite, bool) or not isinstance(limite, (int, str)) or not str(limite).isdigit():
+        raise ValueError("'limit' deve ser um inteiro positivo")
+    limite = int(limite)
+    if not 1 <= limite <= settings.paginacao_limite_max:
+        raise ValueError(f"'limit' deve estar entre 1 e {settings.paginacao_limite_max}")
+    return limite
+
+
+def pagina_sparql(url, sparql_query, repo, chaves, limite):
+    """
+    Uma página de resultados. A consulta traz limite + 1 linhas: a linha
+    excedente só indica que há mais resultados e é descartada; a última linha
+    entregue vira o next_cursor da resposta.
+    """
+    geracao = sparql_cache.geracao(repo)
+    cached = sparql_cache.obter(repo, sparql_query)
+    if cached is None:
+        response = sparql_client.query(url, sparql_query)
+        if response.status_code != 200:
+            return jsonify({"error": response.status_code, "message": response.text}), response.status_code
+        cached = (response.content, response.headers.get('content-type', 'application/sparql-results+json'))
+        if len(response.content) <= get_settings().sparql_cache_max_bytes:
+            sparql_cache.guardar(repo, sparql_query, cached, geracao)
+
+    result = json.loads(cached[0])
+    linhas = result.get('results', {}).get('bindings', [])
+    proximo = None
+    if len(linhas) > limite:
+        del linhas[limite:]
+        proximo = cursor_da_linha(linhas[-1], chaves)
+    result['next_cursor'] = proximo
+    return jsonify(result)
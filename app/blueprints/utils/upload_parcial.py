@@ -0,0 +1,214 @@
+"""
+Uploads em partes, retomáveis, para arquivos maiores que MAX_CONTENT_LENGTH.
+
+Cada upload tem em UPLOAD_FOLDER/.parciais:
+    <id>.part   o arquivo sendo montado; cada parte é gravada direto na sua
+                posição, então ao final basta movê-lo para o armazenamento
+                (cas) e vinculá-lo à pasta do objeto
+    <id>.json   nome, tamanho, objeto e quantos bytes já foram confirmados
+
+Uma parte só é confirmada (recebido) depois de gravada e sincronizada no
+disco; se a conexão cair no meio, o que passou de recebido é descartado e o
+cliente retoma a partir de recebido. Uploads parados há mais de
+upload_parcial_ttl segundos são apagados.
+
+O SHA-256 (para o armazenamento em cas) é calculado parte a parte, na
+memória do processo que recebeu as partes; se elas passaram por outro
+processo, o arquivo é lido uma vez ao concluir.
+"""
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+
+from ...config_loader import get_settings
+from . import cas
+
+PASTA = '.parciais'
+BLOCO = 1024 * 1024
+
+# upload_id -> (bytes já no hash, hash parcial)
+_hashes = {}
+_lock_hashes = threading.Lock()
+
+
+class UploadOcupado(Exception):
+    pass
+
+
+class OffsetInvalido(Exception):
+    def __init__(self, recebido):
+        super().__init__(f'A próxima parte deve começar em {recebido}')
+        self.recebido = recebido
+
+
+def diretorio(upload_folder):
+    caminho = os.path.join(upload_folder, PASTA)
+    os.makedirs(caminho, exist_ok=True)
+    return caminho
+
+
+def _caminhos(upload_folder, upload_id):
+    base = os.path.join(diretorio(upload_folder), upload_id)
+    return base + '.part', base + '.json'
+
+
+def _salvar(upload_folder, estado):
+    estado['atualizado_em'] = time.time()
+    _, caminho = _caminhos(upload_folder, estado['id'])
+    temporario = f'{caminho}.{os.getpid()}.tmp'
+    with open(temporario, 'w') as f:
+        json.dump(estado, f)
+    os.replace(temporario, caminho)
+
+
+def ler(upload_folder, upload_id):
+    try:
+        upload_id = uuid.UUID(upload_id).hex
+    except ValueError:
+        return None
+    try:
+        with open(_caminhos(upload_folder, upload_id)[1]) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def limpar_expirados(upload_folder):
+    limite = time.time() - get_settings().upload_parcial_ttl
+    with os.scandir(diretorio(upload_folder)) as it:
+        for entrada in it:
+            try:
+                if entrada.stat().st_mtime < limite:
+                    os.remove(entrada.path)
+            except FileNotFoundError:
+                pass
+
+
+def iniciar(upload_folder, objeto_id, repository, nome, tamanho):
+    limpar_expirados(upload_folder)
+    estado = {
+        'id': uuid.uuid4().hex,
+        'objetoId': str(objeto_id),
+        'repository': repository,
+        'nome': nome,
+        'tamanho': tamanho,
+        'recebido': 0,
+        'criado_em': time.time(),
+    }
+    parte, _ = _caminhos(upload_folder, estado['id'])
+    open(parte, 'wb').close()
+    _salvar(upload_folder, estado)
+    return estado
+
+
+def _travar(f):
+    # Uma requisição por vez em cada upload (parte repetida pelo cliente, etc.)
+    try:
+        fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        raise UploadOcupado('Outra parte deste upload está sendo gravada')
+
+
+def gravar_parte(upload_folder, upload_id, offset, stream):
+    """
+    Grava o corpo da requisição a partir de offset, que deve ser o total já
+    confirmado. Retorna o estado atualizado.
+    """
+    parte, _ = _caminhos(upload_folder, upload_id)
+    with open(parte, 'r+b') as f:
+        _travar(f)
+        estado = ler(upload_folder, upload_id)
+        if offset != estado['recebido']:
+            raise OffsetInvalido(estado['recebido'])
+
+        # Restos de uma parte interrompida ficam para trás
+        f.seek(offset)
+        f.truncate()
+        restante = estado['tamanho'] - offset
+        h = _hash_ate(upload_id, offset)
+        try:
+            for bloco in iter(lambda: stream.read(BLOCO), b''):
+                if len(bloco) > restante:
+                    raise ValueError('A parte ultrapassa o tamanho declarado do arquivo')
+                f.write(bloco)
+                if h is not None:
+                    h.update(bloco)
+                restante -= len(bloco)
+            f.flush()
+            os.fsync(f.fileno())
+        except BaseException:
+            f.truncate(offset)
+            raise
+
+        estado['recebido'] = f.tell()
+        _salvar(upload_folder, estado)
+        if h is not None:
+            with _lock_hashes:
+                _hashes[upload_id] = (estado['recebido'], h)
+    return estado
+
+
+def _hash_ate(upload_id, offset):
+    # Cópia do hash parcial que cobre exatamente os bytes antes de offset
+    if offset == 0:
+        return hashlib.sha256()
+    with _lock_hashes:
+        coberto, h = _hashes.get(upload_id, (None, None))
+    return h.copy() if coberto == offset else None
+
+
+def _sha256(upload_id, f, tamanho):
+    h = _hash_ate(upload_id, tamanho)
+    if h is None:
+        f.seek(0)
+        h = hashlib.sha256()
+        for bloco in iter(lambda: f.read(BLOCO), b''):
+            h.update(bloco)
+    return h.hexdigest()
+
+
+def concluir(upload_folder, upload_id):
+    """
+    Guarda o arquivo completo no armazenamento por conteúdo (cas) e o
+    vincula à pasta do objeto. Retorna (estado, caminho, novo), como
+    cas.vincular().
+    """
+    parte, _ = _caminhos(upload_folder, upload_id)
+    with open(parte, 'rb') as f:
+        _travar(f)
+        estado = ler(upload_folder, upload_id)
+        if estado['recebido'] != estado['tamanho']:
+            raise OffsetInvalido(estado['recebido'])
+
+        sha256 = _sha256(upload_id, f, estado['tamanho'])
+        temporario = cas.mover_temporario(upload_folder, parte)
+    caminho, novo = cas.vincular(upload_folder, sha256, estado['objetoId'], estado['nome'], temporario)
+    return estado, caminho, novo
+
+
+def reabrir(upload_folder, upload_id, caminho, novo):
+    # Relação não gravada: o arquivo volta para .parciais e o cliente pode
+    # tentar concluir de novo. Nunca como link para .cas: seria mais uma
+    # referência, que o cancelamento e a expiração (arquivo comum) não
+    # liberariam
+    parte = _caminhos(upload_folder, upload_id)[0]
+    if novo:
+        cas.retirar(upload_folder, caminho, parte)
+    else:
+        # O objeto já tinha a mídia antes deste upload: o link fica
+        shutil.copyfile(caminho, parte)
+
+
+def descartar(upload_folder, upload_id):
+    with _lock_hashes:
+        _hashes.pop(upload_id, None)
+    for caminho in _caminhos(upload_folder, upload_id):
+        try:
+            os.remove(caminho)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,230 @@
+"""
+Carga de arquivos RDF/OWL (os de ontology/, por exemplo) num dataset do
+Fuseki pelo Graph Store Protocol (<dataset>/data).
+
+O arquivo não é acumulado num grafo: o parser do rdflib entrega cada tripla a
+um Graph cujo add() junta só o lote corrente (até ~carga_lote_bytes), que é
+serializado em N-Triples pelo próprio rdflib e enviado num POST. Nós em
+branco viram IRIs determinísticas (skolemização pelo hash do arquivo e pela
+ordem de aparição), então reenviar um lote é idempotente. O progresso fica
+num arquivo de estado em carga_estado_dir (fora de ontology/); se a carga
+falhar, a próxima execução pula as triplas já enviadas e continua do lote
+seguinte.
+
+Uso: python -m app.carregador_rdf http://localhost:3030/acervo ontology/*.owl
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+from urllib.parse import quote
+
+from rdflib import BNode, Graph, URIRef
+
+from . import indice_busca, sparql_cache, sparql_client
+from .config_loader import get_settings
+
+ONTOLOGIA_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'ontology')
+GENID = 'http://guara.ueg.br/.well-known/genid/'
+
+
+class ErroCarga(Exception):
+    pass
+
+
+def detectar_formato(caminho):
+    # Vários .rdf/.owl do projeto são Turtle; decide pelo conteúdo
+    with open(caminho, 'rb') as f:
+        inicio = f.read(1024).lstrip()
+    if inicio.startswith(b'<?xml') or inicio.startswith(b'<rdf:RDF'):
+        return 'xml'
+    if caminho.endswith('.nt'):
+        return 'nt'
+    return 'turtle'
+
+
+def hash_arquivo(caminho):
+    h = hashlib.sha256()
+    with open(caminho, 'rb') as f:
+        for bloco in iter(lambda: f.read(1024 * 1024), b''):
+            h.update(bloco)
+    return h.hexdigest()
+
+
+def _arquivo_estado(caminho):
+    pasta = get_settings().carga_estado_dir or os.path.join(os.path.dirname(__file__), 'carga_estado')
+    os.makedirs(pasta, exist_ok=True)
+    # Um estado por arquivo de origem (caminho absoluto)
+    chave = hashlib.sha256(os.path.abspath(caminho).encode('utf-8')).hexdigest()[:16]
+    return os.path.join(pasta, f'{os.path.basename(caminho)}.{chave}.json')
+
+
+def _ler_estado(caminho, destino, digest):
+    try:
+        with open(_arquivo_estado(caminho)) as f:
+            estado = json.load(f)
+    except (OSError, ValueError):
+        return None
+    # Só retoma a carga do mesmo arquivo para o mesmo destino
+    if estado.get('sha256') != digest or estado.get('destino') != destino:
+        return None
+    return estado
+
+
+def _gravar_estado(caminho, estado):
+    temporario = _arquivo_estado(caminho) + '.tmp'
+    with open(temporario, 'w') as f:
+        json.dump(estado, f)
+    os.replace(temporario, _arquivo_estado(caminho))
+
+
+class _GrafoEmLotes(Graph):
+    """
+    Graph que não guarda o arquivo: add() recebe as triplas do parser e as
+    repassa em lotes de N-Triples para enviar(dados).
+    """
+
+    def __init__(self, enviar, lote_bytes, pular, prefixo_genid):
+        super().__init__()
+        self._enviar = enviar
+        self._lote_bytes = lote_bytes
+        self._pular = pular
+        self._prefixo_genid = prefixo_genid
+        self._genids = {}
+        self._lote = Graph()
+        self._tamanho = 0
+        self.lidas = 0
+
+    def _skolem(self, termo):
+        if not isinstance(termo, BNode):
+            return termo
+        genid = self._genids.get(termo)
+        if genid is None:
+            genid = self._genids[termo] = URIRef(f'{self._prefixo_genid}{len(self._genids)}')
+        return genid
+
+    def add(self, triple):
+        s, p, o = (self._skolem(t) for t in triple)
+        self.lidas += 1
+        # Triplas já enviadas numa execução anterior (a ordem do parser é estável)
+        if self.lidas <= self._pular:
+            return self
+        self._lote.add((s, p, o))
+        # Tamanho aproximado da linha; a serialização (com escapes) é do rdflib
+        self._tamanho += len(s) + len(p) + len(o) + 8
+        if self._tamanho >= self._lote_bytes:
+            self.descarregar()
+        return self
+
+    def descarregar(self):
+        if len(self._lote):
+            self._enviar(self._lote.serialize(format='nt', encoding='utf-8'), self.lidas)
+            self._lote = Graph()
+            self._tamanho = 0
+
+
+def endpoint_dados(dataset_url, grafo=None):
+    url = dataset_url.rstrip('/')
+    if not url.endswith('/data'):
+        url += '/data'
+    return url + ('?graph=' + quote(grafo, safe='') if grafo else '?default')
+
+
+def carregar_arquivo(dataset_url, caminho, grafo=None, lote_bytes=None, recomecar=False,
+                     auth=None, progresso=print):
+    """
+    Envia o arquivo ao dataset (grafo padrão ou 'grafo'). Retorna o total de
+    triplas lidas. Em caso de falha levanta ErroCarga; o estado gravado permite
+    retomar com uma nova chamada.
+    """
+    settings = get_settings()
+    lote_bytes = lote_bytes or settings.carga_lote_bytes
+    destino = endpoint_dados(dataset_url, grafo)
+    digest = hash_arquivo(caminho)
+    estado = None if recomecar else _ler_estado(caminho, destino, digest)
+    if estado is None:
+        estado = {'arquivo': os.path.abspath(caminho), 'sha256': digest, 'destino': destino,
+                  'enviadas': 0, 'lotes': 0, 'concluido': False}
+    elif estado['concluido']:
+        progresso(f'{caminho}: já carregado ({estado["enviadas"]} triplas)')
+        return estado['enviadas']
+    elif estado['enviadas']:
+        progresso(f'{caminho}: retomando após {estado["enviadas"]} triplas')
+
+    sessao = sparql_client.get_session(destino)
+    inicio = time.monotonic()
+
+    def enviar(dados, lidas):
+        for tentativa in range(1, settings.carga_tentativas + 1):
+            try:
+                response = sessao.post(destino, data=dados, auth=auth,
+                                       headers={'Content-Type': 'application/n-triples; charset=utf-8'},
+                                       timeout=settings.sparql_timeout)
+                if response.status_code in (200, 201, 204):
+                    break
+                erro = f'{response.status_code}: {response.text[:200]}'
+            except Exception as e:
+                erro = str(e)
+            if tentativa == settings.carga_tentativas:
+                raise ErroCarga(f'{caminho}: lote {estado["lotes"] + 1} recusado ({erro})')
+            time.sleep(2 ** tentativa)
+        estado['enviadas'] = lidas
+        estado['lotes'] += 1
+        _gravar_estado(caminho, estado)
+        progresso(f'{caminho}: {lidas} triplas enviadas em {estado["lotes"]} lotes '
+                  f'({time.monotonic() - inicio:.1f}s)')
+
+    prefixo = f'{GENID}{digest[:16]}/'
+    grafo_lotes = _GrafoEmLotes(enviar, lote_bytes, estado['enviadas'], prefixo)
+    try:
+        grafo_lotes.parse(caminho, format=detectar_formato(caminho))
+        grafo_lotes.descarregar()
+    finally:
+        sparql_cache.invalidar_repositorio(dataset_url)
+        # Objetos carregados não estão no índice de busca
+        indice_busca.desmarcar(dataset_url)
+
+    estado['enviadas'] = grafo_lotes.lidas
+    estado['concluido'] = True
+    _gravar_estado(caminho, estado)
+    progresso(f'{caminho}: concluído, {grafo_lotes.lidas} triplas em {time.monotonic() - inicio:.1f}s')
+    return grafo_lotes.lidas
+
+
+def arquivo_ontologia(nome):
+    """
+    Caminho de um arquivo de ontology/ a partir do nome; recusa caminhos fora
+    da pasta.
+    """
+    caminho = os.path.realpath(os.path.join(ONTOLOGIA_DIR, nome))
+    if os.path.dirname(caminho) != os.path.realpath(ONTOLOGIA_DIR) or not os.path.isfile(caminho):
+        raise ValueError(f'Arquivo de ontologia inválido: {nome}')
+    return caminho
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Carrega arquivos RDF/OWL num dataset do Fuseki.')
+    parser.add_argument('dataset', help='URL do dataset, ex.: http://localhost:3030/acervo')
+    parser.add_argument('arquivos', nargs='+')
+    parser.add_argument('--grafo', help='IRI do grafo nomeado (padrão: grafo default)')
+    parser.add_argument('--lote-bytes', type=int, help='tamanho máximo de cada lote N-Triples')
+    parser.add_argument('--recomecar', action='store_true', help='ignora o progresso salvo')
+    parser.add_argument('--usuario')
+    parser.add_argument('--senha')
+    args = parser.parse_args(argv)
+
+    auth = (args.usuario, args.senha) if args.usuario else None
+    try:
+        for caminho in args.arquivos:
+            carregar_arquivo(args.dataset, caminho, grafo=args.grafo, lote_bytes=args.lote_bytes,
+                             recomecar=args.recomecar, auth=auth)
+    except ErroCarga as e:
+        print(e, file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,8 +1,180 @@
+"""
+Configuração da aplicação (app/config.json).
+
+O arquivo é lido uma única vez, na primeira chamada a get_settings()
+(create_app força essa leitura na inicialização), e mantido em memória como
+um objeto Settings imutável. reload_settings() relê o arquivo quando ele foi
+alterado em disco e chama as funções registradas com ao_recarregar(), que
+refazem o que foi criado a partir da configuração anterior (pools de
+conexões e de processos, caches, app.config do Flask).
+
+O reload vale para o processo que o executa: cada worker recebe o seu
+SIGHUP (kill -HUP <pid>), instalado por recarregar_no_sinal().
+"""
 import json
 import os
+import signal
+import threading
+from dataclasses import dataclass, field, fields
+from types import MappingProxyType
 
-def load_config(filename='config.json'):
-    # Constrói o caminho relativo ao diretório do módulo app
-    path = os.path.join(os.path.dirname(__file__), filename)
+CONFIG_PATH = os.path.join(os.path.dirname(__file__), 'config.json')
+
+
+@dataclass(frozen=True)
+class Settings:
+    fuseki_url: str = 'http://localhost:3030'
+    fuseki_update_url: str = None
+    fuseki_query_url: str = None
+    user_update_url: str = None
+    user_query_url: str = None
+    repo_update_url: str = None
+    repo_query_url: str = None
+    class_update_url: str = None
+    class_query_url: str = None
+    prefix_base_class: str = None
+    prefix_base_obj: str = None
+    prefix_base_repo: str = None
+    schema_objetos: str = ':'
+    schema_acervo: str = ':'
+    update: str = 'update'
+    query: str = 'query'
+    all_prefix: str = ''
+    sparql_pool_maxsize: int = 20
+    sparql_pool_block: bool = True
+    sparql_timeout: float = 60
+    sparql_cache_ttl: float = 60
+    sparql_cache_maxsize: int = 512
+    sparql_cache_max_bytes: int = 2 * 1024 * 1024
+    geracoes_path: str = None
+    paginacao_limite_padrao: int = 100
+    paginacao_limite_max: int = 1000
+    indice_busca_path: str = None
+    indice_busca_max_ids: int = 2000
+    bulk_lote: int = 500
+    bulk_lote_max: int = 5000
+    bulk_max_bytes: int = 512 * 1024 * 1024
+    carga_lote_bytes: int = 4 * 1024 * 1024
+    carga_tentativas: int = 3
+    carga_estado_dir: str = None
+    upload_folder: str = '/var/www/imagens'
+    upload_parcial_ttl: float = 24 * 3600
+    derivados_dir: str = None
+    derivados_max_bytes: int = 1024 * 1024 * 1024
+    derivados_threads: int = 2
+    midia_envio: str = None
+    midia_accel_prefixo: str = '/midias-internas/'
+    ocr_processos: int = 0
+    ocr_modelo: str = 'en_best.mlmodel'
+    ocr_modelo_segmentacao: str = None
+    ocr_dpi: int = 300
+    ocr_tons_de_cinza: bool = True
+    ocr_preprocessamento: bool = True
+    ocr_deskew_max_graus: float = 5.0
+    ocr_jobs_dir: str = None
+    ocr_fila_max: int = 50
+    ocr_reserva_validade: float = 120
+    ocr_stream_intervalo: float = 0.5
+    ocr_stream_prazo: float = 600
+    ocr_jobs_retencao: float = 7 * 24 * 3600
+    ocr_cache_dir: str = None
+    ocr_cache_max_bytes: int = 256 * 1024 * 1024
+    # Também o atraso máximo de um logout nos outros processos
+    token_cache_ttl: float = 60
+    token_cache_maxsize: int = 1024
+    # Chaves do config.json sem campo próprio
+    extras: MappingProxyType = field(default_factory=lambda: MappingProxyType({}))
+
+    @classmethod
+    def from_dict(cls, dados):
+        conhecidos = {f.name for f in fields(cls)} - {'extras'}
+        valores = {k: v for k, v in dados.items() if k in conhecidos}
+        extras = {k: v for k, v in dados.items() if k not in conhecidos}
+        return cls(extras=MappingProxyType(extras), **valores)
+
+    def get(self, chave, padrao=None):
+        # Compatível com o antigo dicionário retornado por load_config()
+        if chave != 'extras' and chave in self.__dataclass_fields__:
+            valor = getattr(self, chave)
+            return padrao if valor is None else valor
+        return self.extras.get(chave, padrao)
+
+
+_settings = None
+_mtime = None
+_lock = threading.Lock()
+_ao_recarregar = []
+
+
+def _ler(path):
     with open(path, 'r') as f:
-        return json.load(f)
+        return Settings.from_dict(json.load(f)), os.path.getmtime(path)
+
+
+def get_settings():
+    """
+    Retorna a configuração carregada (sem acesso a disco após a primeira vez).
+    """
+    global _settings, _mtime
+    if _settings is None:
+        with _lock:
+            if _settings is None:
+                _settings, _mtime = _ler(CONFIG_PATH)
+    return _settings
+
+
+def ao_recarregar(funcao):
+    """
+    Registra funcao(settings), chamada depois de cada reload com a
+    configuração nova. Pode ser usada como decorador.
+    """
+    _ao_recarregar.append(funcao)
+    return funcao
+
+
+def reload_settings(force=False):
+    """
+    Relê o config.json se ele mudou desde a última leitura (ou sempre, com
+    force=True) e refaz os recursos registrados. Retorna True quando a
+    configuração foi substituída. Um config.json inválido mantém a anterior.
+    """
+    global _settings, _mtime
+    with _lock:
+        if not force and _settings is not None and os.path.getmtime(CONFIG_PATH) == _mtime:
+            return False
+        _settings, _mtime = _ler(CONFIG_PATH)
+        settings = _settings
+    for funcao in _ao_recarregar:
+        try:
+            funcao(settings)
+        except Exception as e:
+            print('reload:', getattr(funcao, '__module__', funcao), e)
+    return True
+
+
+def _recarregar_em_segundo_plano(signum, frame):
+    # O handler interrompe a thread principal, que pode estar com algum dos
+    # locks usados pelos recursos: o reload roda em outra thread
+    threading.Thread(target=_reload_seguro, name='reload-config', daemon=True).start()
+
+
+def _reload_seguro():
+    try:
+        reload_settings(force=True)
+    except Exception as e:
+        print('reload: config.json não recarregado:', e)
+
+
+def recarregar_no_sinal():
+    """
+    Instala o handler de SIGHUP que recarrega a configuração. Só funciona na
+    thread principal e em sistemas com SIGHUP (não no Windows).
+    """
+    if hasattr(signal, 'SIGHUP') and threading.current_thread() is threading.main_thread():
+        signal.signal(signal.SIGHUP, _recarregar_em_segundo_plano)
+
+
+def load_config(filename='config.json'):
+    if filename != 'config.json':
+        return _ler(os.path.join(os.path.dirname(__file__), filename))[0]
+    return get_settings()
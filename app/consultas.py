@@ -1,7 +1,11 @@
-from app.config_loader import load_config
-def get_base(): return load_config().get('fuseki_url')
-def get_prefix():
-    return """ PREFIX rdf:<http://www.w3.org/1999/02/22-rdf-syntax-ns#>
+import base64
+import json
+import re
+import unicodedata
+from app.config_loader import get_settings
+def get_base(): return get_settings().fuseki_url
+
+PREFIXOS = """ PREFIX rdf:<http://www.w3.org/1999/02/22-rdf-syntax-ns#>
     PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>
     PREFIX xsd: <http://www.w3.org/2001/XMLSchema#>
     PREFIX obj: <http://guara.ueg.br/ontologias/v1/objetos#>
@@ -12,45 +16,112 @@ def get_prefix():
     PREFIX geo: <http://www.opengis.net/ont/geosparql#>
     PREFIX owl: <http://www.w3.org/2002/07/owl#> """
 
+def get_prefix():
+    return PREFIXOS
+
+
+# ---------------------------------------------------------------------------
+# Modelos de consulta
+#
+# Cada modelo é quebrado nos marcadores %nome% uma única vez, na importação.
+# render() só intercala os pedaços fixos com valores que já chegam escapados
+# (literal(), iri() ou fragmentos de uma lista fechada), então o texto final
+# é estável e pode ser usado como chave de cache.
+# ---------------------------------------------------------------------------
+
+_ESCAPES_LITERAL = {'\\': '\\\\', '"': '\\"', '\n': '\\n', '\r': '\\r', '\t': '\\t'}
+_CARACTERES_LITERAL = re.compile(r'[\\"\n\r\t]')
+_IRI_INVALIDO = re.compile(r'[\x00-\x20<>"{}|^`\\]')
+_NOME_LOCAL = re.compile(r'^\w([\w.-]*[\w-])?$')
+
+
+def literal(valor):
+    """
+    Literal SPARQL entre aspas, com aspas, barras e quebras de linha escapadas.
+    """
+    return '"' + _CARACTERES_LITERAL.sub(lambda m: _ESCAPES_LITERAL[m.group()], str(valor)) + '"'
+
+
+def iri(valor):
+    """
+    IRI entre <>; recusa caracteres que permitiriam sair do termo.
+    """
+    if _IRI_INVALIDO.search(valor):
+        raise ValueError(f"IRI inválida: {valor!r}")
+    return f"<{valor}>"
+
+
+def nome_local(valor):
+    """
+    Nome prefixado :valor; recusa o que não for um nome local simples.
+    """
+    if not _NOME_LOCAL.match(str(valor)):
+        raise ValueError(f"Nome inválido: {valor!r}")
+    return f":{valor}"
+
+
+def _chave_ordem(variavel):
+    return f'COALESCE(STR(?{variavel}), "")'
+
+
+def ordem(chaves):
+    return ' '.join(_chave_ordem(v) for v in chaves)
+
+
+class SparqlTemplate:
+    _MARCADOR = re.compile(r'%(\w+)%')
+
+    def __init__(self, texto):
+        partes = self._MARCADOR.split(texto)
+        self._fixos = partes[0::2]
+        self._nomes = partes[1::2]
+
+    def render(self, **valores):
+        saida = [self._fixos[0]]
+        for nome, fixo in zip(self._nomes, self._fixos[1:]):
+            saida.append(valores[nome])
+            saida.append(fixo)
+        return ''.join(saida)
 
-def get_sparq_dim():
-    return get_prefix() + """
-    SELECT DISTINCT ?obj ?titulo ?resumo ?descricao ?dimensao ?lat ?lon
+
+# Chaves de ordenação (e do cursor de paginação) de cada listagem; a última
+# variável de cada tupla desempata linhas com os mesmos valores. O GROUP BY
+# de cada consulta usa só essas variáveis (as demais colunas saem agregadas),
+# então cada tupla de chaves identifica uma única linha.
+CHAVES_OBJ = ('titulo', 'obj')
+CHAVES_DIM = ('dimensao', 'titulo', 'obj')
+CHAVES_ALL = ('tipo', 'titulo', 'id')
+
+
+SPARQ_DIM = SparqlTemplate(" PREFIX : %repo% " + PREFIXOS + """
+    SELECT ?obj ?titulo (SAMPLE(?resumoRaw) AS ?resumo) (SAMPLE(?descricaoRaw) AS ?descricao)
+           ?dimensao (SAMPLE(?latRaw) AS ?lat) (SAMPLE(?lonRaw) AS ?lon)
     WHERE {
         ?obj a ?dimensao .
         FILTER (?dimensao IN (obj:Pessoa, obj:Tempo, obj:Lugar, obj:Evento)).
         ?obj dc:title ?titulo.
-        ?obj dc:abstract ?resumo.
-        OPTIONAL { ?obj dc:description ?descricao . }
-        OPTIONAL { ?obj obj:tipoFisico ?tipo. }
-        OPTIONAL { ?obj geo:lat ?lat. }
-        OPTIONAL { ?obj geo:lon ?lon. }
-        FILTER (regex(?obj, '%keyword%', 'i') || regex(?titulo, '%keyword%', 'i') || regex(?resumo, '%keyword%', 'i'))
+        ?obj dc:abstract ?resumoRaw.
+        OPTIONAL { ?obj dc:description ?descricaoRaw . }
+        OPTIONAL { ?obj geo:lat ?latRaw. }
+        OPTIONAL { ?obj geo:lon ?lonRaw. }
+        %busca%
+        %pagina%
     }
-    GROUP BY ?obj ?titulo ?resumo ?colecao ?descricao ?dimensao ?lat ?lon
-    ORDER BY ?dimensao ?titulo
-            """
-def get_sparq_all():
-    return get_prefix() + """
-        PREFIX : <http://localhost:3030/festas_populares#> 
-        PREFIX geo: <http://www.opengis.net/ont/geosparql#> 
-        PREFIX rdf: <http://www.w3.org/1999/02/22-rdf-syntax-ns#>
-        PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>
-        PREFIX xsd: <http://www.w3.org/2001/XMLSchema#>
-        PREFIX obj: <http://guara.ueg.br/ontologias/v1/objetos#>
-        PREFIX classdef: <http://guara.ueg.br/ontologias/v1/classes#>
-        PREFIX dc: <http://purl.org/dc/terms/>
-        PREFIX cmg: <http://www.cmg.ueg.br/schema>
-        PREFIX schema: <http://schema.org/>
-        PREFIX owl: <http://www.w3.org/2002/07/owl#>
-
-        SELECT ?id ?titulo ?descricao ?assunto ?tipo ?dimensao (GROUP_CONCAT(STR(?tipoFisicoRaw); separator=", ") AS ?tipoFisico)
+    GROUP BY ?obj ?titulo ?dimensao
+    ORDER BY """ + ordem(CHAVES_DIM) + """
+    %limite%
+            """)
+
+SPARQ_ALL = SparqlTemplate(" PREFIX : %repo% " + PREFIXOS + """
+        SELECT ?id ?titulo (SAMPLE(?descricaoRaw) AS ?descricao) (SAMPLE(?assuntoRaw) AS ?assunto) ?tipo
+               (COALESCE(SAMPLE(STR(?dimensaoRaw)), "") AS ?dimensao)
+               (GROUP_CONCAT(DISTINCT STR(?tipoFisicoRaw); separator=", ") AS ?tipoFisico)
         WHERE {
           ?id rdf:type ?tipoClasse ;
               dc:title ?titulo ;
-              dc:description ?descricao ;
+              dc:description ?descricaoRaw ;
               %tipo%
-              dc:abstract ?assunto .
+              dc:abstract ?assuntoRaw .
 
           OPTIONAL { ?id obj:dimensao ?dimensaoRaw. }
           OPTIONAL { ?id obj:tipoFisico ?tipoFisicoRaw. }
@@ -63,72 +134,253 @@ def get_sparq_all():
             IF(?tipoClasse = obj:ObjetoFisico, "Físico", "Dimensional") AS ?tipo
           )
 
-          BIND(
-            IF(BOUND(?dimensaoRaw), STR(?dimensaoRaw), "") AS ?dimensao
-          )
-
-          FILTER (
-            CONTAINS(LCASE(STR(?titulo)), LCASE("%keyword%")) ||
-            CONTAINS(LCASE(STR(?descricao)), LCASE("%keyword%")) ||
-            CONTAINS(LCASE(STR(?assunto)), LCASE("%keyword%"))
-          )
+          %busca%
+          %pagina%
         }
-        GROUP BY ?id ?titulo ?descricao ?assunto ?tipo ?dimensao
-        ORDER BY ?tipo ?titulo
+        GROUP BY ?id ?titulo ?tipo
+        ORDER BY """ + ordem(CHAVES_ALL) + """
+        %limite%
 
-                    """
+                    """)
 
-def get_sparq_obj():
-    return get_prefix() + """
-    SELECT DISTINCT ?obj ?titulo ?resumo ?descricao ?colecao (GROUP_CONCAT(DISTINCT ?tipo; SEPARATOR=", ") AS ?tipos)
+SPARQ_OBJ = SparqlTemplate(" PREFIX : %repo% " + PREFIXOS + """
+    SELECT ?obj ?titulo (SAMPLE(?resumoRaw) AS ?resumo) (SAMPLE(?descricaoRaw) AS ?descricao)
+           (SAMPLE(?colecaoRaw) AS ?colecao) (GROUP_CONCAT(DISTINCT ?tipo; SEPARATOR=", ") AS ?tipos)
     WHERE {
         ?obj a obj:ObjetoFisico.
         ?obj dc:title ?titulo.
-        ?obj dc:abstract ?resumo.
-        OPTIONAL { ?obj dc:description ?descricao . }
-        OPTIONAL { ?obj obj:colecao ?colecao. }
+        ?obj dc:abstract ?resumoRaw.
+        OPTIONAL { ?obj dc:description ?descricaoRaw . }
+        OPTIONAL { ?obj obj:colecao ?colecaoRaw. }
         OPTIONAL { ?obj obj:tipoFisico ?tipo. }
-        FILTER (regex(?obj, '%keyword%', 'i') || regex(?titulo, '%keyword%', 'i') || regex(?resumo, '%keyword%', 'i'))
+        %busca%
+        %pagina%
     }
-    GROUP BY ?obj ?titulo ?resumo ?colecao ?descricao
-            """
+    GROUP BY ?obj ?titulo
+    ORDER BY """ + ordem(CHAVES_OBJ) + """
+    %limite%
+            """)
 
-def get_sparq_class():
-    return get_prefix() + """
-      PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>
+SPARQ_CLASS = SparqlTemplate(PREFIXOS + """
       SELECT DISTINCT ?class ?label ?description ?subclassof
       WHERE {
           ?class a owl:Class.
           OPTIONAL { ?class rdfs:label ?label }
           OPTIONAL { ?class rdfs:comment ?description }
           OPTIONAL { ?class rdfs:subClassOf ?subclassof }
-          FILTER ((!bound(?description) || (regex(?description, "%keyword%", "i")))
-                  || (!bound(?label) || (regex(?label, "%keyword%", "i"))))
-      }ORDER BY asc(?%orderby%)"""
-
-
-def get_sparq_repo():
-    base = get_base()
-    prefixos = get_prefix()  # já vem formatado se você corrigiu como na resposta anterior
-    consulta = f"""
-      PREFIX :     <{base}/repositoriosamigos#> 
-      PREFIX rpa:  <{base}/repositorios#> 
-      PREFIX rdf:  <http://www.w3.org/1999/02/22-rdf-syntax-ns#> 
-      PREFIX owl:  <http://www.w3.org/2002/07/owl#> 
-      PREFIX xsd:  <http://www.w3.org/2001/XMLSchema#> 
-      PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#> 
+          FILTER ((!bound(?description) || CONTAINS(LCASE(STR(?description)), %keyword%))
+                  || (!bound(?label) || CONTAINS(LCASE(STR(?label)), %keyword%)))
+          %pagina%
+      }ORDER BY %ordem%
+      %limite%""")
+
+SPARQ_RELACOES = SparqlTemplate(PREFIXOS + """
+                SELECT ?id ?propriedade ?valor
+                    (IF(isURI(?valor), "URI", "Literal") AS ?tipo_recurso)
+                    ?titulo
+                WHERE {
+                {
+                    # Relações diretas
+                    ?id ?propriedade ?valor .
+                    FILTER(?id = %id%)
+                }
+                UNION
+                {
+                    # Relações inversas
+                    ?valor ?propriedade ?id .
+                    FILTER(?id = %id%)
+                    BIND("direta" AS ?direcao)
+                }
+                OPTIONAL {
+                    ?valor dc:title ?titulo .
+                    FILTER(isURI(?valor))
+                    BIND("direta" AS ?direcao)
+                }
+                }
+                """)
+
+SPARQ_REPO = SparqlTemplate(PREFIXOS + """
+      PREFIX :     <%base%/repositoriosamigos#>
+      PREFIX rpa:  <%base%/repositorios#>
 
       SELECT ?nome ?uri ?contato ?descricao ?responsavel
-      WHERE {{
+      WHERE {
         ?repo rpa:uri ?uri.
         ?repo rpa:nome ?nome.
-        OPTIONAL {{ ?repo rpa:contato ?contato. }}
-        OPTIONAL {{ ?repo rpa:descricao ?descricao. }}
-        OPTIONAL {{ ?repo rpa:responsavel ?responsavel. }}
-      }} ORDER BY ?nome
-      """
-    retorno = prefixos + "\n" + consulta
-    print('retorno', retorno)
-    return retorno
-
-    
\ No newline at end of file
+        OPTIONAL { ?repo rpa:contato ?contato. }
+        OPTIONAL { ?repo rpa:descricao ?descricao. }
+        OPTIONAL { ?repo rpa:responsavel ?responsavel. }
+        %filtro%
+      } ORDER BY ?nome
+      """)
+
+SPARQ_MIDIAS_SEM_TRANSCRICAO = SparqlTemplate(" PREFIX : %repo% " + PREFIXOS + """
+    SELECT DISTINCT ?obj ?midia
+    WHERE {
+        ?obj schema:associatedMedia ?midia .
+        %colecao%
+        FILTER (isLiteral(?midia))
+        FILTER NOT EXISTS {
+            ?obj obj:temTranscricao ?transcricao .
+            ?transcricao schema:associatedMedia ?midia .
+        }
+    }
+    ORDER BY ?obj ?midia
+            """)
+
+SPARQ_TRANSCRICOES = SparqlTemplate(" PREFIX : %repo% " + PREFIXOS + """
+    SELECT ?obj ?midia ?texto
+    WHERE {
+        ?obj obj:temTranscricao ?transcricao .
+        ?transcricao schema:associatedMedia ?midia ;
+                     obj:texto ?texto .
+    }
+            """)
+
+# Fragmentos aceitos nos marcadores que não recebem valores livres
+TIPOS_DIMENSAO = {
+    'quem': 'a obj:Pessoa;',
+    'quando': 'a obj:Tempo;',
+    'onde': 'a obj:Lugar;',
+    'oque': 'a obj:Evento;',
+    'fisico': 'a obj:ObjetoFisico;'
+}
+ORDENACOES_CLASSE = ('class', 'label', 'description', 'subclassof')
+
+
+def _palavra_chave(keyword):
+    return literal((keyword or '').lower())
+
+
+def _variantes():
+    # Letras acentuadas (Latin-1 e Latin Extended-A) agrupadas pela letra base,
+    # para a busca pelo SPARQL ignorar acentos como o tokenizador do índice
+    variantes = {}
+    for codigo in range(0xC0, 0x180):
+        base = unicodedata.normalize('NFKD', chr(codigo))[0]
+        if base.isascii() and base.isalpha():
+            variantes.setdefault(base.lower(), set()).add(chr(codigo))
+    return {base: base + base.upper() + ''.join(sorted(v)) for base, v in variantes.items()}
+
+
+_VARIANTES = _variantes()
+_LETRAS = '0-9A-Za-z' + ''.join(sorted(c for v in _VARIANTES.values() for c in v if not c.isascii()))
+_TERMOS = re.compile(r'\w+', re.UNICODE)
+
+
+def _termo_regex(termo):
+    # Início de palavra seguido do termo, letra a letra com as variantes acentuadas
+    termo = ''.join(c for c in unicodedata.normalize('NFKD', termo) if not unicodedata.combining(c))
+    return f'(^|[^{_LETRAS}])' + ''.join(f'[{_VARIANTES[c]}]' if c in _VARIANTES else c for c in termo)
+
+
+def _busca(variavel, keyword, ids):
+    """
+    Restrição da palavra-chave: com os ids já resolvidos pelo índice de busca
+    (indice_busca), só um bloco VALUES. Sem eles, a mesma regra do índice:
+    cada termo precisa começar alguma palavra do título, resumo ou descrição,
+    sem diferenciar caixa nem acentos.
+    """
+    if ids is not None:
+        return f'VALUES ?{variavel} {{ {" ".join(iri(i) for i in ids)} }}'
+    return '\n'.join(
+        f'FILTER EXISTS {{ ?{variavel} dc:title|dc:abstract|dc:description ?texto . '
+        f'FILTER REGEX(STR(?texto), {literal(_termo_regex(termo))}, "i") }}'
+        for termo in _TERMOS.findall((keyword or '').lower()))
+
+
+# ---------------------------------------------------------------------------
+# Paginação por cursor (keyset)
+#
+# O cursor é opaco para o cliente: base64 dos valores das chaves de ordenação
+# da última linha entregue. A página seguinte filtra as linhas que vêm depois
+# dessa tupla, então o custo não cresce com o número da página.
+# ---------------------------------------------------------------------------
+
+def codificar_cursor(valores):
+    return base64.urlsafe_b64encode(json.dumps(valores).encode()).decode().rstrip('=')
+
+
+def decodificar_cursor(cursor, quantidade):
+    try:
+        valores = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except (ValueError, TypeError):
+        raise ValueError('Cursor inválido')
+    if not isinstance(valores, list) or len(valores) != quantidade \
+            or not all(isinstance(v, str) for v in valores):
+        raise ValueError('Cursor inválido')
+    return valores
+
+
+def cursor_da_linha(linha, chaves):
+    return codificar_cursor([linha.get(v, {}).get('value', '') for v in chaves])
+
+
+def _filtro_cursor(chaves, valores):
+    # (k1 > v1) || (k1 = v1 && ((k2 > v2) || (k2 = v2 && ...)))
+    expressao = None
+    for variavel, valor in reversed(list(zip(chaves, valores))):
+        chave, valor = _chave_ordem(variavel), literal(valor)
+        if expressao is None:
+            expressao = f'{chave} > {valor}'
+        else:
+            expressao = f'{chave} > {valor} || ({chave} = {valor} && ({expressao}))'
+    return f'FILTER ({expressao})'
+
+
+def _paginacao(chaves, limite, cursor):
+    pagina = _filtro_cursor(chaves, decodificar_cursor(cursor, len(chaves))) if cursor else ''
+    # Uma linha a mais indica se existe próxima página
+    return {'pagina': pagina, 'limite': f'LIMIT {int(limite) + 1}' if limite else ''}
+
+
+def get_sparq_dim(repo, keyword, limite=None, cursor=None, ids=None):
+    return SPARQ_DIM.render(repo=iri(repo + '#'),
+                            busca=_busca('obj', keyword, ids),
+                            **_paginacao(CHAVES_DIM, limite, cursor))
+
+
+def get_sparq_all(repo, keyword, tipo=None, limite=None, cursor=None, ids=None):
+    return SPARQ_ALL.render(repo=iri(repo + '#'),
+                            busca=_busca('id', keyword, ids),
+                            tipo=TIPOS_DIMENSAO.get(tipo, ''),
+                            **_paginacao(CHAVES_ALL, limite, cursor))
+
+
+def get_sparq_obj(repo, keyword, limite=None, cursor=None, ids=None):
+    return SPARQ_OBJ.render(repo=iri(repo + '#'),
+                            busca=_busca('obj', keyword, ids),
+                            **_paginacao(CHAVES_OBJ, limite, cursor))
+
+
+def chaves_class(orderby='class'):
+    # Uma classe aparece em várias linhas (um rótulo, comentário ou
+    # superclasse por linha): o cursor precisa de todas as variáveis
+    # projetadas para não pular nem repetir linhas entre as páginas
+    if orderby not in ORDENACOES_CLASSE:
+        orderby = 'class'
+    return (orderby,) + tuple(v for v in ORDENACOES_CLASSE if v != orderby)
+
+
+def get_sparq_class(keyword, orderby='class', limite=None, cursor=None):
+    chaves = chaves_class(orderby)
+    return SPARQ_CLASS.render(keyword=_palavra_chave(keyword), ordem=ordem(chaves),
+                              **_paginacao(chaves, limite, cursor))
+
+
+def get_sparq_relacoes(object_uri):
+    return SPARQ_RELACOES.render(id=iri(object_uri))
+
+
+def get_sparq_repo(nome=None):
+    filtro = f'FILTER(?nome = {literal(nome)})' if nome else ''
+    return SPARQ_REPO.render(base=get_base(), filtro=filtro)
+
+
+def get_sparq_midias_sem_transcricao(repo, colecao=None):
+    filtro = f'?obj obj:colecao {iri(colecao)} .' if colecao else ''
+    return SPARQ_MIDIAS_SEM_TRANSCRICAO.render(repo=iri(repo + '#'), colecao=filtro)
+
+
+def get_sparq_transcricoes(repo):
+    return SPARQ_TRANSCRICOES.render(repo=iri(repo + '#'))
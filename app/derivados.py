@@ -0,0 +1,208 @@
+"""
+Versões reduzidas (derivados) das imagens enviadas, para galerias e listagens.
+
+Tamanhos (lado maior, em pixels): thumb, medio e web. Cada derivado existe em
+WebP, para os clientes que o aceitam, e em JPEG. Ficam em
+derivados_dir/<objetoId>/<nome>.<tamanho>.<formato>:
+    - no upload, agendar() gera todos num pool de threads, sem atrasar a
+      resposta;
+    - o que faltar (imagens antigas, cache limpo) é gerado na primeira
+      requisição (obter());
+    - o diretório tem tamanho máximo (derivados_max_bytes); os derivados
+      servidos há mais tempo (atime) são apagados primeiro.
+"""
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image, ImageOps
+from werkzeug.security import safe_join
+from werkzeug.utils import secure_filename
+
+from .config_loader import ao_recarregar, get_settings
+
+TAMANHOS = {'thumb': 256, 'medio': 1024, 'web': 2048}
+FORMATOS = {'webp': ('WEBP', 'image/webp'), 'jpg': ('JPEG', 'image/jpeg')}
+EXTENSOES = {'.jpg', '.jpeg', '.png', '.gif', '.tif', '.tiff', '.bmp', '.webp'}
+QUALIDADE = {'thumb': 75, 'medio': 80, 'web': 82}
+
+_pool = None
+_lock = threading.Lock()
+_lock_tamanho = threading.Lock()
+_tamanho = None
+
+
+def eh_imagem(nome):
+    return os.path.splitext(nome)[-1].lower() in EXTENSOES
+
+
+def diretorio(upload_folder):
+    pasta = get_settings().derivados_dir or os.path.join(upload_folder, '.derivados')
+    os.makedirs(pasta, exist_ok=True)
+    return pasta
+
+
+def _origem(upload_folder, objeto_id, nome):
+    # None para nomes que sairiam da pasta de uploads
+    return safe_join(upload_folder, str(objeto_id), nome)
+
+
+def caminho(upload_folder, objeto_id, nome, tamanho, formato):
+    return os.path.join(diretorio(upload_folder), secure_filename(str(objeto_id)),
+                        f'{secure_filename(nome)}.{tamanho}.{formato}')
+
+
+def _atual(destino, origem):
+    try:
+        return os.path.getmtime(destino) >= os.path.getmtime(origem)
+    except FileNotFoundError:
+        return False
+
+
+def _abrir(origem, lado):
+    img = Image.open(origem)
+    # JPEG: o decodificador já reduz por 1/2, 1/4 ou 1/8 ao ler
+    img.draft('RGB', (lado, lado))
+    img = ImageOps.exif_transpose(img)
+    if img.mode in ('RGBA', 'LA', 'P'):
+        img = img.convert('RGBA')
+        fundo = Image.new('RGB', img.size, (255, 255, 255))
+        fundo.paste(img, mask=img.getchannel('A'))
+        return fundo
+    return img.convert('RGB')
+
+
+def _salvar(upload_folder, img, destino, tamanho, formato):
+    os.makedirs(os.path.dirname(destino), exist_ok=True)
+    temporario = f'{destino}.{os.getpid()}.{threading.get_ident()}.tmp'
+    img.save(temporario, FORMATOS[formato][0], quality=QUALIDADE[tamanho], optimize=formato == 'jpg')
+    os.replace(temporario, destino)
+    _registrar(upload_folder, os.path.getsize(destino))
+
+
+def gerar(upload_folder, objeto_id, nome, tamanhos=None, formatos=None):
+    """
+    Gera os derivados que faltam da imagem, do maior para o menor: cada
+    tamanho é reduzido a partir do anterior, não do original.
+    """
+    origem = _origem(upload_folder, objeto_id, nome)
+    tamanhos = sorted(tamanhos or TAMANHOS, key=TAMANHOS.get, reverse=True)
+    formatos = formatos or list(FORMATOS)
+    faltando = [(t, f) for t in tamanhos for f in formatos
+                if not _atual(caminho(upload_folder, objeto_id, nome, t, f), origem)]
+    if not faltando:
+        return
+
+    img = _abrir(origem, TAMANHOS[faltando[0][0]])
+    try:
+        for tamanho in tamanhos:
+            lado = TAMANHOS[tamanho]
+            if max(img.size) > lado:
+                img.thumbnail((lado, lado), Image.LANCZOS)
+            for formato in formatos:
+                if (tamanho, formato) in faltando:
+                    destino = caminho(upload_folder, objeto_id, nome, tamanho, formato)
+                    _salvar(upload_folder, img, destino, tamanho, formato)
+    finally:
+        img.close()
+
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        with _lock:
+            if _pool is None:
+                _pool = ThreadPoolExecutor(max_workers=get_settings().derivados_threads,
+                                           thread_name_prefix='derivados')
+    return _pool
+
+
+@ao_recarregar
+def _recarregar(settings):
+    global _pool, _tamanho
+    with _lock:
+        pool, _pool = _pool, None
+    with _lock_tamanho:
+        # derivados_dir pode ter mudado
+        _tamanho = None
+    if pool is not None:
+        pool.shutdown(wait=False)
+
+
+def _gerar_em_segundo_plano(upload_folder, objeto_id, nome):
+    try:
+        gerar(upload_folder, objeto_id, nome)
+    except Exception as e:
+        # Fica para a geração sob demanda
+        print('derivados:', nome, e)
+
+
+def agendar(upload_folder, objeto_id, nomes):
+    for nome in nomes:
+        if eh_imagem(nome):
+            get_pool().submit(_gerar_em_segundo_plano, upload_folder, objeto_id, nome)
+
+
+def obter(upload_folder, objeto_id, nome, tamanho, formato):
+    """
+    Caminho do derivado, gerado agora se ainda não existir. None quando a
+    mídia não existe ou não é imagem.
+    """
+    origem = _origem(upload_folder, objeto_id, nome)
+    if not eh_imagem(nome) or origem is None or not os.path.isfile(origem):
+        return None
+    destino = caminho(upload_folder, objeto_id, nome, tamanho, formato)
+    if _atual(destino, origem):
+        # Marca o uso para a limpeza por LRU no atime: o mtime (e o ETag)
+        # só muda quando o derivado é gerado de novo
+        os.utime(destino, (time.time(), os.path.getmtime(destino)))
+    else:
+        gerar(upload_folder, objeto_id, nome, [tamanho], [formato])
+    return destino
+
+
+# ---------------------------------------------------------------------------
+# Limite de tamanho do diretório
+# ---------------------------------------------------------------------------
+
+def _entradas(base):
+    entradas = []
+    for pasta, _, arquivos in os.walk(base):
+        for arquivo in arquivos:
+            if arquivo.endswith('.tmp'):
+                continue
+            try:
+                info = os.stat(os.path.join(pasta, arquivo))
+            except FileNotFoundError:
+                continue
+            entradas.append((info.st_atime, info.st_size, os.path.join(pasta, arquivo)))
+    return entradas
+
+
+def _registrar(upload_folder, tamanho):
+    global _tamanho
+    with _lock_tamanho:
+        base = diretorio(upload_folder)
+        if _tamanho is None:
+            _tamanho = sum(t for _, t, _ in _entradas(base))
+        else:
+            _tamanho += tamanho
+        if _tamanho > get_settings().derivados_max_bytes:
+            _tamanho = _liberar(base)
+
+
+def _liberar(base):
+    # Apaga os derivados usados há mais tempo até sobrar 90% do limite
+    entradas = sorted(_entradas(base))
+    total = sum(tamanho for _, tamanho, _ in entradas)
+    alvo = get_settings().derivados_max_bytes * 0.9
+    for _, tamanho, arquivo in entradas:
+        if total <= alvo:
+            break
+        try:
+            os.remove(arquivo)
+            total -= tamanho
+        except FileNotFoundError:
+            pass
+    return total
@@ -0,0 +1,74 @@
+"""
+Contadores de geração compartilhados entre os processos (SQLite).
+
+Os caches em memória (resultados SPARQL, tokens validados) são de cada
+processo. Quem altera o dado avança a geração da chave correspondente; quem
+lê do cache compara a geração guardada com a atual e descarta a entrada
+antiga. Assim uma atualização atendida por um worker invalida o cache dos
+outros na leitura seguinte, sem esperar o TTL.
+
+O arquivo precisa ser o mesmo para todos os workers (geracoes_path). Se ele
+não puder ser lido, atual() retorna None e os caches voltam a depender só do
+TTL.
+"""
+import os
+import sqlite3
+import threading
+
+from .config_loader import get_settings
+
+_local = threading.local()
+_lock_schema = threading.Lock()
+_schema_criado = set()
+
+_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS geracoes (
+        chave TEXT PRIMARY KEY,
+        n INTEGER NOT NULL
+    );
+"""
+
+
+def caminho():
+    return get_settings().geracoes_path or os.path.join(
+        os.path.dirname(__file__), 'geracoes.sqlite3')
+
+
+def _conexao():
+    # Uma conexão por thread, como em indice_busca
+    path = caminho()
+    conexoes = getattr(_local, 'conexoes', None)
+    if conexoes is None:
+        conexoes = _local.conexoes = {}
+    conn = conexoes.get(path)
+    if conn is None:
+        conn = sqlite3.connect(path, timeout=10, isolation_level=None)
+        conn.execute('PRAGMA journal_mode=WAL')
+        with _lock_schema:
+            if path not in _schema_criado:
+                conn.executescript(_SCHEMA)
+                _schema_criado.add(path)
+        conexoes[path] = conn
+    return conn
+
+
+def atual(chave):
+    """
+    Geração atual da chave (0 se nunca avançada), ou None se o arquivo
+    compartilhado não está disponível.
+    """
+    try:
+        linha = _conexao().execute('SELECT n FROM geracoes WHERE chave = ?', (chave,)).fetchone()
+    except sqlite3.Error as e:
+        print('geracoes:', e)
+        return None
+    return linha[0] if linha else 0
+
+
+def avancar(chave):
+    try:
+        _conexao().execute(
+            'INSERT INTO geracoes (chave, n) VALUES (?, 1) '
+            'ON CONFLICT (chave) DO UPDATE SET n = n + 1', (chave,))
+    except sqlite3.Error as e:
+        print('geracoes:', e)
@@ -0,0 +1,324 @@
+"""
+Índice local de busca textual (SQLite FTS5) sobre dc:title, dc:abstract e
+dc:description dos objetos físicos e dimensionais.
+
+A busca por palavra-chave resolve aqui os identificadores dos objetos e o
+Fuseki recebe apenas um bloco VALUES com eles, em vez de varrer todos os
+textos do repositório. O índice é atualizado pelas rotas de criação,
+atualização e exclusão, inclusive as edições de propriedades da relationapi
+(atualizar_objeto()); um repositório só é consultado pelo índice depois de
+indexado por completo (reindexar()). Enquanto isso, ou se o índice falhar, as
+listagens filtram no próprio SPARQL com a mesma regra (consultas._busca()).
+
+As transcrições (OCR) ficam numa segunda tabela, uma linha por página de cada
+mídia, alimentada por ocr_lote.gravar(). A busca nelas (buscar_transcricoes)
+não tem equivalente no SPARQL: responde só com o índice.
+"""
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+
+from . import sparql_client
+from .config_loader import get_settings
+from .consultas import SparqlTemplate, get_prefix, get_sparq_transcricoes, iri
+
+_TERMOS = re.compile(r'\w+', re.UNICODE)
+_local = threading.local()
+_lock_schema = threading.Lock()
+_schema_criado = set()
+
+_SCHEMA = """
+    CREATE VIRTUAL TABLE IF NOT EXISTS documentos USING fts5(
+        repo UNINDEXED, id UNINDEXED, titulo, resumo, descricao,
+        tokenize = 'unicode61 remove_diacritics 2'
+    );
+    CREATE VIRTUAL TABLE IF NOT EXISTS transcricoes USING fts5(
+        repo UNINDEXED, objeto UNINDEXED, midia UNINDEXED, pagina UNINDEXED, texto,
+        tokenize = 'unicode61 remove_diacritics 2'
+    );
+    CREATE TABLE IF NOT EXISTS repositorios_indexados (
+        repo TEXT PRIMARY KEY,
+        indexado_em REAL NOT NULL
+    );
+"""
+
+# Propriedades indexadas: alterá-las exige atualizar o documento do objeto
+PROPRIEDADES = {
+    'http://purl.org/dc/terms/title',
+    'http://purl.org/dc/terms/abstract',
+    'http://purl.org/dc/terms/description',
+}
+
+SPARQL_TEXTOS = SparqlTemplate("""
+    SELECT ?id ?titulo ?resumo ?descricao
+    WHERE {
+        %objeto%
+        ?id a ?tipo .
+        FILTER (?tipo IN (obj:ObjetoFisico, obj:ObjetoDimensional))
+        OPTIONAL { ?id dc:title ?titulo . }
+        OPTIONAL { ?id dc:abstract ?resumo . }
+        OPTIONAL { ?id dc:description ?descricao . }
+    }
+""")
+
+
+def caminho():
+    return get_settings().indice_busca_path or os.path.join(
+        os.path.dirname(__file__), 'indice_busca.sqlite3')
+
+
+def _conexao():
+    # Uma conexão por thread; o modo WAL permite leituras durante as escritas
+    path = caminho()
+    conexoes = getattr(_local, 'conexoes', None)
+    if conexoes is None:
+        conexoes = _local.conexoes = {}
+    conn = conexoes.get(path)
+    if conn is None:
+        conn = sqlite3.connect(path, timeout=10)
+        conn.execute('PRAGMA journal_mode=WAL')
+        with _lock_schema:
+            if path not in _schema_criado:
+                conn.executescript(_SCHEMA)
+                _schema_criado.add(path)
+        conexoes[path] = conn
+    return conn
+
+
+def _repo(repo):
+    return (repo or '').rstrip('/#')
+
+
+def _texto(valor):
+    return '' if valor is None else str(valor)
+
+
+def indexado(repo):
+    try:
+        linha = _conexao().execute(
+            'SELECT 1 FROM repositorios_indexados WHERE repo = ?', (_repo(repo),)).fetchone()
+    except sqlite3.Error as e:
+        print('indice_busca:', e)
+        return False
+    return linha is not None
+
+
+def desmarcar(repo):
+    """
+    O índice do repositório deixa de ser usado até o próximo reindexar():
+    depois de uma falha ou de uma alteração feita fora das rotas que o
+    atualizam (carga RDF, edições genéricas de propriedades), as buscas
+    voltam ao SPARQL.
+    """
+    try:
+        with _conexao() as conn:
+            conn.execute('DELETE FROM repositorios_indexados WHERE repo = ?', (_repo(repo),))
+    except sqlite3.Error as e:
+        print('indice_busca:', e)
+
+
+def indexar(repo, objeto_uri, titulo, resumo, descricao):
+    try:
+        with _conexao() as conn:
+            conn.execute('DELETE FROM documentos WHERE repo = ? AND id = ?',
+                         (_repo(repo), objeto_uri))
+            conn.execute('INSERT INTO documentos (repo, id, titulo, resumo, descricao) '
+                         'VALUES (?, ?, ?, ?, ?)',
+                         (_repo(repo), objeto_uri, _texto(titulo), _texto(resumo), _texto(descricao)))
+    except sqlite3.Error as e:
+        print('indice_busca:', e)
+        desmarcar(repo)
+
+
+def indexar_lote(repo, documentos):
+    """
+    documentos: (objeto_uri, titulo, resumo, descricao) de objetos novos,
+    gravados numa única transação.
+    """
+    try:
+        with _conexao() as conn:
+            conn.executemany(
+                'INSERT INTO documentos (repo, id, titulo, resumo, descricao) VALUES (?, ?, ?, ?, ?)',
+                ((_repo(repo), objeto_uri, _texto(titulo), _texto(resumo), _texto(descricao))
+                 for objeto_uri, titulo, resumo, descricao in documentos))
+    except sqlite3.Error as e:
+        print('indice_busca:', e)
+        desmarcar(repo)
+
+
+def remover(repo, objeto_uri):
+    try:
+        with _conexao() as conn:
+            conn.execute('DELETE FROM documentos WHERE repo = ? AND id = ?',
+                         (_repo(repo), objeto_uri))
+            conn.execute('DELETE FROM transcricoes WHERE repo = ? AND objeto = ?',
+                         (_repo(repo), objeto_uri))
+    except sqlite3.Error as e:
+        print('indice_busca:', e)
+        desmarcar(repo)
+
+
+def indexar_transcricao(repo, objeto_uri, midia, paginas):
+    """
+    Substitui a transcrição indexada da mídia; paginas é a lista de textos,
+    na ordem das páginas.
+    """
+    try:
+        with _conexao() as conn:
+            conn.execute('DELETE FROM transcricoes WHERE repo = ? AND objeto = ? AND midia = ?',
+                         (_repo(repo), objeto_uri, midia))
+            conn.executemany(
+                'INSERT INTO transcricoes (repo, objeto, midia, pagina, texto) VALUES (?, ?, ?, ?, ?)',
+                ((_repo(repo), objeto_uri, midia, numero, texto)
+                 for numero, texto in enumerate(paginas, start=1) if texto and texto.strip()))
+    except sqlite3.Error as e:
+        print('indice_busca:', e)
+
+
+def _normalizar(texto):
+    # Mesma comparação do tokenizador: sem caixa e sem acentos
+    texto = unicodedata.normalize('NFKD', texto.lower())
+    return ''.join(c for c in texto if not unicodedata.combining(c))
+
+
+def _linhas(texto, termos):
+    # Números (a partir de 1) das linhas da página com algum dos termos
+    return [numero for numero, linha in enumerate(texto.split('\n'), start=1)
+            if any(palavra.startswith(termo)
+                   for palavra in _TERMOS.findall(_normalizar(linha)) for termo in termos)]
+
+
+def buscar_transcricoes(repo, keyword, limite):
+    """
+    Páginas transcritas do repositório que casam com a palavra-chave, das
+    mais relevantes para as menos, agrupadas por objeto:
+        [{'objeto', 'ocorrencias': [{'midia', 'pagina', 'linhas', 'trecho'}]}]
+    """
+    consulta = expressao(keyword)
+    if consulta is None:
+        return []
+    termos = _TERMOS.findall(_normalizar(keyword))
+    linhas = _conexao().execute(
+        "SELECT objeto, midia, pagina, texto, snippet(transcricoes, 4, '<mark>', '</mark>', '…', 16) "
+        'FROM transcricoes WHERE repo = ? AND transcricoes MATCH ? ORDER BY rank LIMIT ?',
+        (_repo(repo), consulta, limite)).fetchall()
+
+    objetos = {}
+    for objeto_uri, midia, pagina, texto, trecho in linhas:
+        objetos.setdefault(objeto_uri, []).append(
+            {'midia': midia, 'pagina': pagina, 'linhas': _linhas(texto, termos), 'trecho': trecho})
+    return [{'objeto': objeto_uri, 'ocorrencias': ocorrencias} for objeto_uri, ocorrencias in objetos.items()]
+
+
+def expressao(keyword):
+    """
+    Converte a palavra-chave em consulta FTS5: todos os termos, cada um
+    como prefixo ("casa" encontra "casarão"). None quando não há termos.
+    """
+    termos = _TERMOS.findall((keyword or '').lower())
+    if not termos:
+        return None
+    return ' AND '.join(f'"{termo}"*' for termo in termos)
+
+
+def buscar(repo, keyword):
+    """
+    IRIs dos objetos do repositório cujo texto casa com a palavra-chave.
+    Retorna None quando a busca deve ficar com o SPARQL: repositório não
+    indexado, palavra-chave vazia, falha no índice ou resultados demais para
+    caber num bloco VALUES.
+    """
+    consulta = expressao(keyword)
+    if consulta is None or not indexado(repo):
+        return None
+    maximo = get_settings().indice_busca_max_ids
+    try:
+        linhas = _conexao().execute(
+            'SELECT id FROM documentos WHERE repo = ? AND documentos MATCH ? LIMIT ?',
+            (_repo(repo), consulta, maximo + 1)).fetchall()
+    except sqlite3.Error as e:
+        print('indice_busca:', e)
+        return None
+    if len(linhas) > maximo:
+        return None
+    return [linha[0] for linha in linhas]
+
+
+def _documentos(repo, objeto_uri=None):
+    # {objeto_uri: {'titulo': [...], 'resumo': [...], 'descricao': [...]}} do Fuseki
+    objeto = f'VALUES ?id {{ {iri(objeto_uri)} }}' if objeto_uri else ''
+    sparql = f"{get_prefix()}\n    PREFIX : {iri(_repo(repo) + '#')}\n{SPARQL_TEXTOS.render(objeto=objeto)}"
+    response = sparql_client.query(repo, sparql)
+    response.raise_for_status()
+    linhas = response.json().get('results', {}).get('bindings', [])
+
+    documentos = {}
+    for linha in linhas:
+        # Valores repetidos (várias descrições, por exemplo) vão juntos
+        atual = documentos.setdefault(linha['id']['value'], {'titulo': [], 'resumo': [], 'descricao': []})
+        for campo in atual:
+            valor = linha.get(campo, {}).get('value')
+            if valor and valor not in atual[campo]:
+                atual[campo].append(valor)
+    return documentos
+
+
+def atualizar_objeto(repo, objeto_uri):
+    """
+    Relê do Fuseki os textos de um objeto alterado por uma rota genérica
+    (relationapi) e atualiza o seu documento. Se não der, o repositório
+    volta a ser buscado pelo SPARQL (desmarcar()).
+    """
+    try:
+        d = _documentos(repo, objeto_uri).get(objeto_uri)
+        if d is None:
+            with _conexao() as conn:
+                conn.execute('DELETE FROM documentos WHERE repo = ? AND id = ?',
+                             (_repo(repo), objeto_uri))
+        else:
+            indexar(repo, objeto_uri, '\n'.join(d['titulo']), '\n'.join(d['resumo']),
+                    '\n'.join(d['descricao']))
+    except Exception as e:
+        print('indice_busca:', e)
+        desmarcar(repo)
+
+
+def reindexar(repo):
+    """
+    Recria o índice do repositório a partir do Fuseki e passa a usá-lo nas
+    buscas. Retorna o número de objetos indexados.
+    """
+    documentos = _documentos(repo)
+    with _conexao() as conn:
+        conn.execute('DELETE FROM documentos WHERE repo = ?', (_repo(repo),))
+        conn.executemany(
+            'INSERT INTO documentos (repo, id, titulo, resumo, descricao) VALUES (?, ?, ?, ?, ?)',
+            ((_repo(repo), objeto_uri, '\n'.join(d['titulo']), '\n'.join(d['resumo']),
+              '\n'.join(d['descricao'])) for objeto_uri, d in documentos.items()))
+        conn.execute('INSERT OR REPLACE INTO repositorios_indexados (repo, indexado_em) VALUES (?, ?)',
+                     (_repo(repo), time.time()))
+    return len(documentos)
+
+
+def reindexar_transcricoes(repo):
+    """
+    Recria o índice de transcrições do repositório a partir dos
+    obj:Transcricao gravados no Fuseki. Retorna o número de mídias.
+    """
+    response = sparql_client.query(repo, get_sparq_transcricoes(_repo(repo)))
+    response.raise_for_status()
+    linhas = response.json().get('results', {}).get('bindings', [])
+
+    with _conexao() as conn:
+        conn.execute('DELETE FROM transcricoes WHERE repo = ?', (_repo(repo),))
+        for linha in linhas:
+            # Páginas separadas por \f (ocr_lote.SEPARADOR_PAGINAS)
+            conn.executemany(
+                'INSERT INTO transcricoes (repo, objeto, midia, pagina, texto) VALUES (?, ?, ?, ?, ?)',
+                ((_repo(repo), linha['obj']['value'], linha['midia']['value'], numero, texto)
+                 for numero, texto in enumerate(linha['texto']['value'].split('\f'), start=1)
+                 if texto.strip()))
+    return len(linhas)
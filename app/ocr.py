@@ -0,0 +1,232 @@
+"""
+Pipeline de OCR (kraken) usado pela transcrição.
+
+Cada página passa por pré-processamento (ocr_preprocess), binarização,
+segmentação e reconhecimento num pool de processos do tamanho dos núcleos
+disponíveis (ou ocr_processos do config.json). O pool recebe só o caminho do
+arquivo e o número da página:
+cada processo rasteriza a sua página (ocr_dpi, ocr_tons_de_cinza), então a
+memória de cada um é a de uma página, não a do documento inteiro.
+
+kraken e torch só são importados quando um modelo é carregado. Os modelos
+ficam num registro por processo: aquecer() os carrega uma vez no processo
+principal do worker, antes de criar o pool, e os processos do pool (fork)
+herdam os pesos já carregados, compartilhados por cópia-na-escrita.
+"""
+import atexit
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from PIL import Image
+from pdf2image import convert_from_path, pdfinfo_from_path
+
+from . import ocr_cache, ocr_preprocess
+from .config_loader import ao_recarregar, get_settings
+
+_pool = None
+_lock = threading.Lock()
+_modelos = {}
+_lock_modelos = threading.Lock()
+
+
+def _configurar_torch():
+    # Cada processo já trabalha numa página inteira: um thread de torch por
+    # processo evita disputa de CPU entre eles
+    import torch
+    torch.set_num_threads(1)
+
+
+def caminho_modelo(nome):
+    """
+    Caminhos relativos são procurados na pasta de modelos do kraken
+    (onde 'kraken get' os instala).
+    """
+    if not nome or os.path.isabs(nome) or os.path.exists(nome):
+        return nome
+    import click
+    return os.path.join(click.get_app_dir('kraken'), nome)
+
+
+def _carregar(tipo):
+    settings = get_settings()
+    if tipo == 'reconhecimento':
+        from kraken.lib import models
+        return models.load_any(caminho_modelo(settings.ocr_modelo))
+    if tipo == 'segmentacao':
+        # Sem modelo configurado, a segmentação usa o pageseg (sem rede)
+        if not settings.ocr_modelo_segmentacao:
+            return None
+        from kraken.lib import vgsl
+        return vgsl.TorchVGSLModel.load_model(caminho_modelo(settings.ocr_modelo_segmentacao))
+    raise KeyError(tipo)
+
+
+def modelo(tipo='reconhecimento'):
+    if tipo not in _modelos:
+        with _lock_modelos:
+            if tipo not in _modelos:
+                _modelos[tipo] = _carregar(tipo)
+    return _modelos[tipo]
+
+
+def modelo_id():
+    """
+    Identifica os modelos em uso (para chaves de cache de resultados).
+    """
+    settings = get_settings()
+    return f'{settings.ocr_modelo}|{settings.ocr_modelo_segmentacao or "pageseg"}'
+
+
+def aquecer():
+    _configurar_torch()
+    modelo('reconhecimento')
+    modelo('segmentacao')
+
+
+def processos():
+    return get_settings().ocr_processos or os.cpu_count() or 1
+
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        with _lock:
+            if _pool is None:
+                aquecer()
+                metodos = multiprocessing.get_all_start_methods()
+                contexto = multiprocessing.get_context('fork' if 'fork' in metodos else None)
+                _pool = ProcessPoolExecutor(max_workers=processos(), mp_context=contexto,
+                                            initializer=_configurar_torch)
+    return _pool
+
+
+def descartar_pool(pool):
+    """
+    Descarta um pool quebrado (BrokenProcessPool: um processo morreu, ex.
+    pelo OOM killer); o próximo get_pool() cria outro.
+    """
+    global _pool
+    with _lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def enviar(funcao, *args):
+    """
+    pool.submit() que troca o pool se ele já estiver quebrado. Retorna
+    (futuro, pool).
+    """
+    for tentativa in range(2):
+        pool = get_pool()
+        try:
+            return pool.submit(funcao, *args), pool
+        except BrokenProcessPool:
+            descartar_pool(pool)
+            if tentativa:
+                raise
+
+
+@ao_recarregar
+def _recarregar(settings):
+    # Modelos e processos novos; as páginas já enviadas terminam no pool antigo
+    global _pool
+    with _lock:
+        pool, _pool = _pool, None
+    with _lock_modelos:
+        _modelos.clear()
+    if pool is not None:
+        pool.shutdown(wait=False)
+
+
+def fechar():
+    global _pool
+    with _lock:
+        if _pool is not None:
+            _pool.shutdown(cancel_futures=True)
+            _pool = None
+
+
+# Encerra os processos do pool junto com o worker (ou o processo web)
+atexit.register(fechar)
+
+
+def transcrever_pagina(img, preprocessar=None):
+    from kraken import binarization, blla, pageseg, rpred
+
+    if preprocessar is None:
+        preprocessar = get_settings().ocr_preprocessamento
+    if preprocessar:
+        img = ocr_preprocess.preparar(img)
+
+    segmentador = modelo('segmentacao')
+    if segmentador is None:
+        img = binarization.nlbin(img)
+        linhas = pageseg.segment(img)
+    else:
+        # O segmentador por linhas de base trabalha sobre a imagem original
+        linhas = blla.segment(img, model=segmentador)
+    predicoes = rpred.rpred(modelo('reconhecimento'), img, linhas)
+    return '\n'.join([line.prediction for line in predicoes])
+
+
+def eh_pdf(caminho):
+    return caminho.lower().endswith('.pdf')
+
+
+def contar_paginas(caminho):
+    if eh_pdf(caminho):
+        return pdfinfo_from_path(caminho)['Pages']
+    # TIFF digitalizado costuma ter uma página por quadro. Nos outros
+    # formatos com quadros (GIF animado, MPO de câmeras) eles não são páginas
+    with Image.open(caminho) as img:
+        return getattr(img, 'n_frames', 1) if img.format == 'TIFF' else 1
+
+
+def rasterizar(caminho, numero):
+    """
+    Imagem de uma única página (numerada a partir de 1) do PDF ou da imagem.
+    """
+    settings = get_settings()
+    if eh_pdf(caminho):
+        return convert_from_path(caminho, dpi=settings.ocr_dpi, grayscale=settings.ocr_tons_de_cinza,
+                                 first_page=numero, last_page=numero)[0]
+    img = Image.open(caminho)
+    if numero > 1:
+        # Quadro do TIFF com várias páginas (ver contar_paginas)
+        try:
+            img.seek(numero - 1)
+            pagina = img.convert('L') if settings.ocr_tons_de_cinza else img.copy()
+        finally:
+            img.close()
+        return pagina
+    if settings.ocr_tons_de_cinza:
+        img = img.convert('L')
+    return img
+
+
+def transcrever_pagina_arquivo(caminho, numero):
+    img = rasterizar(caminho, numero)
+    try:
+        # Página idêntica já reconhecida com os mesmos modelos
+        chave = ocr_cache.chave_pagina(img, modelo_id())
+        texto = ocr_cache.obter(chave)
+        if texto is None:
+            texto = transcrever_pagina(img)
+            ocr_cache.guardar(chave, texto)
+        return texto
+    finally:
+        img.close()
+
+
+def transcrever_arquivo(caminho):
+    """
+    Todas as páginas do arquivo, uma após a outra, no processo atual (usado
+    nos lotes, em que o paralelismo é entre arquivos).
+    """
+    return [transcrever_pagina_arquivo(caminho, numero)
+            for numero in range(1, contar_paginas(caminho) + 1)]
+
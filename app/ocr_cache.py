@@ -0,0 +1,141 @@
+"""
+Cache em disco dos resultados de OCR.
+
+Há dois níveis, ambos com a identificação dos modelos (ocr.modelo_id()) e
+dos parâmetros de rasterização e pré-processamento na chave:
+    - arquivo: SHA-256 do arquivo enviado -> textos de todas as páginas;
+      um reenvio do mesmo documento nem chega a ser rasterizado;
+    - página: SHA-256 dos pixels da página -> texto; vale também para a mesma
+      página dentro de documentos diferentes.
+
+Cada entrada é um arquivo JSON em ocr_cache_dir. Uma leitura atualiza o mtime
+da entrada; quando o total passa de ocr_cache_max_bytes, as entradas com
+mtime mais antigo são apagadas (LRU) até sobrar 90% do limite.
+
+guardar() roda nos processos do pool de OCR, em paralelo: o total ocupado
+fica em ocr_cache_dir/.tamanho e só é alterado sob um flock em .lock, então
+todos os processos contam o mesmo total. Regravar uma chave desconta o
+tamanho da entrada anterior.
+"""
+import fcntl
+import hashlib
+import json
+import os
+from contextlib import contextmanager
+
+from .config_loader import get_settings
+
+
+def diretorio():
+    caminho = get_settings().ocr_cache_dir or os.path.join(os.path.dirname(__file__), 'ocr_cache')
+    os.makedirs(caminho, exist_ok=True)
+    return caminho
+
+
+def _sufixo(modelo):
+    settings = get_settings()
+    return (f'{modelo}|{settings.ocr_dpi}|{settings.ocr_tons_de_cinza}|'
+            f'{settings.ocr_preprocessamento}|{settings.ocr_deskew_max_graus}')
+
+
+def chave_arquivo(caminho, modelo):
+    h = hashlib.sha256()
+    with open(caminho, 'rb') as f:
+        for bloco in iter(lambda: f.read(1024 * 1024), b''):
+            h.update(bloco)
+    h.update(_sufixo(modelo).encode())
+    return 'arquivo-' + h.hexdigest()
+
+
+def chave_pagina(img, modelo):
+    h = hashlib.sha256(f'{img.mode}|{img.size}|'.encode())
+    h.update(img.tobytes())
+    h.update(_sufixo(modelo).encode())
+    return 'pagina-' + h.hexdigest()
+
+
+def _caminho(chave):
+    return os.path.join(diretorio(), chave + '.json')
+
+
+def obter(chave):
+    caminho = _caminho(chave)
+    try:
+        with open(caminho, encoding='utf-8') as f:
+            valor = json.load(f)
+        os.utime(caminho)
+    except (OSError, ValueError):
+        return None
+    return valor
+
+
+@contextmanager
+def _travado():
+    with open(os.path.join(diretorio(), '.lock'), 'w') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        yield
+
+
+def _ler_total():
+    # Chamada com o flock; sem o arquivo (cache novo ou apagado), mede a pasta
+    try:
+        with open(os.path.join(diretorio(), '.tamanho')) as f:
+            return int(f.read())
+    except (OSError, ValueError):
+        return None
+
+
+def _gravar_total(total):
+    caminho = os.path.join(diretorio(), '.tamanho')
+    with open(caminho + '.tmp', 'w') as f:
+        f.write(str(total))
+    os.replace(caminho + '.tmp', caminho)
+
+
+def guardar(chave, valor):
+    caminho = _caminho(chave)
+    temporario = f'{caminho}.{os.getpid()}.tmp'
+    with open(temporario, 'w', encoding='utf-8') as f:
+        json.dump(valor, f, ensure_ascii=False)
+    tamanho = os.path.getsize(temporario)
+
+    with _travado():
+        try:
+            anterior = os.path.getsize(caminho)
+        except FileNotFoundError:
+            anterior = 0
+        os.replace(temporario, caminho)
+        total = _ler_total()
+        if total is None:
+            total = _medir()
+        else:
+            total += tamanho - anterior
+        if total > get_settings().ocr_cache_max_bytes:
+            total = _liberar()
+        _gravar_total(total)
+
+
+def _entradas():
+    with os.scandir(diretorio()) as it:
+        return [(e.stat().st_mtime, e.stat().st_size, e.path) for e in it
+                if e.is_file() and e.name.endswith('.json')]
+
+
+def _medir():
+    return sum(tamanho for _, tamanho, _ in _entradas())
+
+
+def _liberar():
+    # Apaga as entradas usadas há mais tempo até sobrar 90% do limite
+    entradas = sorted(_entradas())
+    total = sum(tamanho for _, tamanho, _ in entradas)
+    alvo = get_settings().ocr_cache_max_bytes * 0.9
+    for _, tamanho, caminho in entradas:
+        if total <= alvo:
+            break
+        try:
+            os.remove(caminho)
+            total -= tamanho
+        except FileNotFoundError:
+            pass
+    return total
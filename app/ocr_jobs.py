@@ -0,0 +1,504 @@
+"""
+Fila de trabalhos de transcrição (OCR) em disco.
+
+O processo web só grava o arquivo enviado e o status inicial do trabalho;
+quem roda o kraken é um processo separado:
+
+    python -m app.ocr_jobs
+
+Estrutura em ocr_jobs_dir:
+    trabalhos/<id>/entrada<ext>         arquivo enviado
+    trabalhos/<id>/status.json          estado e progresso
+    trabalhos/<id>/resultados.ndjson    uma linha por página (ou mídia, no
+                                        lote) concluída, só acrescentada
+    pendentes/<criado>-<id>             fila, em ordem de chegada
+    executando/<id>                     trabalho reservado por um worker (host e pid)
+
+A reserva é um os.link do marcador já preenchido para executando/<id>, que
+falha se outro worker chegou antes, seguido da remoção do marcador em
+pendentes/ (só um worker consegue removê-lo); vários workers podem consumir
+a mesma fila e nenhum marcador de executando/ fica vazio.
+
+Enquanto executa, o worker renova o mtime do seu marcador. Um trabalho volta
+à fila quando o pid do marcador morreu no mesmo host ou, para workers em
+outros hosts/contêineres (onde o pid não diz nada), quando o marcador ficou
+sem renovação por ocr_reserva_validade segundos.
+
+Trabalhos concluídos ou com erro ficam em trabalhos/ por ocr_jobs_retencao
+segundos (para a rota de status) e depois são apagados pelo worker.
+"""
+import hashlib
+import json
+import os
+import shutil
+import socket
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+from .blueprints.utils import cas
+from .config_loader import get_settings, recarregar_no_sinal
+
+PENDENTE = 'pendente'
+EXECUTANDO = 'executando'
+CONCLUIDO = 'concluido'
+ERRO = 'erro'
+
+
+class FilaCheia(Exception):
+    pass
+
+
+def diretorio(*partes):
+    base = get_settings().ocr_jobs_dir or os.path.join(os.path.dirname(__file__), 'ocr_jobs')
+    caminho = os.path.join(base, *partes)
+    os.makedirs(caminho, exist_ok=True)
+    return caminho
+
+
+def _arquivo_status(job_id):
+    return os.path.join(diretorio('trabalhos', job_id), 'status.json')
+
+
+def _arquivo_resultados(job_id):
+    return os.path.join(diretorio('trabalhos', job_id), 'resultados.ndjson')
+
+
+def _gravar_status(status):
+    # Só estado e contadores: os resultados vão para resultados.ndjson
+    status['atualizado_em'] = time.time()
+    caminho = _arquivo_status(status['id'])
+    temporario = f'{caminho}.{os.getpid()}.tmp'
+    with open(temporario, 'w') as f:
+        json.dump({k: v for k, v in status.items() if k != 'resultados'}, f, ensure_ascii=False)
+    os.replace(temporario, caminho)
+
+
+def _registrar_resultados(job_id, resultados):
+    # Acrescenta linhas completas; quem lê ignora uma linha ainda incompleta
+    linhas = ''.join(json.dumps(r, ensure_ascii=False) + '\n' for r in resultados)
+    with open(_arquivo_resultados(job_id), 'a', encoding='utf-8') as f:
+        f.write(linhas)
+
+
+def _ler_resultados(job_id, posicao=0):
+    """
+    Resultados gravados a partir de posicao (bytes). Retorna (resultados,
+    nova posição).
+    """
+    try:
+        with open(_arquivo_resultados(job_id), 'rb') as f:
+            if os.fstat(f.fileno()).st_size < posicao:
+                # Trabalho reiniciado (recuperar_orfaos): arquivo recriado
+                posicao = 0
+            f.seek(posicao)
+            dados = f.read()
+    except FileNotFoundError:
+        return [], 0
+    fim = dados.rfind(b'\n') + 1
+    resultados = [json.loads(linha) for linha in dados[:fim].splitlines() if linha]
+    return resultados, posicao + fim
+
+
+def _ler_status(job_id):
+    try:
+        uuid.UUID(job_id)
+    except ValueError:
+        return None
+    caminho = os.path.join(diretorio('trabalhos'), job_id, 'status.json')
+    try:
+        with open(caminho) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def ler_status(job_id):
+    status = _ler_status(job_id)
+    if status is not None:
+        status['resultados'] = _ler_resultados(job_id)[0]
+    return status
+
+
+def tamanho_fila():
+    return len(os.listdir(diretorio('pendentes')))
+
+
+def _verificar_fila():
+    if tamanho_fila() >= get_settings().ocr_fila_max:
+        raise FilaCheia('Fila de transcrição cheia, tente novamente mais tarde')
+
+
+def _enfileirar(status):
+    _gravar_status(status)
+    # O marcador entra na fila só depois do status gravado
+    open(os.path.join(diretorio('pendentes'), f'{time.time():017.6f}-{status["id"]}'), 'w').close()
+    return status['id']
+
+
+def _midia_do_arquivo(objeto_uri, caminho, nome):
+    # Valor de schema:associatedMedia que o upload gravou no objeto para este
+    # conteúdo (o link <sha256><ext> na pasta dele), ou None
+    h = hashlib.sha256()
+    with open(caminho, 'rb') as f:
+        for bloco in iter(lambda: f.read(cas.BLOCO), b''):
+            h.update(bloco)
+    objeto_id = objeto_uri.split('#')[-1]
+    midia = os.path.join(get_settings().upload_folder, objeto_id, cas.nome_arquivo(h.hexdigest(), nome))
+    return midia.replace('\\', '/') if os.path.isfile(midia) else None
+
+
+def criar(arquivo, repository=None, objeto_uri=None, midia=None):
+    """
+    Grava o arquivo enviado (FileStorage) e enfileira o trabalho. Com
+    repository e objeto_uri, a transcrição concluída é gravada no objeto
+    (ocr_lote.gravar) e entra no índice de busca, ligada à mídia: o valor de
+    schema:associatedMedia informado em midia ou, sem ele, o da mídia do
+    objeto com o mesmo conteúdo.
+    Levanta FilaCheia quando já há ocr_fila_max trabalhos esperando e
+    ValueError quando o arquivo não corresponde a uma mídia do objeto.
+    """
+    _verificar_fila()
+
+    job_id = str(uuid.uuid4())
+    extensao = os.path.splitext(arquivo.filename or '')[-1].lower()
+    entrada = os.path.join(diretorio('trabalhos', job_id), 'entrada' + extensao)
+    arquivo.save(entrada)
+    if objeto_uri and not midia:
+        midia = _midia_do_arquivo(objeto_uri, entrada, arquivo.filename or '')
+        if midia is None:
+            shutil.rmtree(diretorio('trabalhos', job_id), ignore_errors=True)
+            raise ValueError('O arquivo não é uma mídia do objeto; informe "midia".')
+
+    return _enfileirar({
+        'id': job_id,
+        'estado': PENDENTE,
+        'arquivo': arquivo.filename,
+        'entrada': entrada,
+        'repository': repository,
+        'objeto': objeto_uri,
+        'midia': midia,
+        'paginas_total': None,
+        'paginas_concluidas': 0,
+        'resultados': [],
+        'erro': None,
+        'criado_em': time.time(),
+    })
+
+
+def criar_lote(repository, colecao=None):
+    """
+    Enfileira a transcrição das mídias já associadas aos objetos do
+    repositório (ou só da coleção), executada por ocr_lote.
+    """
+    _verificar_fila()
+    return _enfileirar({
+        'id': str(uuid.uuid4()),
+        'tipo': 'lote',
+        'estado': PENDENTE,
+        'repository': repository,
+        'colecao': colecao,
+        'midias_total': None,
+        'midias_concluidas': 0,
+        'paginas_total': None,
+        'paginas_concluidas': 0,
+        'resultados': [],
+        'erro': None,
+        'criado_em': time.time(),
+    })
+
+
+def _chave_resultado(resultado):
+    # Página, nos trabalhos de um arquivo; mídia, nos trabalhos em lote
+    return resultado.get('pagina', resultado.get('midia'))
+
+
+def acompanhar(job_id, intervalo=None, prazo=None):
+    """
+    Gera cada página assim que o worker a conclui ({'pagina', 'texto'}) e,
+    por último, o estado do trabalho: o final ou, passados prazo segundos
+    (ocr_stream_prazo), o atual, para o cliente seguir pela rota de status.
+    Só lê o status.json; quem consome não espera por nada além do disco.
+    """
+    settings = get_settings()
+    intervalo = intervalo or settings.ocr_stream_intervalo
+    limite = time.monotonic() + (prazo or settings.ocr_stream_prazo)
+    enviadas = set()
+    posicao = 0
+    while True:
+        status = _ler_status(job_id)
+        if status is None:
+            return
+        # Só as linhas novas de resultados.ndjson
+        resultados, posicao = _ler_resultados(job_id, posicao)
+        for resultado in resultados:
+            if _chave_resultado(resultado) not in enviadas:
+                enviadas.add(_chave_resultado(resultado))
+                yield resultado
+        if status['estado'] in (CONCLUIDO, ERRO) or time.monotonic() >= limite:
+            yield {'id': job_id, 'estado': status['estado'], 'erro': status['erro'],
+                   'paginas_total': status['paginas_total'],
+                   'paginas_concluidas': status['paginas_concluidas']}
+            return
+        time.sleep(intervalo)
+
+
+# ---------------------------------------------------------------------------
+# Worker
+# ---------------------------------------------------------------------------
+
+def _vivo(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _identidade():
+    return {'host': socket.gethostname(), 'pid': os.getpid()}
+
+
+def _orfao(marcador):
+    try:
+        mtime = os.path.getmtime(marcador)
+        with open(marcador) as f:
+            dono = json.load(f)
+    except FileNotFoundError:
+        return False
+    except (OSError, ValueError):
+        # Marcador de versões antigas (só o pid) ou ilegível
+        dono = {}
+    if dono.get('host') == socket.gethostname() and dono.get('pid'):
+        return not _vivo(dono['pid'])
+    # Outro host: o pid não pode ser verificado daqui, vale a renovação
+    return time.time() - mtime > get_settings().ocr_reserva_validade
+
+
+def recuperar_orfaos():
+    """
+    Devolve à fila os trabalhos reservados por workers que morreram.
+    """
+    executando = diretorio('executando')
+    for job_id in os.listdir(executando):
+        if job_id.startswith('.'):
+            continue
+        marcador = os.path.join(executando, job_id)
+        if not _orfao(marcador):
+            continue
+        try:
+            status = _ler_status(job_id)
+        except ValueError:
+            status = None
+        criado = status['criado_em'] if status else time.time()
+        try:
+            os.replace(marcador, os.path.join(diretorio('pendentes'), f'{criado:017.6f}-{job_id}'))
+        except FileNotFoundError:
+            pass
+
+
+def reservar():
+    """
+    Reserva o trabalho mais antigo da fila. Retorna o id ou None.
+    """
+    pendentes = diretorio('pendentes')
+    executando = diretorio('executando')
+    temporario = os.path.join(executando, f'.{socket.gethostname()}-{os.getpid()}-{threading.get_ident()}.tmp')
+    with open(temporario, 'w') as f:
+        json.dump(_identidade(), f)
+    try:
+        for nome in sorted(os.listdir(pendentes)):
+            job_id = nome.split('-', 1)[1]
+            destino = os.path.join(executando, job_id)
+            try:
+                os.link(temporario, destino)
+            except FileExistsError:
+                continue
+            try:
+                os.remove(os.path.join(pendentes, nome))
+            except FileNotFoundError:
+                # Outro worker reservou (e talvez já concluiu) primeiro
+                os.remove(destino)
+                continue
+            return job_id
+        return None
+    finally:
+        os.remove(temporario)
+
+
+def _renovar(job_id, fim):
+    # Renova a reserva até o trabalho terminar
+    marcador = os.path.join(diretorio('executando'), job_id)
+    while not fim.wait(get_settings().ocr_reserva_validade / 4):
+        try:
+            os.utime(marcador)
+        except FileNotFoundError:
+            return
+
+
+def executar(job_id):
+    fim = threading.Event()
+    threading.Thread(target=_renovar, args=(job_id, fim), daemon=True).start()
+    try:
+        _executar(job_id)
+    finally:
+        fim.set()
+
+
+def _executar(job_id):
+    from . import ocr, ocr_cache, ocr_lote
+
+    try:
+        status = _ler_status(job_id)
+        if status is None:
+            raise ValueError('status.json não encontrado')
+        status['estado'] = EXECUTANDO
+        status['paginas_concluidas'] = 0
+        # Resultados de uma execução anterior interrompida
+        try:
+            os.remove(_arquivo_resultados(job_id))
+        except FileNotFoundError:
+            pass
+        _gravar_status(status)
+    except (OSError, ValueError, TypeError) as e:
+        # Status ausente ou ilegível: o trabalho não tem como rodar
+        print('Trabalho', job_id, 'sem status válido:', e)
+        _gravar_status({'id': job_id, 'estado': ERRO, 'erro': f'Status ilegível: {e}',
+                        'paginas_total': None, 'paginas_concluidas': 0,
+                        'criado_em': time.time()})
+        os.remove(os.path.join(diretorio('executando'), job_id))
+        return
+
+    def registrar(resultado):
+        _registrar_resultados(job_id, [resultado])
+
+    if status.get('tipo') == 'lote':
+        try:
+            ocr_lote.executar(status, _gravar_status, registrar)
+            status['estado'] = CONCLUIDO
+        except Exception as e:
+            status['estado'] = ERRO
+            status['erro'] = str(e)
+        _gravar_status(status)
+        os.remove(os.path.join(diretorio('executando'), job_id))
+        return
+    try:
+        entrada = status['entrada']
+        chave = ocr_cache.chave_arquivo(entrada, ocr.modelo_id())
+        em_cache = ocr_cache.obter(chave)
+        if em_cache is not None:
+            # Mesmo documento já transcrito: nada a rasterizar
+            resultados = em_cache
+            _registrar_resultados(job_id, resultados)
+            status['paginas_total'] = len(em_cache)
+            status['paginas_concluidas'] = len(em_cache)
+        else:
+            resultados = []
+            status['paginas_total'] = ocr.contar_paginas(entrada)
+            _gravar_status(status)
+
+            faltando = set(range(1, status['paginas_total'] + 1))
+            for tentativa in range(2):
+                # Cada processo do pool rasteriza e libera a sua própria página
+                pool = ocr.get_pool()
+                try:
+                    futuros = {pool.submit(ocr.transcrever_pagina_arquivo, entrada, numero): numero
+                               for numero in sorted(faltando)}
+                    # Cada página concluída já fica visível no status
+                    for futuro in as_completed(futuros):
+                        # Ordem de conclusão: acompanhar() repassa as páginas nessa ordem
+                        resultado = {'pagina': futuros[futuro], 'texto': futuro.result()}
+                        resultados.append(resultado)
+                        registrar(resultado)
+                        status['paginas_concluidas'] += 1
+                        faltando.discard(futuros[futuro])
+                        _gravar_status(status)
+                    break
+                except BrokenProcessPool:
+                    # Um processo do pool morreu: pool novo, só com as páginas que faltam
+                    ocr.descartar_pool(pool)
+                    if tentativa:
+                        raise
+
+            resultados.sort(key=lambda r: r['pagina'])
+            ocr_cache.guardar(chave, resultados)
+        if status.get('objeto') and status.get('midia'):
+            ocr_lote.gravar(status['repository'], status['objeto'], status['midia'],
+                            [r['texto'] for r in resultados])
+        status['estado'] = CONCLUIDO
+    except Exception as e:
+        status['estado'] = ERRO
+        status['erro'] = str(e)
+    _gravar_status(status)
+    os.remove(os.path.join(diretorio('executando'), job_id))
+    if status['estado'] == CONCLUIDO:
+        os.remove(status['entrada'])
+
+
+def limpar_antigos():
+    """
+    Apaga de trabalhos/ os concluídos ou com erro há mais de
+    ocr_jobs_retencao segundos, e as pastas sem status (envio interrompido)
+    tão antigas quanto.
+    """
+    limite = time.time() - get_settings().ocr_jobs_retencao
+    trabalhos = diretorio('trabalhos')
+    for job_id in os.listdir(trabalhos):
+        pasta = os.path.join(trabalhos, job_id)
+        try:
+            status = _ler_status(job_id)
+        except ValueError:
+            # status.json ilegível: vale a idade da pasta
+            status = None
+        try:
+            if status is None:
+                if os.path.getmtime(pasta) >= limite:
+                    continue
+            elif status['estado'] not in (CONCLUIDO, ERRO) or status.get('atualizado_em', 0) >= limite:
+                continue
+        except (OSError, KeyError, TypeError) as e:
+            print('Trabalho', job_id, 'não verificado na limpeza:', e)
+            continue
+        shutil.rmtree(pasta, ignore_errors=True)
+
+
+def worker(intervalo=1.0):
+    from . import ocr
+
+    recarregar_no_sinal()
+    recuperar_orfaos()
+    limpar_antigos()
+    # Modelos carregados antes do primeiro trabalho (e antes do fork do pool)
+    ocr.get_pool()
+    print(f'Worker de transcrição {os.getpid()} aguardando trabalhos em {diretorio()}')
+    ultima_recuperacao = ultima_limpeza = time.monotonic()
+    while True:
+        job_id = reservar()
+        if job_id is None:
+            # Reservas de workers de outros contêineres só expiram com o tempo
+            if time.monotonic() - ultima_recuperacao > get_settings().ocr_reserva_validade:
+                recuperar_orfaos()
+                ultima_recuperacao = time.monotonic()
+            if time.monotonic() - ultima_limpeza > 3600:
+                limpar_antigos()
+                ultima_limpeza = time.monotonic()
+            time.sleep(intervalo)
+            continue
+        print('Transcrevendo', job_id)
+        try:
+            executar(job_id)
+        except Exception as e:
+            # Nenhum trabalho derruba o worker; a reserva fica para recuperar_orfaos()
+            print('Trabalho', job_id, 'interrompido:', e)
+
+
+if __name__ == '__main__':
+    try:
+        worker()
+    except KeyboardInterrupt:
+        sys.exit(0)
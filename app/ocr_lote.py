@@ -0,0 +1,134 @@
+"""
+Transcrição em lote das mídias já associadas aos objetos de um repositório
+(ou de uma coleção), executada pelo worker de ocr_jobs.
+
+As mídias sem transcrição vêm do Fuseki (schema:associatedMedia de cada
+objeto, sem obj:temTranscricao correspondente), então um lote interrompido ou
+repetido só processa o que falta. Cada arquivo vai inteiro para um processo do
+pool de OCR; o texto volta ao repositório como um obj:Transcricao ligado ao
+objeto:
+
+    <obj> obj:temTranscricao <t> .
+    <t> a obj:Transcricao ; schema:associatedMedia "caminho" ;
+        obj:paginas n ; obj:texto "..." ; dc:created "..."^^xsd:dateTime .
+
+e as páginas vão também para o índice de busca local (indice_busca).
+"""
+import hashlib
+import os
+from concurrent.futures import FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+
+from . import indice_busca, ocr, sparql_client
+from .config_loader import get_settings
+from .consultas import get_prefix, get_sparq_midias_sem_transcricao, iri, literal
+
+EXTENSOES = {'.pdf', '.png', '.jpg', '.jpeg', '.tif', '.tiff', '.gif', '.bmp', '.webp'}
+SEPARADOR_PAGINAS = '\f'
+
+
+def arquivo_local(objeto_uri, midia):
+    """
+    Caminho no disco da mídia gravada pelo upload, ou None (links externos,
+    formatos sem texto, arquivos ausentes).
+    """
+    if '://' in midia or os.path.splitext(midia)[-1].lower() not in EXTENSOES:
+        return None
+    caminho = midia.replace('\\', '/')
+    if os.path.isfile(caminho):
+        return caminho
+    # Mídias antigas podem ter outro prefixo; procura na pasta do objeto
+    objeto_id = objeto_uri.split('#')[-1]
+    caminho = os.path.join(get_settings().upload_folder, objeto_id, os.path.basename(caminho))
+    return caminho if os.path.isfile(caminho) else None
+
+
+def midias_pendentes(repo, colecao=None):
+    response = sparql_client.query(repo, get_sparq_midias_sem_transcricao(repo, colecao))
+    response.raise_for_status()
+    for linha in response.json().get('results', {}).get('bindings', []):
+        yield linha['obj']['value'], linha['midia']['value']
+
+
+def transcricao_uri(repo, objeto_uri, midia):
+    digest = hashlib.sha1(f'{objeto_uri}|{midia}'.encode()).hexdigest()[:20]
+    return f'{repo}#transcricao-{digest}'
+
+
+def gravar(repo, objeto_uri, midia, paginas):
+    """
+    Grava (ou substitui) a transcrição da mídia no repositório e no índice
+    de busca local.
+    """
+    transcricao = iri(transcricao_uri(repo, objeto_uri, midia))
+    sparql_query = f"""{get_prefix()}
+        DELETE WHERE {{ {transcricao} ?p ?o . }} ;
+        INSERT DATA {{
+            {iri(objeto_uri)} obj:temTranscricao {transcricao} .
+            {transcricao} rdf:type obj:Transcricao ;
+                schema:associatedMedia {literal(midia)} ;
+                obj:paginas {len(paginas)} ;
+                obj:texto {literal(SEPARADOR_PAGINAS.join(paginas))} ;
+                dc:created "{datetime.now().isoformat(timespec='seconds')}"^^xsd:dateTime .
+        }}
+    """
+    response = sparql_client.update(repo + '/' + get_settings().update, sparql_query)
+    response.raise_for_status()
+    indice_busca.indexar_transcricao(repo, objeto_uri, midia, paginas)
+
+
+def executar(status, gravar_status, registrar):
+    """
+    Processa o trabalho em lote descrito em status, passando a
+    registrar(resultado) o desfecho de cada mídia.
+    """
+    repo = status['repository']
+    pendentes = []
+    for objeto_uri, midia in midias_pendentes(repo, status.get('colecao')):
+        caminho = arquivo_local(objeto_uri, midia)
+        if caminho is None:
+            registrar({'objeto': objeto_uri, 'midia': midia, 'estado': 'ignorada'})
+        else:
+            pendentes.append((objeto_uri, midia, caminho))
+    status['midias_total'] = len(pendentes)
+    gravar_status(status)
+
+    # Janela limitada de arquivos em andamento: o lote pode ter o acervo inteiro
+    janela = ocr.processos() * 2
+    fila = iter(pendentes)
+    andamento = {}
+    # Mídias perdidas com um processo do pool que morreu: reenviadas uma vez
+    repetir = []
+    repetidas = set()
+    while True:
+        while len(andamento) < janela:
+            proxima = repetir.pop() if repetir else next(fila, None)
+            if proxima is None:
+                break
+            futuro, pool = ocr.enviar(ocr.transcrever_arquivo, proxima[2])
+            andamento[futuro] = (proxima, pool)
+        if not andamento:
+            break
+
+        concluidos, _ = wait(andamento, return_when=FIRST_COMPLETED)
+        for futuro in concluidos:
+            proxima, pool = andamento.pop(futuro)
+            if isinstance(futuro.exception(), BrokenProcessPool):
+                ocr.descartar_pool(pool)
+                if proxima not in repetidas:
+                    repetidas.add(proxima)
+                    repetir.append(proxima)
+                    continue
+            objeto_uri, midia, _ = proxima
+            resultado = {'objeto': objeto_uri, 'midia': midia}
+            try:
+                paginas = futuro.result()
+                gravar(repo, objeto_uri, midia, paginas)
+                resultado.update(estado='transcrita', paginas=len(paginas))
+                status['paginas_concluidas'] += len(paginas)
+            except Exception as e:
+                resultado.update(estado='erro', erro=str(e))
+            registrar(resultado)
+            status['midias_concluidas'] += 1
+            gravar_status(status)
@@ -1,34 +1,18 @@
 from flask import Blueprint, request, jsonify
-import requests, json, os
+from . import sparql_client
+from .config_loader import get_settings
 
 sparqapi_app = Blueprint('sparqapi_app', __name__)
 
-def load_config(filename):
-    base_path = os.path.dirname(__file__)  # pega o diretório do script atual
-    full_path = os.path.join(base_path, filename)
-    with open(full_path, 'r') as f:
-        return json.load(f)
-
-config = load_config('config.json')
-
-fuseki_update_url = config.get('fuseki_update_url')
-fuseki_query_url = config.get('fuseki_query_url')
-
 def execute_update(query):
-    headers = {
-        "Content-Type": "application/sparql-update"
-    }
-    response = requests.post(fuseki_update_url, data=query, headers=headers)
+    response = sparql_client.update(get_settings().fuseki_update_url, query)
     if response.status_code == 200:
         return "Atualização SPARQL realizada com sucesso!"
     else:
         return f"Erro na atualização SPARQL: {response.status_code}\n{response.text}"
 
 def execute_query(query):
-    headers = {
-        "Accept": "application/sparql-results+json"
-    }
-    response = requests.get(fuseki_query_url, params={'query': query}, headers=headers)
+    response = sparql_client.query(get_settings().fuseki_query_url, query)
     if response.status_code == 200:
         return response.json()
     else:
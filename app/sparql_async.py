@@ -0,0 +1,69 @@
+"""
+Cliente assíncrono (httpx) para as consultas ao Fuseki.
+
+Usado pelas listagens servidas por app/asgi.py: a consulta e o repasse do
+resultado rodam no laço de eventos do servidor ASGI, sem ocupar uma thread
+por requisição. Cada laço ganha um único httpx.AsyncClient, com o mesmo
+limite de conexões (sparql_pool_maxsize) e timeout do cliente síncrono em
+sparql_client.py.
+"""
+import asyncio
+
+import httpx
+
+from .config_loader import ao_recarregar, get_settings
+from .sparql_client import HEADERS_SPARQL
+
+_cliente = None
+_laco = None
+
+
+def get_client():
+    """
+    Retorna o cliente do laço de eventos em execução, criando-o na primeira
+    chamada. Um cliente httpx não pode ser usado fora do laço que o criou.
+    """
+    global _cliente, _laco
+    laco = asyncio.get_running_loop()
+    if _cliente is None or _laco is not laco:
+        settings = get_settings()
+        _cliente = httpx.AsyncClient(
+            timeout=settings.sparql_timeout,
+            limits=httpx.Limits(max_connections=settings.sparql_pool_maxsize,
+                                max_keepalive_connections=settings.sparql_pool_maxsize))
+        _laco = laco
+    return _cliente
+
+
+async def query(url, sparql):
+    """
+    Envia uma consulta SPARQL e retorna a resposta HTTP já lida.
+    """
+    return await get_client().post(url, headers=HEADERS_SPARQL,
+                                   data={'query': sparql})
+
+
+async def query_stream(url, sparql):
+    """
+    Como query(), mas retorna assim que chegam os cabeçalhos; o corpo é lido
+    com aiter_bytes() e a resposta precisa ser fechada com aclose().
+    """
+    cliente = get_client()
+    requisicao = cliente.build_request('POST', url, headers=HEADERS_SPARQL,
+                                       data={'query': sparql})
+    return await cliente.send(requisicao, stream=True)
+
+
+@ao_recarregar
+def _recarregar(settings):
+    # O reload roda fora do laço de eventos: o próximo get_client() cria um
+    # cliente com os limites novos e o antigo termina as consultas em andamento
+    global _cliente, _laco
+    _cliente, _laco = None, None
+
+
+async def fechar():
+    global _cliente, _laco
+    if _cliente is not None:
+        cliente, _cliente, _laco = _cliente, None, None
+        await cliente.aclose()
@@ -0,0 +1,151 @@
+"""
+Cache em memória (TTL + LRU) para resultados de consultas SELECT.
+
+As entradas são indexadas pelo repositório (URL do dataset, sem o sufixo
+/query ou /update) e pelo texto normalizado da consulta. Toda atualização
+enviada por sparql_client invalida as entradas do repositório
+correspondente.
+
+O cache é por processo, mas cada entrada guarda a geração do repositório
+(geracoes.py, compartilhada entre os workers) lida antes da consulta: uma
+atualização em qualquer worker avança a geração, e a entrada deixa de valer
+em todos. Pelo mesmo motivo, um resultado lido enquanto uma atualização
+acontecia não é guardado (guardar() com a geração capturada antes).
+"""
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from . import geracoes
+from .config_loader import ao_recarregar, get_settings
+
+_SUFIXOS = ('/query', '/update', '/sparql', '/data')
+_ESPACOS = re.compile(r'\s+')
+_LITERAIS = re.compile(r'("(?:[^"\\]|\\.)*"|\'(?:[^\'\\]|\\.)*\')')
+
+
+class TTLCache:
+    """
+    Dicionário limitado a maxsize entradas, com expiração por entrada.
+    Ao estourar o limite, descarta a entrada usada há mais tempo.
+    """
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._dados = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, chave):
+        with self._lock:
+            item = self._dados.get(chave)
+            if item is None:
+                return None
+            expira, valor = item
+            if expira <= time.monotonic():
+                del self._dados[chave]
+                return None
+            self._dados.move_to_end(chave)
+            return valor
+
+    def set(self, chave, valor, ttl=None):
+        expira = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._dados[chave] = (expira, valor)
+            self._dados.move_to_end(chave)
+            while len(self._dados) > self.maxsize:
+                self._dados.popitem(last=False)
+
+    def pop(self, chave):
+        with self._lock:
+            item = self._dados.pop(chave, None)
+        return item[1] if item else None
+
+    def remover_se(self, condicao):
+        with self._lock:
+            chaves = [chave for chave, (_, valor) in self._dados.items()
+                      if condicao(chave, valor)]
+            for chave in chaves:
+                del self._dados[chave]
+        return len(chaves)
+
+    def clear(self):
+        with self._lock:
+            self._dados.clear()
+
+    def redimensionar(self, maxsize, ttl):
+        # Usado no reload da configuração: descarta as entradas existentes
+        with self._lock:
+            self.maxsize = maxsize
+            self.ttl = ttl
+            self._dados.clear()
+
+    def __len__(self):
+        return len(self._dados)
+
+
+resultados = TTLCache(get_settings().sparql_cache_maxsize,
+                      get_settings().sparql_cache_ttl)
+
+
+@ao_recarregar
+def _recarregar(settings):
+    # As URLs do Fuseki podem ter mudado: o cache recomeça vazio
+    resultados.redimensionar(settings.sparql_cache_maxsize, settings.sparql_cache_ttl)
+
+
+def chave_repositorio(url):
+    url = (url or '').rstrip('/')
+    for sufixo in _SUFIXOS:
+        if url.endswith(sufixo):
+            return url[:-len(sufixo)]
+    return url
+
+
+def normalizar(consulta):
+    # Colapsa espaços fora dos literais; o conteúdo entre aspas é preservado
+    partes = _LITERAIS.split(consulta)
+    for i in range(0, len(partes), 2):
+        partes[i] = _ESPACOS.sub(' ', partes[i])
+    return ''.join(partes).strip()
+
+
+def geracao(repo):
+    """
+    Geração atual do repositório; capturar antes de consultar o Fuseki e
+    repassar a guardar().
+    """
+    return geracoes.atual('sparql:' + chave_repositorio(repo))
+
+
+def obter(repo, consulta):
+    chave = (chave_repositorio(repo), normalizar(consulta))
+    item = resultados.get(chave)
+    if item is None:
+        return None
+    gravada, resultado = item
+    atual = geracao(repo)
+    if gravada is not None and atual is not None and gravada != atual:
+        # Repositório alterado (talvez por outro worker) depois da consulta
+        resultados.pop(chave)
+        return None
+    return resultado
+
+
+def guardar(repo, consulta, resultado, gravada=None):
+    """
+    Guarda o resultado lido na geração 'gravada'. Se o repositório mudou
+    desde então, o resultado pode ser anterior à mudança e é descartado.
+    """
+    atual = geracao(repo)
+    if gravada is not None and atual is not None and gravada != atual:
+        return
+    resultados.set((chave_repositorio(repo), normalizar(consulta)),
+                   (atual if gravada is None else gravada, resultado))
+
+
+def invalidar_repositorio(url):
+    repo = chave_repositorio(url)
+    geracoes.avancar('sparql:' + repo)
+    return resultados.remover_se(lambda chave, valor: chave[0] == repo)
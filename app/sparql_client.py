@@ -0,0 +1,109 @@
+"""
+Cliente HTTP compartilhado para o Fuseki.
+
+Todas as consultas e atualizações SPARQL dos blueprints passam por aqui.
+Cada host do Fuseki (scheme://host:porta) ganha uma única requests.Session
+com pool de conexões keep-alive limitado, evitando abrir uma conexão TCP
+nova a cada requisição.
+"""
+import atexit
+import threading
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .config_loader import ao_recarregar, get_settings
+from . import sparql_cache
+
+HEADERS_SPARQL = {
+    'Content-Type': 'application/x-www-form-urlencoded; charset=UTF-8',
+    'Accept': 'application/sparql-results+json,*/*;q=0.9',
+    'X-Requested-With': 'XMLHttpRequest'
+}
+
+_sessoes = {}
+_lock = threading.Lock()
+
+
+def _host(url):
+    partes = urlsplit(url)
+    return f"{partes.scheme}://{partes.netloc}"
+
+
+def _nova_sessao(host):
+    settings = get_settings()
+    adapter = HTTPAdapter(pool_connections=1,
+                          pool_maxsize=settings.sparql_pool_maxsize,
+                          pool_block=settings.sparql_pool_block)
+    sessao = requests.Session()
+    sessao.mount(host + '/', adapter)
+    return sessao
+
+
+def get_session(url):
+    """
+    Retorna a sessão (e o pool de conexões) associada ao host da URL.
+    """
+    host = _host(url)
+    sessao = _sessoes.get(host)
+    if sessao is None:
+        with _lock:
+            sessao = _sessoes.get(host)
+            if sessao is None:
+                sessao = _nova_sessao(host)
+                _sessoes[host] = sessao
+    return sessao
+
+
+def query(url, sparql):
+    """
+    Envia uma consulta SPARQL (SELECT/ASK/CONSTRUCT) e retorna a resposta HTTP.
+    """
+    return get_session(url).post(url, headers=HEADERS_SPARQL,
+                                 data={'query': sparql},
+                                 timeout=get_settings().sparql_timeout)
+
+
+def query_stream(url, sparql):
+    """
+    Como query(), mas retorna assim que chegam os cabeçalhos; a conexão só
+    volta ao pool depois que o corpo é lido (iter_content) ou a resposta é
+    fechada.
+    """
+    return get_session(url).post(url, headers=HEADERS_SPARQL,
+                                 data={'query': sparql}, stream=True,
+                                 timeout=get_settings().sparql_timeout)
+
+
+def update(url, sparql):
+    """
+    Envia uma atualização SPARQL (INSERT/DELETE) e retorna a resposta HTTP.
+    Invalida os resultados em cache do repositório alterado.
+    """
+    try:
+        return get_session(url).post(url, headers=HEADERS_SPARQL,
+                                     data={'update': sparql},
+                                     timeout=get_settings().sparql_timeout)
+    finally:
+        sparql_cache.invalidar_repositorio(url)
+
+
+@ao_recarregar
+def _recarregar(settings):
+    # Sessões novas com o pool configurado; as antigas terminam as requisições
+    # em andamento e são descartadas
+    global _sessoes
+    with _lock:
+        _sessoes = {}
+
+
+def fechar():
+    with _lock:
+        for sessao in _sessoes.values():
+            sessao.close()
+        _sessoes.clear()
+
+
+# Fecha as conexões keep-alive com o Fuseki ao encerrar o processo
+atexit.register(fechar)